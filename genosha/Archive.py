@@ -0,0 +1,208 @@
+#    genosha/Archive.py - random-access binary archives for Genosha.
+#    Copyright (C) 2009 Shawn Sulma <genosha@470th.org>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+r"""genosha/Archive.py stores a genosha-marshalled object graph in a file that can be
+read randomly.  Each GenoshaObject is written as its own record (using the value encoding
+of :mod:`genosha.Binary`) and the file ends with an index from oid to record offset.
+
+Archives are read through :mod:`mmap`, so opening one only reads the trailer; records are
+decoded when they are reached and only the pages they occupy are touched.  Combined with lazy
+decoding (``load( fn, lazy = True )``) an instance's record is only read when the instance is
+first used.
+
+    >>> import genosha.Archive
+    >>> with open( 'snapshot.gna', 'wb' ) as f :
+    ...     genosha.Archive.dump( obj, f )
+    >>> archive = genosha.Archive.Archive( 'snapshot.gna' )
+    >>> obj_again = archive.load()
+
+The file is laid out as:
+
+    1. the magic bytes ``GNSA`` followed by a format version byte.
+    2. each GenoshaObject as a record: a varint length followed by the encoded object.
+    3. the trailer: the genosha sentinel (varint length and bytes), the name table (a varint
+       count and each name as a varint length and bytes), and the payload as a record.
+    4. the index: one 8-byte little-endian record offset per oid (0 where there is no object).
+    5. the footer: the 8-byte offsets of the trailer and the index, the number of index
+       entries, and the magic bytes again.
+
+Unlike :mod:`genosha.Binary` documents, names are never defined inline; every record
+refers to the shared name table so that it can be decoded on its own.
+"""
+import mmap, struct
+
+from genosha import GenoshaEncoder, GenoshaDecoder, references, extract_value, paused_gc
+from genosha.Binary import Writer, Reader, varint
+
+__version__ = "0.1"
+__author__ = "Shawn Sulma <genosha@470th.org>"
+__all__ = [ 'dump', 'load', 'Archive' ]
+
+MAGIC = "GNSA\x01"
+
+_footer = struct.Struct( '<QQQ5s' )
+_offset = struct.Struct( '<Q' )
+
+def dump ( o, f ) :
+    r"""Dump the passed object ``o`` (and its refererred object graph) as an archive
+    written to the file-like object ``f`` (which has a .write method)."""
+    _m = GenoshaEncoder().marshal( o )
+    writer = ArchiveWriter( f.write )
+    writer.begin( _m[0] )
+    for obj in _m[1] :
+        writer.feed( obj )
+    writer.finish( _m[2] )
+
+def load ( fn, lazy = False ) :
+    r"""Load the object graph stored in the archive named by ``fn``.  Objects are
+    decoded as they are reached from the root.  If ``lazy`` is true, class instances are
+    only filled in when first used (see ``genosha.GenoshaDecoder``); the archive then
+    stays open until the loaded objects no longer need it."""
+    archive = Archive( fn )
+    if lazy :
+        return archive.load( decoder = GenoshaDecoder( lazy = True ) )
+    try :
+        return paused_gc( archive.load )
+    finally :
+        archive.close()
+
+class ArchiveWriter ( Writer ) :
+    r"""Writes an archive to the ``write`` callable, accepting the structure through
+    ``begin``, ``feed`` (once for each GenoshaObject, in order) and ``finish``."""
+    def __init__ ( self, write ) :
+        Writer.__init__( self, self._counted )
+        self.output = write
+        self.offset = 0
+        self.offsets = []
+
+    def _counted ( self, data ) :
+        self.offset += len( data )
+        self.output( data )
+
+    def begin ( self, sentinel ) :
+        self.sentinel = sentinel
+        self.write( MAGIC )
+
+    def feed ( self, obj ) :
+        if obj.oid >= len( self.offsets ) :
+            self.offsets.extend( [ 0 ] * ( obj.oid + 1 - len( self.offsets ) ) )
+        self.offsets[obj.oid] = self.offset
+        self.record( obj )
+
+    def finish ( self, payload ) :
+        trailer = self.offset
+        out = []
+        self.encode( payload, out ) # registers any names used by the payload
+        payload = "".join( out )
+        self.write( varint( len( self.sentinel ) ) + self.sentinel )
+        names = sorted( self.names, key = self.names.get )
+        self.write( varint( len( names ) ) + "".join( varint( len( name ) ) + name for name in names ) )
+        self.write( varint( len( payload ) ) + payload )
+        index = self.offset
+        for start in xrange( 0, len( self.offsets ), 4096 ) :
+            chunk = self.offsets[start:start + 4096]
+            self.write( struct.pack( '<%dQ' % len( chunk ), *chunk ) )
+        self.write( _footer.pack( trailer, index, len( self.offsets ), MAGIC ) )
+
+    def name ( self, data, out ) :
+        if type( data ) is not str :
+            out.append( "\x01" )
+            self.encode( data, out )
+        else :
+            n = self.names.get( data )
+            if n is None :
+                n = self.names[data] = len( self.names ) + 2
+            out.append( varint( n ) )
+
+class Archive ( object ) :
+    r"""A read-only view of the archive file named by ``fn``.  The GenoshaObject for any
+    oid can be fetched with ``record``; ``load`` decodes a value (by default the root)
+    along with every object it refers to, and nothing else."""
+    def __init__ ( self, fn ) :
+        f = open( fn, 'rb' )
+        try :
+            self.map = mmap.mmap( f.fileno(), 0, access = mmap.ACCESS_READ )
+        finally :
+            f.close()
+        try :
+            if len( self.map ) < len( MAGIC ) + _footer.size or self.map[:len( MAGIC )] != MAGIC :
+                raise ValueError, "not a genosha archive"
+            trailer, self.index, self.count, magic = _footer.unpack_from( self.map, len( self.map ) - _footer.size )
+            if magic != MAGIC :
+                raise ValueError, "not a genosha archive"
+            self.reader = Reader( self.map )
+            self.reader.pos = trailer
+            self.sentinel = self.reader._str()
+            self.reader.names = [ self.reader._str() for i in xrange( self.reader.varint() ) ]
+            self.reader.varint()
+            self.payload = self.reader.decode()
+        except :
+            self.map.close()
+            raise
+
+    def __len__ ( self ) :
+        return self.count
+
+    def __contains__ ( self, oid ) :
+        return 0 <= oid < self.count and self.offset( oid ) != 0
+
+    def offset ( self, oid ) :
+        return _offset.unpack_from( self.map, self.index + 8 * oid )[0]
+
+    def record ( self, oid ) :
+        r"""Return the GenoshaObject stored for ``oid``."""
+        if oid not in self :
+            raise KeyError, oid
+        reader = self.reader
+        reader.pos = self.offset( oid )
+        reader.varint()
+        return reader.decode()
+
+    def closure ( self, value ) :
+        r"""Return the GenoshaObjects reachable from the marshalled ``value``, in the
+        order they were written."""
+        found = {}
+        pending = references( value )
+        while pending :
+            oid = pending.pop()
+            if oid not in found :
+                found[oid] = data = self.record( oid )
+                pending.extend( references( data ) )
+        return [ found[oid] for oid in sorted( found, key = self.offset ) ]
+
+    __getitem__ = record
+
+    def load ( self, value = None, decoder = None ) :
+        r"""Convert the marshalled ``value`` (the root of the archive if not given) back
+        into Python objects, decoding records only as they are reached from it."""
+        if value is None :
+            value = self.payload
+        decoder = decoder or GenoshaDecoder()
+        decoder.begin( self.sentinel )
+        return decoder.resolve( value, self )
+
+    def extract ( self, path, decoder = None ) :
+        r"""Convert the value found at ``path`` from the root (see ``genosha.extract``),
+        reading only the records on the way and those the value refers to."""
+        return extract_value( self.payload, self, path, decoder )
+
+    def close ( self ) :
+        self.map.close()
+
+    def __enter__ ( self ) :
+        return self
+
+    def __exit__ ( self, *exc_info ) :
+        self.close()
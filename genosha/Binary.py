@@ -0,0 +1,454 @@
+#    genosha/Binary.py - compact binary persistence for Genosha.
+#    Copyright (C) 2009 Shawn Sulma <genosha@470th.org>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+r"""genosha/Binary.py is a serialization/deserialization wrapper for the :mod:`genosha`
+marshalling library using a compact, length-prefixed binary encoding.  It provides the
+same interface as the other wrappers (dump, dumps, load, loads).
+
+The output is not human-readable; it is intended for checkpoints and inter-process
+traffic where size and speed matter more.  A document is laid out as:
+
+    1. the magic bytes ``GNSB`` followed by a format version byte.
+    2. the genosha sentinel as a length-prefixed string.
+    3. each GenoshaObject as a length-prefixed record.  A zero length ends the objects.
+    4. the payload (root) as a length-prefixed record.
+
+Lengths, counts, and oids are unsigned varints (7 bits per byte, low bits first, high bit set
+on all but the last byte).  Each value starts with a one-byte tag:
+
+    - ``N``, ``T``, ``F`` - None, True and False
+    - ``i``, ``l`` - int and long, as zigzag varints
+    - ``d`` - float, as an 8-byte little-endian IEEE double
+    - ``s``, ``u`` - str and unicode (UTF-8), as a varint length and the bytes
+    - ``r`` - a GenoshaReference, as a varint oid
+    - ``L`` - a list, as a varint count and that many values
+    - ``M`` - a dict, as a varint count and that many key, value pairs
+    - ``O`` - a GenoshaObject, as a varint of flags (1 oid, 2 type, 4 attribute, 8 instance,
+      16 items, 32 fields, 64 persistent, 128 state, 256 data) followed by those that are
+      present, in that order.  The oid is a varint; type and attribute are interned names;
+      instance, items, persistent and state are values; fields are a varint count of
+      interned name, value pairs; data (the raw contents of a buffer) is a varint length and
+      the bytes.
+
+Interned names (type names and field names) are written as a varint: 0 introduces a new
+str name (varint length and bytes) which is appended to the name table; 1 introduces a
+value that is not interned; any other value ``n`` refers to entry ``n - 2`` in the table.
+"""
+import struct
+
+import genosha
+from genosha import GenoshaObject, GenoshaReference, GenoshaEncoder, GenoshaDecoder, GenoshaCollector, GenoshaTask, SENTINEL, finish_steps
+from genosha import compression as _compression
+
+__version__ = "0.1"
+__author__ = "Shawn Sulma <genosha@470th.org>"
+__all__ = [ 'marshal', 'unmarshal', 'dumps', 'dumps_many', 'dump', 'loads', 'load', 'dump_task', 'load_task', 'parse', 'extracts', 'extract' ]
+
+MAGIC = "GNSB\x01"
+
+def marshal ( obj, persistent_id = None, strings = 0 ) :
+    r"""Prepares the passed object ``obj`` for binary output.  ``persistent_id`` and
+    ``strings`` are as for GenoshaEncoder."""
+    return GenoshaEncoder( persistent_id = persistent_id, strings = strings ).marshal( obj )
+
+def unmarshal ( data, persistent_load = None ) :
+    r"""Converts the genosha structure ``data`` back into Python objects.
+    ``persistent_load`` is as for GenoshaDecoder."""
+    return GenoshaDecoder( persistent_load = persistent_load ).unmarshal( data )
+
+def dumps ( o, persistent_id = None, strings = 0 ) :
+    r"""Dump the passed object ``o`` (and its refererred object graph) in the binary
+    format, returned as a string.  ``persistent_id`` and ``strings`` are as for GenoshaEncoder."""
+    out = []
+    _write( marshal( o, persistent_id, strings ), Writer( out.append ) )
+    return "".join( out )
+
+def dumps_many ( objs, encoder = None ) :
+    r"""Dump each object in ``objs`` in the binary format, returning the list of strings.
+    A single GenoshaEncoder (``encoder`` if it is given) is shared by all of them."""
+    encoder = encoder or GenoshaEncoder()
+    out = []
+    for doc in encoder.marshal_many( objs ) :
+        chunks = []
+        _write( doc, Writer( chunks.append ) )
+        out.append( "".join( chunks ) )
+    return out
+
+def dump ( o, f, compression = None, compresslevel = None, persistent_id = None, strings = 0 ) :
+    r"""Dump the passed object ``o`` (and its refererred object graph) in the binary
+    format to the file-like object ``f`` (which has a .write method).  If ``compression``
+    is given ('zlib', 'gzip', 'bz2' or 'lzma') the output is compressed as it is written,
+    at ``compresslevel`` (by default the format's level in ``genosha.compression.levels``).
+    ``persistent_id`` and ``strings`` are as for GenoshaEncoder."""
+    out = _compression.writer( f, compression, compresslevel )
+    try :
+        _write( marshal( o, persistent_id, strings ), Writer( out.write ) )
+    finally :
+        if out is not f :
+            out.close()
+
+def loads ( s, persistent_load = None ) :
+    r"""Convert the binary string ``s`` back into Python objects with their cross
+    references restored.  ``persistent_load`` is as for GenoshaDecoder."""
+    return genosha.paused_gc( Reader( s ).parse, GenoshaDecoder( persistent_load = persistent_load ) )
+
+def load ( f, persistent_load = None ) :
+    r"""Read a binary document from the file-like object ``f`` (which has a .read
+    method) and convert it back into Python objects with their cross references
+    restored.  Objects are read and decoded one record at a time.  Compressed input is
+    recognized and decompressed as it is read.  ``f`` may also be the name of a file.
+    ``persistent_load`` is as for GenoshaDecoder."""
+    f = _compression.reader( f )
+    try :
+        return genosha.paused_gc( parse, f, GenoshaDecoder( persistent_load = persistent_load ) )
+    finally :
+        f.close()
+
+def extracts ( s, path ) :
+    r"""Convert only the part of the binary string ``s`` found at ``path`` (and what it
+    refers to) back into Python objects.  See ``genosha.extract`` for the path syntax."""
+    return genosha.extract( Reader( s ).parse( GenoshaCollector() ), path )
+
+def extract ( f, path ) :
+    r"""Convert only the part of the binary document in the file-like object ``f`` found
+    at ``path`` (and what it refers to) back into Python objects.  See ``genosha.extract``
+    for the path syntax."""
+    f = _compression.reader( f )
+    try :
+        return genosha.extract( parse( f, GenoshaCollector() ), path )
+    finally :
+        f.close()
+
+def dump_task ( o, f, budget = 1000 ) :
+    r"""Return a ``genosha.GenoshaTask`` that dumps ``o`` to the file-like object ``f``
+    as ``dump`` does, writing each object once it is complete and pausing every
+    ``budget`` objects."""
+    return GenoshaTask( GenoshaEncoder().marshal_steps( o, Writer( f.write ) ), budget )
+
+def load_task ( f, budget = 1000 ) :
+    r"""Return a ``genosha.GenoshaTask`` that loads the binary document in the file-like
+    object ``f`` as ``load`` does, pausing every ``budget`` objects.  Its ``result``
+    is the loaded object."""
+    return GenoshaTask( parse_steps( _compression.reader( f ), GenoshaDecoder() ), budget )
+
+def parse ( f, target ) :
+    r"""Read the binary document from the file-like object ``f`` record by record,
+    handing each GenoshaObject to ``target.feed`` once it is read.  ``target.begin``
+    receives the document sentinel and the result of ``target.finish( payload )`` is
+    returned.  A ``GenoshaDecoder`` is a suitable target."""
+    return GenoshaTask( parse_steps( f, target ) ).run()
+
+def parse_steps ( f, target ) :
+    r"""The steps of ``parse`` for use with ``genosha.GenoshaTask``; a step is taken
+    for each object."""
+    if f.read( len( MAGIC ) ) != MAGIC :
+        raise ValueError, "not a genosha binary document"
+    reader = Reader( "" )
+    target.begin( _read_record( f ) )
+    while True :
+        record = _read_record( f )
+        if not record :
+            break
+        target.feed( reader.reset( record ).decode() )
+        yield None
+    for value in finish_steps( target, reader.reset( _read_record( f ) ).decode() ) :
+        yield value
+
+def _write ( marshalled, writer ) :
+    writer.begin( marshalled[0] )
+    for obj in marshalled[1] :
+        writer.feed( obj )
+    writer.finish( marshalled[2] )
+
+def _read_record ( f ) :
+    length = shift = 0
+    while True :
+        byte = f.read( 1 )
+        if not byte :
+            raise ValueError, "truncated genosha binary document"
+        byte = ord( byte )
+        length |= ( byte & 0x7f ) << shift
+        if byte < 0x80 :
+            break
+        shift += 7
+    data = f.read( length )
+    if len( data ) != length :
+        raise ValueError, "truncated genosha binary document"
+    return data
+
+def varint ( n ) :
+    if n < 0x80 :
+        return chr( n )
+    out = []
+    while n >= 0x80 :
+        out.append( chr( ( n & 0x7f ) | 0x80 ) )
+        n >>= 7
+    out.append( chr( n ) )
+    return "".join( out )
+
+_double = struct.Struct( '<d' )
+
+class Writer ( object ) :
+    r"""Encodes a genosha structure, handed over through ``begin``, ``feed`` (once for
+    each GenoshaObject, in order) and ``finish``, to the ``write`` callable."""
+    def __init__ ( self, write ) :
+        self.write = write
+        self.names = {}
+
+    def begin ( self, sentinel ) :
+        self.write( MAGIC )
+        self.write( varint( len( sentinel ) ) + sentinel )
+
+    def feed ( self, obj ) :
+        self.record( obj )
+
+    def finish ( self, payload ) :
+        self.write( "\x00" )
+        self.record( payload )
+
+    def record ( self, data ) :
+        out = []
+        self.encode( data, out )
+        data = "".join( out )
+        self.write( varint( len( data ) ) )
+        self.write( data )
+
+    def encode ( self, data, out ) :
+        encoder = self.encoders.get( type( data ) )
+        if encoder is None :
+            raise TypeError, "'%s' is an unsupported type." % type( data ).__name__
+        encoder( self, data, out )
+
+    def name ( self, data, out ) :
+        if type( data ) is not str :
+            out.append( "\x01" )
+            self.encode( data, out )
+        elif data in self.names :
+            out.append( varint( self.names[data] ) )
+        else :
+            self.names[data] = len( self.names ) + 2
+            out.append( "\x00" + varint( len( data ) ) + data )
+
+    def _none ( self, data, out ) :
+        out.append( "N" )
+
+    def _bool ( self, data, out ) :
+        out.append( data and "T" or "F" )
+
+    def _int ( self, data, out ) :
+        out.append( ( "i" if type( data ) is int else "l" ) + varint( data << 1 if data >= 0 else ( -data << 1 ) - 1 ) )
+
+    def _float ( self, data, out ) :
+        out.append( "d" + _double.pack( data ) )
+
+    def _str ( self, data, out ) :
+        out.append( "s" + varint( len( data ) ) + data )
+
+    def _unicode ( self, data, out ) :
+        data = data.encode( 'utf-8' )
+        out.append( "u" + varint( len( data ) ) + data )
+
+    def _reference ( self, data, out ) :
+        out.append( "r" + varint( data.oid ) )
+
+    def _list ( self, data, out ) :
+        out.append( "L" + varint( len( data ) ) )
+        encode = self.encode
+        for item in data :
+            encode( item, out )
+
+    def _dict ( self, data, out ) :
+        out.append( "M" + varint( len( data ) ) )
+        encode = self.encode
+        for key, value in data.items() :
+            encode( key, out )
+            encode( value, out )
+
+    def _object ( self, data, out ) :
+        flags = 0
+        for bit, slot in _object_slots :
+            if hasattr( data, slot ) :
+                flags |= bit
+        out.append( "O" + varint( flags ) )
+        if flags & 1 :
+            out.append( varint( data.oid ) )
+        if flags & 2 :
+            self.name( data.type, out )
+        if flags & 4 :
+            self.name( data.attribute, out )
+        if flags & 8 :
+            self.encode( data.instance, out )
+        if flags & 16 :
+            self.encode( data.items, out )
+        if flags & 32 :
+            out.append( varint( len( data.fields ) ) )
+            for key, value in data.fields.items() :
+                self.name( key, out )
+                self.encode( value, out )
+        if flags & 64 :
+            self.encode( data.persistent, out )
+        if flags & 128 :
+            self.encode( data.state, out )
+        if flags & 256 :
+            raw = genosha.raw_bytes( data.data )
+            out.append( varint( len( raw ) ) + raw )
+
+    encoders = { type( None ) : _none, bool : _bool, int : _int, long : _int, float : _float
+        , str : _str, unicode : _unicode, GenoshaReference : _reference, list : _list, dict : _dict
+        , GenoshaObject : _object }
+
+_object_slots = ( ( 1, 'oid' ), ( 2, 'type' ), ( 4, 'attribute' ), ( 8, 'instance' ), ( 16, 'items' ), ( 32, 'fields' ), ( 64, 'persistent' ), ( 128, 'state' ), ( 256, 'data' ) )
+
+class Reader ( object ) :
+    r"""Decodes binary-encoded values from the string ``data`` into a genosha
+    structure."""
+    def __init__ ( self, data ) :
+        self.data = data
+        self.pos = 0
+        self.names = []
+
+    def reset ( self, data ) :
+        self.data = data
+        self.pos = 0
+        return self
+
+    def parse ( self, target ) :
+        r"""Decode the whole document in ``data`` into ``target`` (see ``parse``)."""
+        if not self.data.startswith( MAGIC ) :
+            raise ValueError, "not a genosha binary document"
+        self.pos = len( MAGIC )
+        target.begin( self.record() )
+        while True :
+            length = self.varint()
+            if not length :
+                break
+            end = self.pos + length
+            target.feed( self.decode() )
+            if self.pos != end :
+                raise ValueError, "malformed genosha binary record"
+        self.varint()
+        return target.finish( self.decode() )
+
+    def record ( self ) :
+        length = self.varint()
+        start = self.pos
+        self.pos += length
+        if self.pos > len( self.data ) :
+            raise ValueError, "truncated genosha binary document"
+        return self.data[start:self.pos]
+
+    def varint ( self ) :
+        data, pos = self.data, self.pos
+        n = ord( data[pos] )
+        pos += 1
+        if n >= 0x80 :
+            n &= 0x7f
+            shift = 7
+            while True :
+                byte = ord( data[pos] )
+                pos += 1
+                n |= ( byte & 0x7f ) << shift
+                if byte < 0x80 :
+                    break
+                shift += 7
+        self.pos = pos
+        return n
+
+    def decode ( self ) :
+        tag = self.data[self.pos]
+        self.pos += 1
+        try :
+            decoder = self.decoders[tag]
+        except KeyError :
+            raise ValueError, "unknown tag: %r" % tag
+        return decoder( self )
+
+    def name ( self ) :
+        n = self.varint()
+        if n > 1 :
+            return self.names[n - 2]
+        if n == 1 :
+            return self.decode()
+        name = self._str()
+        self.names.append( name )
+        return name
+
+    def _int ( self ) :
+        n = self.varint()
+        return n >> 1 if not n & 1 else -( ( n + 1 ) >> 1 )
+
+    def _long ( self ) :
+        return long( self._int() )
+
+    def _float ( self ) :
+        pos = self.pos
+        self.pos += 8
+        return _double.unpack_from( self.data, pos )[0]
+
+    def _str ( self ) :
+        length = self.varint()
+        start = self.pos
+        self.pos += length
+        return self.data[start:self.pos]
+
+    def _unicode ( self ) :
+        return self._str().decode( 'utf-8' )
+
+    def _reference ( self ) :
+        return GenoshaReference( self.varint() )
+
+    def _list ( self ) :
+        decode = self.decode
+        return [ decode() for i in xrange( self.varint() ) ]
+
+    def _dict ( self ) :
+        d = {}
+        decode = self.decode
+        for i in xrange( self.varint() ) :
+            key = decode()
+            d[key] = decode()
+        return d
+
+    def _object ( self ) :
+        flags = self.varint()
+        obj = GenoshaObject()
+        if flags & 1 :
+            obj.oid = self.varint()
+        if flags & 2 :
+            obj.type = self.name()
+        if flags & 4 :
+            obj.attribute = self.name()
+        if flags & 8 :
+            obj.instance = self.decode()
+        if flags & 16 :
+            obj.items = self.decode()
+        if flags & 32 :
+            fields = {}
+            name, decode = self.name, self.decode
+            for i in xrange( self.varint() ) :
+                key = name()
+                fields[key] = decode()
+            obj.fields = fields
+        if flags & 64 :
+            obj.persistent = self.decode()
+        if flags & 128 :
+            obj.state = self.decode()
+        if flags & 256 :
+            obj.data = self._str()
+        return obj
+
+    decoders = { 'N' : lambda self : None, 'T' : lambda self : True, 'F' : lambda self : False
+        , 'i' : _int, 'l' : _long, 'd' : _float, 's' : _str, 'u' : _unicode
+        , 'r' : _reference, 'L' : _list, 'M' : _dict, 'O' : _object }
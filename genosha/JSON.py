@@ -46,6 +46,9 @@ object.  In JSON expression, this is represented as a dict with some specially-n
     - ``@i`` indicates the "contents" of the object (list elements, dict entries, etc.)
     - ``@o`` is used for instance methods to indicate the reference ID of the bound instance
     - ``@a`` is used for to identify special attributes on an object (e.g. @classmethods)
+    - ``@p`` holds the key of an object left out by a ``persistent_id`` hook
+    - ``@s`` holds the state returned by ``__getstate__`` when it is not a dict of fields
+    - ``@b`` holds the raw contents of a buffer (bytearray, array, ...) in base64
 
 In JSON expressions, ``GenoshaReference``s are represented by special string values
 
@@ -55,60 +58,251 @@ try :
     import simplejson as json
 except :
     import json
+import base64
 
+import genosha
 from genosha import *
+from genosha import compression as _compression
 
 __version__ = "0.1"
 __author__ = "Shawn Sulma <genosha@470th.org>"
-__all__ = [ 'marshal', 'unmarshal', 'dumps', 'dump', 'loads', 'load' ]
+__all__ = [ 'marshal', 'unmarshal', 'new_encoder', 'new_decoder', 'dumps', 'dump', 'loads', 'load', 'dumps_many', 'loads_many', 'dump_task', 'load_task', 'parse', 'extracts', 'extract' ]
 
-def marshal( o ) :
+def marshal( o, persistent_id = None, strings = 0 ) :
     r"""Prepares the passed object for expression as JSON output.  The ``string_hook``,
     and ``reference_hook`` of ``GenoshaObject`` are used."""
-    return GenoshaEncoder( string_hook = _json_escape_string, reference_hook = _json_reference ).marshal( o )
+    return new_encoder( persistent_id = persistent_id, strings = strings ).marshal( o )
 
-def unmarshal( o ) :
+def new_encoder ( memo = 0, persistent_id = None, strings = 0 ) :
+    r"""Create a GenoshaEncoder configured for JSON output.  It may be reused (see
+    ``dumps_many``); ``memo``, ``persistent_id`` and ``strings`` are as for GenoshaEncoder."""
+    return GenoshaEncoder( string_hook = _json_escape_string, reference_hook = _json_reference, memo = memo, persistent_id = persistent_id, strings = strings )
+
+def unmarshal( o, persistent_load = None ) :
     r"""Translates a reconstructed JSON object into a Genosha structure, making use of
     GenoshaDecoder's ``string_hook``."""
-    return GenoshaDecoder( string_hook = _json_unescape_string ).unmarshal( o )
+    return new_decoder( persistent_load ).unmarshal( o )
+
+def new_decoder ( persistent_load = None ) :
+    r"""Create a GenoshaDecoder configured for JSON input.  ``persistent_load`` is as for
+    GenoshaDecoder."""
+    return GenoshaDecoder( string_hook = _json_unescape_string, persistent_load = persistent_load )
 
-def dumps ( o, **kwargs ) :
+def dumps ( o, persistent_id = None, strings = 0, **kwargs ) :
     r"""Dump the passed object ``o`` (and its refererred object graph) as a JSON string which
-    is returned.  The keyword arguments are the same as those accepted by the
+    is returned.  ``persistent_id`` and ``strings`` are as for GenoshaEncoder.  The remaining keyword
+    arguments are the same as those accepted by the
     ``dumps`` function in :mod:`json` (or :mod:`simplejson`), with the exception of the
     ``default`` argument which is used to hook in conversion of GenoshaObject JSON
     expressions back to GenoshaObjects.
     """
-    return json.dumps( marshal(o), default = _genosha_to_json, **kwargs )
+    return json.dumps( marshal( o, persistent_id, strings ), default = _genosha_to_json, **kwargs )
 
-def dump ( o, f, **kwargs ) :
+def dump ( o, f, compression = None, compresslevel = None, persistent_id = None, strings = 0, **kwargs ) :
     r"""Dump the passed object ``o`` (and its refererred object graph) as a JSON expression
-    which is written to the passed file-like object ``f`` (i.e. has a .write method).  The
-    keyword arguments are the same as those accepted by the ``dump`` function in
-    :mod:`json` (or :mod:`simplejson`), with the exception of the
-    ``default`` argument which is used to hook in conversion of GenoshaObject JSON
-    expressions back to GenoshaObjects."""
-    json.dump( marshal(o), f, default = _genosha_to_json, **kwargs )
+    which is written to the passed file-like object ``f`` (i.e. has a .write method).  If
+    ``compression`` is given ('zlib', 'gzip', 'bz2' or 'lzma') the output is compressed as
+    it is written, at ``compresslevel`` (by default the format's level in
+    ``genosha.compression.levels``).  ``persistent_id`` and ``strings`` are as for
+    GenoshaEncoder.
+    The remaining keyword arguments are the same as
+    those accepted by the ``dump`` function in :mod:`json` (or :mod:`simplejson`), with the
+    exception of the ``default`` argument which is used to hook in conversion of
+    GenoshaObject JSON expressions back to GenoshaObjects."""
+    out = _compression.writer( f, compression, compresslevel )
+    try :
+        json.dump( marshal( o, persistent_id, strings ), out, default = _genosha_to_json, **kwargs )
+    finally :
+        if out is not f :
+            out.close()
 
-def loads ( s, **kwargs ) :
+def loads ( s, persistent_load = None, **kwargs ) :
     r"""Convert the passed JSON expression ``s`` back into Python objects with their
-    cross references restored.  The keyword arguments accepted are the same as those
+    cross references restored.  ``persistent_load`` is as for GenoshaDecoder.  The
+    remaining keyword arguments accepted are the same as those
     accepted by the ``loads`` function in :mod:`json` (or :mod:`simplejson`) with the
     exception of ``object_hook`` which is used to convert the JSON expression of a
     ``GenoshaObject`` back into a Python representational object."""
-    return unmarshal( json.loads( s, object_hook = _json_to_genosha, **kwargs ) )
+    return paused_gc( lambda : unmarshal( json.loads( s, object_hook = _json_to_genosha, **kwargs ), persistent_load ) )
 
-def load ( f, **kwargs ) :
+def load ( f, persistent_load = None, **kwargs ) :
     r"""Convert the passed JSON expression present in the file-like object ``f`` (which
     has a .read method) back into Python objects with their cross references restored.
-    The keyword arguments accepted are the same as those accepted by the ``load``
+    ``persistent_load`` is as for GenoshaDecoder.  The remaining keyword arguments
+    accepted are the same as those accepted by the ``load``
     function in :mod:`json` (or :mod:`simplejson`) with the exception of ``object_hook``
     which is used to convert the JSON expression of a ``GenoshaObject`` back into a
-    Python representational object."""
-    return unmarshal( json.load( f, object_hook = _json_to_genosha, **kwargs ) )
+    Python representational object.  Compressed input is recognized and decompressed
+    as it is read.  ``f`` may also be the name of a file."""
+    f = _compression.reader( f )
+    try :
+        return paused_gc( lambda : unmarshal( json.load( f, object_hook = _json_to_genosha, **kwargs ), persistent_load ) )
+    finally :
+        f.close()
+
+def dumps_many ( objs, shared = False, encoder = None, **kwargs ) :
+    r"""Dump each object in ``objs`` as a JSON string, returning the list of strings.  A
+    single encoder (and JSON encoder) is used for all of them, which is much cheaper
+    than calling ``dumps`` repeatedly for small objects; an ``encoder`` from ``new_encoder()``
+    may be passed in to keep its caches between calls.  If ``shared`` is true a single
+    string is returned instead, holding all the objects with those they have in common
+    written once (``loads`` returns them as a list).  The keyword arguments are as for
+    ``dumps``."""
+    encoder = encoder or new_encoder()
+    encode = json.JSONEncoder( default = _genosha_to_json, **kwargs ).encode
+    if shared :
+        return encode( encoder.marshal_many( objs, shared = True ) )
+    return [ encode( doc ) for doc in encoder.marshal_many( objs ) ]
+
+def loads_many ( strings, **kwargs ) :
+    r"""Convert each JSON expression in ``strings`` back into Python objects, returning
+    the list of roots.  A single decoder is shared between them.  The keyword arguments
+    are as for ``loads``."""
+    decode = json.JSONDecoder( object_hook = _json_to_genosha, **kwargs ).decode
+    return new_decoder().unmarshal_many( decode( s ) for s in strings )
+
+def dump_task ( o, f, budget = 1000, **kwargs ) :
+    r"""Return a ``genosha.GenoshaTask`` that dumps ``o`` to the file-like object ``f``
+    as ``dump`` does, writing each object once it is complete and pausing every
+    ``budget`` objects.  The keyword arguments are as for ``dumps``."""
+    return GenoshaTask( new_encoder().marshal_steps( o, Writer( f.write, **kwargs ) ), budget )
+
+def load_task ( f, budget = 1000, **kwargs ) :
+    r"""Return a ``genosha.GenoshaTask`` that loads the JSON document in the file-like
+    object ``f``, reading it incrementally and pausing every ``budget`` objects.  Its
+    ``result`` is the loaded object.  The keyword arguments are as for ``load``."""
+    return GenoshaTask( parse_steps( f, new_decoder(), **kwargs ), budget )
+
+def parse ( f, target, **kwargs ) :
+    r"""Incrementally read the JSON document from the file-like object ``f``, handing
+    each GenoshaObject to ``target.feed`` as soon as it has been read.  ``target.begin``
+    receives the document sentinel and the result of ``target.finish( payload )`` is
+    returned.  Compressed input is recognized.  The keyword arguments are as for
+    ``load``."""
+    return GenoshaTask( parse_steps( f, target, **kwargs ) ).run()
+
+def parse_steps ( f, target, **kwargs ) :
+    r"""The steps of ``parse`` for use with ``genosha.GenoshaTask``; a step is taken
+    for each object."""
+    stream = Stream( _compression.reader( f ), json.JSONDecoder( object_hook = _json_to_genosha, **kwargs ).raw_decode )
+    stream.expect( "[" )
+    target.begin( stream.value() )
+    stream.expect( "," )
+    stream.expect( "[" )
+    if stream.peek() == "]" :
+        stream.expect( "]" )
+    else :
+        while True :
+            target.feed( stream.value() )
+            yield None
+            if stream.expect( ",]" ) == "]" :
+                break
+    stream.expect( "," )
+    payload = stream.value( last = True )
+    stream.expect( "]" )
+    for value in finish_steps( target, payload ) :
+        yield value
+
+def extracts ( s, path, **kwargs ) :
+    r"""Convert only the part of the JSON expression ``s`` found at ``path`` (and what it
+    refers to) back into Python objects.  See ``genosha.extract`` for the path syntax."""
+    return _extract( json.loads( s, object_hook = _json_to_genosha, **kwargs ), path )
+
+def extract ( f, path, **kwargs ) :
+    r"""Convert only the part of the JSON expression in the file-like object ``f`` found at
+    ``path`` (and what it refers to) back into Python objects.  See ``genosha.extract``
+    for the path syntax."""
+    f = _compression.reader( f )
+    try :
+        return _extract( json.load( f, object_hook = _json_to_genosha, **kwargs ), path )
+    finally :
+        f.close()
+
+def _extract ( doc, path ) :
+    return genosha.extract( doc, path, new_decoder(), _json_oid )
 
-_jsonmap = ( ( 'type', "@t" ), ( 'oid', "@id" ), ( 'fields', "@f" ), ( 'items', "@i" ), ( 'instance', "@o" ), ( 'attribute', "@a" ) )
+class Writer ( object ) :
+    r"""Writes a JSON document to the ``write`` callable as the genosha structure is
+    handed over through ``begin``, ``feed`` (once for each GenoshaObject, in order) and
+    ``finish``.  The keyword arguments are as for ``dumps``."""
+    def __init__ ( self, write, **kwargs ) :
+        self.write = write
+        self.encode = json.JSONEncoder( default = _genosha_to_json, **kwargs ).encode
+        self.separator = ""
+
+    def begin ( self, sentinel ) :
+        self.write( "[" + self.encode( sentinel ) + ", [" )
+
+    def feed ( self, obj ) :
+        self.write( self.separator + self.encode( obj ) )
+        self.separator = ", "
+
+    def finish ( self, payload ) :
+        self.write( "], " + self.encode( payload ) + "]" )
+
+class Stream ( object ) :
+    r"""Reads JSON values one at a time from the file-like object ``f`` using
+    ``raw_decode`` (of a JSON decoder), holding no more of the text in memory than the
+    value being read."""
+    CHUNK = 64 * 1024
+
+    def __init__ ( self, f, raw_decode ) :
+        self.f = f
+        self.raw_decode = raw_decode
+        self.buffer = ""
+        self.pos = 0
+
+    def _more ( self, size = CHUNK ) :
+        data = self.f.read( size )
+        if not data :
+            return False
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek ( self ) :
+        r"""Return the next non-whitespace character without consuming it."""
+        while True :
+            buffer, pos = self.buffer, self.pos
+            while pos < len( buffer ) and buffer[pos] in " \t\r\n" :
+                pos += 1
+            self.pos = pos
+            if pos < len( buffer ) :
+                return buffer[pos]
+            if not self._more() :
+                raise ValueError, "truncated genosha JSON document"
+
+    def expect ( self, chars ) :
+        r"""Consume the next non-whitespace character, which must be one of ``chars``."""
+        c = self.peek()
+        if c not in chars :
+            raise ValueError, "malformed genosha JSON document: expected %r at %r" % ( chars, c )
+        self.pos += 1
+        return c
+
+    def value ( self, last = False ) :
+        r"""Read the next JSON value.  Unless it is an object, list or string (whose end is
+        unambiguous) ``last`` must be true, meaning that the rest of the document is read
+        before decoding."""
+        self.peek()
+        if last :
+            while self._more() :
+                pass
+        size = self.CHUNK
+        while True :
+            try :
+                value, end = self.raw_decode( self.buffer, self.pos )
+                break
+            except ValueError :
+                if not self._more( size ) :
+                    raise
+                size *= 2
+        self.pos = end
+        return value
+
+_jsonmap = ( ( 'type', "@t" ), ( 'oid', "@id" ), ( 'fields', "@f" ), ( 'items', "@i" ), ( 'instance', "@o" ), ( 'attribute', "@a" ), ( 'persistent', "@p" ), ( 'state', "@s" ) )
 _jsonunmap = dict( ( e[1], e[0] ) for e in _jsonmap )
+_jsonunmap["@b"] = 'data'
 
 def _genosha_to_json( obj ) :
     if isinstance( obj, GenoshaObject ) :
@@ -116,13 +310,18 @@ def _genosha_to_json( obj ) :
         for fr, to in _jsonmap :
             if hasattr( obj, fr ) :
                 d[to] = getattr( obj, fr )
+        if hasattr( obj, 'data' ) :
+            d["@b"] = base64.b64encode( obj.data )
         return d
     if isinstance( obj, GenoshaReference ) :
         return str( obj )
     raise TypeError, repr( obj.__class__ )
 
 def _json_to_genosha( data ) :
-    if "@o" in data or "@t" in data :
+    if "@o" in data or "@t" in data or "@p" in data :
+        if "@b" in data :
+            data = dict( data )
+            data["@b"] = base64.b64decode( data["@b"] )
         return GenoshaObject( **dict( ( _jsonunmap[k], v ) for k, v in data.items() ) )
     return data # fall back to returning the dictionary.
 
@@ -138,5 +337,10 @@ def _json_unescape_string ( self, obj ) :
         return obj[1:]
     return obj
 
+def _json_oid ( obj ) :
+    if isinstance( obj, basestring ) and obj.startswith( "<@" ) :
+        return int( obj.split( '@' )[-2] )
+    return None
+
 def _json_reference ( oid ) :
     return "<@%d@>" % oid
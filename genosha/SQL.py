@@ -29,23 +29,25 @@ To be sure: this implementation is incredibly inefficient in its use of SQL; a r
 would combine inserts or selects for greater efficiency."""
 from __future__ import with_statement
 
-from genosha import GenoshaObject, GenoshaReference, GenoshaEncoder, GenoshaDecoder
+import genosha
+from genosha import GenoshaObject, GenoshaReference, GenoshaEncoder, GenoshaDecoder, GenoshaTask, finish_steps
 
 import sqlite3
 
 __version__ = "0.1"
 __author__ = "Shawn Sulma <genosha@470th.org>"
-__all__ = [ 'marshal', 'unmarshal', 'dumpc', 'dump', 'loadc', 'load' ]
+__all__ = [ 'marshal', 'unmarshal', 'dumpc', 'dump', 'loadc', 'load', 'extractc', 'parse', 'Writer' ]
 
-def marshal ( obj, cursor ) :
-    _m = GenoshaEncoder().marshal( obj )
+def marshal ( obj, cursor, persistent_id = None ) :
+    _m = GenoshaEncoder( persistent_id = persistent_id ).marshal( obj )
+    upgrade_tables( cursor )
     ids = get_start_ids( cursor )
     id = encode( _m, cursor, ids )
     return id
 
-def unmarshal ( id, cursor ) :
+def unmarshal ( id, cursor, persistent_load = None ) :
     _d = decode( cursor, id )
-    return GenoshaDecoder().unmarshal( _d )
+    return GenoshaDecoder( persistent_load = persistent_load ).unmarshal( _d )
 
 def dump ( o, fn ) :
     r"""Dump the passed object ``o`` (and its refererred object graph) to the sqlite db identified by ``fn``."""
@@ -56,9 +58,9 @@ def dump ( o, fn ) :
     finally :
         conn.close()
 
-def dumpc ( o, conn ) :
-    r"""Dump the passed object ``o`` (and its refererred object graph) to the passed sqlite connection object.  It does not commit the transaction."""
-    return marshal( o, conn.cursor() )
+def dumpc ( o, conn, persistent_id = None ) :
+    r"""Dump the passed object ``o`` (and its refererred object graph) to the passed sqlite connection object.  It does not commit the transaction.  ``persistent_id`` is as for GenoshaEncoder."""
+    return marshal( o, conn.cursor(), persistent_id )
 
 def load ( i, fn ) :
     r"""Load the object graph stored in the database named by ``fn``, starting at the item id ``i``."""
@@ -69,9 +71,40 @@ def load ( i, fn ) :
     finally :
         conn.close()
 
-def loadc ( i, conn ) :
-    r"""Load the object graph stored in the database accessed through the ``conn`` connection object."""
-    return unmarshal( i, conn.cursor() )
+def loadc ( i, conn, persistent_load = None ) :
+    r"""Load the object graph stored in the database accessed through the ``conn`` connection object.  ``persistent_load`` is as for GenoshaDecoder."""
+    return unmarshal( i, conn.cursor(), persistent_load )
+
+def extractc ( i, path, conn ) :
+    r"""Convert only the part of the object graph stored at item id ``i`` found at ``path``
+    (and what it refers to) back into Python objects.  See ``genosha.extract`` for the
+    path syntax."""
+    return genosha.extract( decode( conn.cursor(), i ), path )
+
+def parse ( i, conn, target ) :
+    r"""Read the object graph stored at item id ``i`` object by object, handing each
+    GenoshaObject to ``target.feed`` as soon as it is read (as the ``parse`` functions of
+    the other serialization modules do).  ``target.begin`` receives the document sentinel
+    and the result of ``target.finish( payload )`` is returned."""
+    return GenoshaTask( parse_steps( i, conn, target ) ).run()
+
+def parse_steps ( i, conn, target ) :
+    r"""The steps of ``parse`` for use with ``genosha.GenoshaTask``; a step is taken
+    for each object."""
+    cursor = conn.cursor()
+    cursor.execute( "SELECT item_id from SEQUENCE_ITEM where seq_id = ? order by ordinal ", ( int( i ), ) )
+    parts = [ row[0] for row in cursor.fetchall() ]
+    if len( parts ) != 3 :
+        raise ValueError, "not a genosha document: %s" % i
+    target.begin( decode( cursor, parts[0] ) )
+    cursor.execute( "SELECT data from ITEM where item_id = ? and type = 'sequence'", ( int( parts[1] ), ) )
+    rows = conn.cursor()
+    rows.execute( "SELECT item_id from SEQUENCE_ITEM where seq_id = ? order by ordinal ", ( int( cursor.fetchone()[0] ), ) )
+    for row in rows :
+        target.feed( decode( cursor, row[0] ) )
+        yield None
+    for value in finish_steps( target, decode( cursor, parts[2] ) ) :
+        yield value
 
 
 def encode( data, cursor, ids ) :
@@ -122,6 +155,15 @@ def encode_object ( data, cursor, ids ) :
     if hasattr( data, 'fields' ) :
         d.append( encode( data.fields, cursor, ids ) )
         f.append( "fields_id" )
+    if hasattr( data, 'persistent' ) :
+        d.append( encode( data.persistent, cursor, ids ) )
+        f.append( "persistent_id" )
+    if hasattr( data, 'state' ) :
+        d.append( encode( data.state, cursor, ids ) )
+        f.append( "state_id" )
+    if hasattr( data, 'data' ) :
+        d.append( sqlite3.Binary( genosha.raw_bytes( data.data ) ) )
+        f.append( "data" )
     cursor.execute( "INSERT into object_item ( " + ", ".join( f ) + " ) VALUES ( " + ", ".join( [ "?" ] * len( f ) ) + " ) ", d )
     cursor.execute( "INSERT into ITEM ( item_id, type, data ) VALUES ( ?, ?, ? )", [ item_id, 'object', item_id ] )
     return item_id
@@ -134,6 +176,40 @@ def encode_reference ( data, cursor, ids ) :
 
 encoders = { GenoshaObject : encode_object, GenoshaReference : encode_reference, list : encode_list, dict : encode_dict }
 
+class Writer ( object ) :
+    r"""Writes a document through ``cursor`` as the genosha structure is handed over
+    through ``begin``, ``feed`` (once for each GenoshaObject, in order) and ``finish``,
+    laid out as ``marshal`` lays it out.  ``finish`` returns the item id of the
+    document.  It does not commit the transaction."""
+    def __init__ ( self, cursor ) :
+        self.cursor = cursor
+        upgrade_tables( cursor )
+        self.ids = get_start_ids( cursor )
+
+    def _sequence ( self ) :
+        self.ids[2] += 1
+        seq_id = self.ids[2]
+        self.cursor.execute( 'INSERT into ITEM ( item_id, type, data ) values ( ?, ?, ? )', [ seq_id, 'sequence', seq_id ] )
+        return seq_id
+
+    def _append ( self, seq_id, item_id, ordinal ) :
+        self.cursor.execute( 'INSERT INTO SEQUENCE_ITEM ( seq_id, item_id, ordinal ) VALUES ( ?, ?, ? )', [ seq_id, item_id, ordinal ] )
+
+    def begin ( self, sentinel ) :
+        self.root = self._sequence()
+        self._append( self.root, encode( sentinel, self.cursor, self.ids ), 0 )
+        self.objects = self._sequence()
+        self._append( self.root, self.objects, 1 )
+        self.ordinal = 0
+
+    def feed ( self, obj ) :
+        self._append( self.objects, encode( obj, self.cursor, self.ids ), self.ordinal )
+        self.ordinal += 1
+
+    def finish ( self, payload ) :
+        self._append( self.root, encode( payload, self.cursor, self.ids ), 2 )
+        return self.root
+
 def decode ( cursor, item_id ) :
     item_id = int( item_id )
     cursor.execute( "SELECT item_id, type, data from ITEM WHERE item_id = ? order by item_id", ( item_id, ) )
@@ -162,8 +238,11 @@ def decode_reference ( cursor, ref_id ) :
 
 def decode_object ( cursor, item_id ) :
     item_id = int( item_id )
-    cursor.execute( "SELECT obj_id, type, instance_id, attribute, fields_id, items_id FROM object_item where item_id = ?", ( item_id, ) )
-    obj_id, kind, instance, attribute, fields, items = cursor.fetchone()
+    # databases written before the later columns were added lack them; read what is there
+    cursor.execute( "SELECT * FROM object_item where item_id = ?", ( item_id, ) )
+    row = dict( zip( [ column[0].lower() for column in cursor.description ], cursor.fetchone() ) )
+    obj_id, kind, instance, attribute, fields, items = [ row[name] for name in ( 'obj_id', 'type', 'instance_id', 'attribute', 'fields_id', 'items_id' ) ]
+    persistent, state, data = [ row.get( name ) for name in added_columns ]
     obj = GenoshaObject( oid = obj_id, type = kind )
     if instance :
         obj.instance = decode( cursor, instance )
@@ -173,6 +252,12 @@ def decode_object ( cursor, item_id ) :
         obj.fields = decode( cursor, fields )
     if items :
         obj.items = decode( cursor, items )
+    if persistent :
+        obj.persistent = decode( cursor, persistent )
+    if state :
+        obj.state = decode( cursor, state )
+    if data is not None :
+        obj.data = str( data )
     return obj
 
 decoders = { 'int' : lambda c, d : int(d)
@@ -188,12 +273,28 @@ decoders = { 'int' : lambda c, d : int(d)
     , 'map' : decode_map }
 
 def create_tables ( cursor ) :
-    cursor.execute( '''create table object_item ( item_id integer, obj_id integer, type text, instance_id integer, attribute text, fields_id integer, items_id integer )''' )
+    cursor.execute( '''create table object_item ( item_id integer, obj_id integer, type text, instance_id integer, attribute text, fields_id integer, items_id integer, persistent_id integer, state_id integer, data blob )''' )
     cursor.execute( '''create table sequence_item( seq_id integer, item_id integer, ordinal integer )''' )
     cursor.execute( '''create table map_item( map_id integer, key_id integer, value_id integer )''' )
     cursor.execute( '''create table item ( item_id integer, type text, data text )''' )
     return cursor
 
+# columns of object_item added after its first release, with their types
+added_columns = ( 'persistent_id', 'state_id', 'data' )
+added_types = { 'persistent_id' : 'integer', 'state_id' : 'integer', 'data' : 'blob' }
+
+def upgrade_tables ( cursor ) :
+    r"""Add the columns missing from an object_item table created by an earlier version,
+    so documents can be written to the database again.  Nothing is done if the table
+    does not exist."""
+    cursor.execute( "PRAGMA table_info( object_item )" )
+    columns = set( row[1].lower() for row in cursor.fetchall() )
+    if columns :
+        for name in added_columns :
+            if name not in columns :
+                cursor.execute( "ALTER TABLE object_item ADD COLUMN %s %s" % ( name, added_types[name] ) )
+    return cursor
+
 def get_start_ids ( cursor ) :
     cursor.execute( "select max( item_id ) from item" )
     item_id = int( cursor.fetchone()[0] or 0 )
@@ -22,6 +22,10 @@ The public interface should be very familiar to anyone who has used the :mod:`js
 human-readable and editable than pickle files are; the tradeoff is that the Genosha XML
 output may be significantly larger than a corresponding pickle.
 
+Documents read with ``load`` are parsed incrementally: each top-level <object> is handed
+to the decoder as soon as it is complete and its elements are then discarded, so large
+documents do not need to be held in memory as an element tree.
+
 The XML elements used in the representation are:
 
     <genosha type='...'>...</genosha> - the genosha-marshalled data.  the ``type`` attribute identifies the genosha version.
@@ -31,7 +35,7 @@ The XML elements used in the representation are:
         ``type`` - the object type information (module/scopes.to.typename)
         ``oid`` - the object's locally-unique reference id
         ``attribute`` - used for to identify special attributes on an object (e.g. @classmethods)
-        contains <instance>, <items>, <fields> children
+        contains <instance>, <items>, <fields>, <persistent>, <state> and <data> children
 
     <reference oid='...'/>  - a GenoshaReference pointing to the `oid` locally-unique reference number
 
@@ -48,6 +52,11 @@ The XML elements used in the representation are:
     <fields>...</field> - denotes the fields of the objects (attributes or contents of the object's __dict__ or slots).
         contains a single <map> child.
 
+    <state>...</state> - the state returned by the object's __getstate__, when it is not a dict of fields.
+        contains one child of <object>, <reference/>, <primitive>, <list> or <map>.
+
+    <data>...</data> - the raw contents of a buffer (bytearray, array, ...), in base64.
+
     <list>...</list> - represents a simple sequence.
         contains zero or more <item> children.
 
@@ -59,47 +68,212 @@ The XML elements used in the representation are:
 
     <entry><key>...</key><value>...</value></entry> - represents an entry in the map.
         each of key and value may contain a single child of <object>, <reference/>, <primitive>, <list> or <map>.
+
+A second, compact dialect can be written by passing ``compact = True`` to ``marshal``, ``dump``
+or ``dumps``.  Its root element is <genosha type='@genosha:1@compact:1'>; ``load`` and ``loads``
+recognize either dialect from that attribute.  The compact elements are:
+
+    <o id='...' t='...' a='...' in='...'>...</o> - a GenoshaObject.
+        ``id``, ``t`` and ``a`` are the oid, type and attribute.  ``in`` is the oid of the bound
+        instance of an instance method (an <N> child holds it if it is not a reference).  contains
+        an optional <I> child holding a single value (the items), an optional <F> child
+        holding <e> entries (the fields), optional <P> and <S> children holding the
+        persistent id and the state, and an optional <B> child holding the raw contents of a
+        buffer in base64.
+
+    <r v='...'/> - a GenoshaReference to the oid ``v``.
+
+    <i v='...'/>, <l v='...'/>, <f v='...'/>, <b v='...'/>, <s v='...'/>, <u v='...'/>, <n/> - primitives
+        (int, long, float, bool, str, unicode and None respectively) with their value in ``v``.
+        A str or unicode holding a tab or carriage return has its value backslash-escaped in
+        ``e`` instead, as attribute-value normalization would turn those into spaces.
+
+    <L>...</L> - a simple sequence.  contains zero or more values.
+
+    <M>...</M> - a dict/map.  contains zero or more <e> children.
+
+    <e k='...' r='...'>...</e> - an entry in a map.  ``k`` holds the key when it is a str
+        (without tab or carriage return); otherwise the key is the first child.  ``r`` holds
+        the oid of the value when it is a reference; otherwise the value is the last child.
 """
 import xml.etree.ElementTree as ET
+import base64
+from xml.sax.saxutils import quoteattr
 
-from genosha import GenoshaObject, GenoshaReference, GenoshaEncoder, GenoshaDecoder
+import genosha
+from genosha import GenoshaObject, GenoshaReference, GenoshaEncoder, GenoshaDecoder, GenoshaCollector, GenoshaTask, SENTINEL, finish_steps
+from genosha import compression as _compression
 
 __version__ = "0.1"
 __author__ = "Shawn Sulma <genosha@470th.org>"
-__all__ = [ 'marshal', 'unmarshal', 'dumps', 'dump', 'loads', 'load' ]
+__all__ = [ 'marshal', 'unmarshal', 'dumps', 'dumps_many', 'dump', 'loads', 'load', 'dump_task', 'load_task', 'parse', 'extracts', 'extract' ]
+
+COMPACT = SENTINEL + "compact:1"
+
+def marshal ( obj, compact = False, persistent_id = None, strings = 0 ) :
+    r"""Prepares the passed object ``obj`` for expression as XML output.  If ``compact``
+    is true the compact dialect is used.  ``persistent_id`` and ``strings`` are as for
+    GenoshaEncoder."""
+    return _tree( GenoshaEncoder( persistent_id = persistent_id, strings = strings ).marshal( obj ), compact )
 
-def marshal ( obj ) :
-    r"""Prepares the passed object ``obj`` for expression as XML output."""
-    _m = GenoshaEncoder().marshal( obj )
+def _tree ( _m, compact ) :
     root = ET.Element( "genosha" )
-    root.set( 'type', _m[0] )
+    if compact :
+        root.set( 'type', COMPACT )
+        encode = compact_encode
+    else :
+        root.set( 'type', _m[0] )
+        encode = encode_element
     for item in _m[1:] :
-        encode_element( root, item )
+        encode( root, item )
     return ET.ElementTree( root )
 
-def unmarshal ( xmldoc ) :
-    r"""Translates the passed XML etree ``xmldoc`` into a Genosha structure."""
-    return GenoshaDecoder().unmarshal( decode( xmldoc ) )
+def unmarshal ( xmldoc, persistent_load = None ) :
+    r"""Translates the passed XML etree ``xmldoc`` into a Genosha structure.
+    ``persistent_load`` is as for GenoshaDecoder."""
+    return GenoshaDecoder( persistent_load = persistent_load ).unmarshal( decode( xmldoc ) )
 
-def dumps ( o ) :
+def dumps ( o, compact = False, persistent_id = None, strings = 0 ) :
     r"""Dump the passed object ``o`` (and its refererred object graph) as XML which
-    is returned as a string."""
-    return ET.tostring( marshal( o ).getroot() )
+    is returned as a string.  If ``compact`` is true the compact dialect is used.
+    ``persistent_id`` and ``strings`` are as for GenoshaEncoder."""
+    return ET.tostring( marshal( o, compact, persistent_id, strings ).getroot() )
+
+def dumps_many ( objs, compact = False, encoder = None ) :
+    r"""Dump each object in ``objs`` as XML, returning the list of strings.  A single
+    GenoshaEncoder (``encoder`` if it is given) is shared by all of them."""
+    encoder = encoder or GenoshaEncoder()
+    return [ ET.tostring( _tree( doc, compact ).getroot() ) for doc in encoder.marshal_many( objs ) ]
 
-def dump ( o, f ) :
+def dump ( o, f, compact = False, compression = None, compresslevel = None, persistent_id = None, strings = 0 ) :
     r"""Dump the passed object ``o`` (and its refererred object graph) as XML which
-    is written to the file-like object ``f`` (which has a .write method)."""
-    marshal( o ).write( f )
+    is written to the file-like object ``f`` (which has a .write method).  If ``compact``
+    is true the compact dialect is used.  If ``compression`` is given ('zlib', 'gzip',
+    'bz2' or 'lzma') the output is compressed as it is written, at ``compresslevel`` (by
+    default the format's level in ``genosha.compression.levels``).  ``persistent_id`` and ``strings`` are as for GenoshaEncoder."""
+    out = _compression.writer( f, compression, compresslevel )
+    try :
+        marshal( o, compact, persistent_id, strings ).write( out )
+    finally :
+        if out is not f :
+            out.close()
 
-def loads ( s ) :
+def loads ( s, persistent_load = None ) :
     r"""Convert the passed XML string ``s`` back into Python objects with their
-    cross references restored."""
-    return unmarshal( ET.fromstring( s ) )
+    cross references restored.  ``persistent_load`` is as for GenoshaDecoder."""
+    return genosha.paused_gc( lambda : unmarshal( ET.fromstring( s ), persistent_load ) )
 
-def load ( f ) :
+def load ( f, persistent_load = None ) :
     r"""Read an XML document from the file-like object ``f`` and converts it back into
-    Python objects with their cross references restored."""
-    return unmarshal( ET.parse( f ) )
+    Python objects with their cross references restored.  The document is parsed
+    incrementally (see ``parse``) so the full element tree is never held in memory.
+    Compressed input is recognized and decompressed as it is read.  ``f`` may also be
+    the name of a file.  ``persistent_load`` is as for GenoshaDecoder."""
+    f = _compression.reader( f )
+    try :
+        return genosha.paused_gc( parse, f, GenoshaDecoder( persistent_load = persistent_load ) )
+    finally :
+        f.close()
+
+def extracts ( s, path ) :
+    r"""Convert only the part of the XML string ``s`` found at ``path`` (and what it refers
+    to) back into Python objects.  See ``genosha.extract`` for the path syntax."""
+    return genosha.extract( decode( ET.fromstring( s ) ), path )
+
+def extract ( f, path ) :
+    r"""Convert only the part of the XML document in the file-like object ``f`` found at
+    ``path`` (and what it refers to) back into Python objects.  The document is parsed
+    incrementally.  See ``genosha.extract`` for the path syntax."""
+    f = _compression.reader( f )
+    try :
+        return genosha.extract( parse( f, GenoshaCollector() ), path )
+    finally :
+        f.close()
+
+def dump_task ( o, f, compact = False, budget = 1000 ) :
+    r"""Return a ``genosha.GenoshaTask`` that dumps ``o`` to the file-like object ``f``
+    as ``dump`` does, writing each object once it is complete and pausing every
+    ``budget`` objects."""
+    return GenoshaTask( GenoshaEncoder().marshal_steps( o, Writer( f.write, compact ) ), budget )
+
+def load_task ( f, budget = 1000 ) :
+    r"""Return a ``genosha.GenoshaTask`` that loads the XML document in the file-like
+    object ``f`` as ``load`` does, pausing every ``budget`` objects.  Its ``result``
+    is the loaded object."""
+    return GenoshaTask( parse_steps( _compression.reader( f ), GenoshaDecoder() ), budget )
+
+def parse ( source, target ) :
+    r"""Incrementally parse the genosha XML document in ``source`` (a filename or a
+    file-like object with a .read method).  Each top-level <object> is converted to a
+    GenoshaObject and handed to ``target.feed`` as soon as its end tag is seen, after
+    which its elements are discarded.  ``target.begin`` receives the document type
+    before any objects and ``target.finish`` receives the payload; its result is
+    returned.  A ``GenoshaDecoder`` is a suitable target."""
+    return GenoshaTask( parse_steps( source, target ) ).run()
+
+def parse_steps ( source, target ) :
+    r"""The steps of ``parse`` for use with ``genosha.GenoshaTask``; a step is taken
+    for each object."""
+    depth = 0
+    objects = None
+    reading = False
+    payload = None
+    for event, element in ET.iterparse( source, events = ( 'start', 'end' ) ) :
+        if event == 'start' :
+            depth += 1
+            if depth == 1 :
+                if element.tag != 'genosha' :
+                    raise ValueError, "not a genosha XML document"
+                kind = element.get( 'type' )
+                decode_item, decode_payload = dialects.get( kind, ( decode_child, decode_element ) )
+                target.begin( SENTINEL if kind in dialects else kind )
+            elif depth == 2 and objects is None :
+                objects = element
+                reading = True
+            continue
+        depth -= 1
+        if depth == 2 and reading : # an entry of the object list
+            target.feed( decode_item( element ) )
+            objects.clear()
+            yield None
+        elif depth == 1 :
+            if element is objects :
+                reading = False
+            else :
+                payload = decode_payload( element )
+            element.clear()
+        elif depth == 0 :
+            for value in finish_steps( target, payload ) :
+                yield value
+            return
+    raise ValueError, "truncated genosha XML document"
+
+class Writer ( object ) :
+    r"""Writes an XML document to the ``write`` callable as the genosha structure is
+    handed over through ``begin``, ``feed`` (once for each GenoshaObject, in order) and
+    ``finish``.  If ``compact`` is true the compact dialect is used."""
+    def __init__ ( self, write, compact = False ) :
+        self.write = write
+        self.compact = compact
+        self.encode, self.tag = compact and ( compact_encode, 'L' ) or ( encode_element, 'list' )
+
+    def begin ( self, sentinel ) :
+        self.write( '<genosha type=%s><%s>' % ( quoteattr( self.compact and COMPACT or sentinel ), self.tag ) )
+
+    def feed ( self, obj ) :
+        if self.compact :
+            parent = ET.Element( 'L' )
+            compact_encode( parent, obj )
+            self.write( ET.tostring( parent[0] ) )
+        else :
+            parent = ET.Element( 'item' )
+            encode_element( parent, obj )
+            self.write( ET.tostring( parent ) )
+
+    def finish ( self, payload ) :
+        parent = ET.Element( 'genosha' )
+        self.encode( parent, payload )
+        self.write( '</%s>%s</genosha>' % ( self.tag, ET.tostring( parent[0] ) ) )
 
 primitives = { 'int' : int, 'str' : str, 'unicode' : unicode, 'float' : float, 'long' : long, 'bool' : bool, 'NoneType' : lambda x : None }
 
@@ -122,6 +296,12 @@ def encode_object ( parent, data ) :
         encode_element( ET.SubElement( e, 'items' ), data.items )
     if hasattr( data, 'fields' ) :
         encode_element( ET.SubElement( e, 'fields' ), data.fields )
+    if hasattr( data, 'persistent' ) :
+        encode_element( ET.SubElement( e, 'persistent' ), data.persistent )
+    if hasattr( data, 'state' ) :
+        encode_element( ET.SubElement( e, 'state' ), data.state )
+    if hasattr( data, 'data' ) :
+        ET.SubElement( e, 'data' ).text = base64.b64encode( data.data )
 
 def encode_reference ( parent, data ) :
     ET.SubElement( parent, 'reference' ).set( 'oid', str( data.oid ) )
@@ -143,6 +323,8 @@ encoders = { GenoshaObject : encode_object, GenoshaReference : encode_reference,
 def decode ( root ) :
     if root.tag != 'genosha' :
         raise ValueError, "not a genosha XML document"
+    if root.get( 'type' ) == COMPACT :
+        return [ SENTINEL ] + [ compact_decode( element ) for element in root ]
     res = [ root.get( 'type' ) ]
     for element in root :
         res.append( decode_element( element ) )
@@ -185,6 +367,137 @@ def decode_child ( element ) :
 decoders = { 'object' : decode_object, 'list' : decode_list, 'primitive' : decode_primitive
         , 'map' : decode_map, 'reference' : decode_reference
         , 'fields' : decode_child, 'items' : decode_child, 'item' : decode_child
-        , 'key' : decode_child, 'value' : decode_child, 'instance' : decode_child
+        , 'key' : decode_child, 'value' : decode_child, 'instance' : decode_child, 'persistent' : decode_child, 'state' : decode_child
+        , 'data' : lambda e : base64.b64decode( e.text or '' )
         , 'entry' : lambda e : ( decode_element( e.find( 'key' ) ), decode_element( e.find( 'value' ) ) )
     }
+
+compact_primitives = { int : ( 'i', str ), long : ( 'l', str ), float : ( 'f', repr ), bool : ( 'b', lambda b : b and '1' or '0' )
+        , str : ( 's', None ), unicode : ( 'u', None ) }
+
+def compact_encode ( parent, data ) :
+    kind = type( data )
+    if kind in compact_encoders :
+        compact_encoders[kind]( parent, data )
+    elif kind in compact_primitives :
+        tag, conv = compact_primitives[kind]
+        if conv is None and _unsafe_attribute( data ) :
+            ET.SubElement( parent, tag ).set( 'e', data.encode( kind is str and 'string_escape' or 'unicode_escape' ) )
+        else :
+            ET.SubElement( parent, tag ).set( 'v', conv( data ) if conv else data )
+    elif data is None :
+        ET.SubElement( parent, 'n' )
+    else :
+        raise TypeError, "'%s' is an unsupported type." % kind.__name__
+
+def compact_encode_object ( parent, data ) :
+    e = ET.SubElement( parent, 'o' )
+    for attrib, name in ( ( 'oid', 'id' ), ( 'type', 't' ), ( 'attribute', 'a' ) ) :
+        if hasattr( data, attrib ) :
+            e.set( name, str( getattr( data, attrib ) ) )
+    if hasattr( data, 'instance' ) :
+        if type( data.instance ) is GenoshaReference :
+            e.set( 'in', str( data.instance.oid ) )
+        else :
+            compact_encode( ET.SubElement( e, 'N' ), data.instance )
+    if hasattr( data, 'items' ) :
+        compact_encode( ET.SubElement( e, 'I' ), data.items )
+    if hasattr( data, 'fields' ) :
+        compact_encode_entries( ET.SubElement( e, 'F' ), data.fields )
+    if hasattr( data, 'persistent' ) :
+        compact_encode( ET.SubElement( e, 'P' ), data.persistent )
+    if hasattr( data, 'state' ) :
+        compact_encode( ET.SubElement( e, 'S' ), data.state )
+    if hasattr( data, 'data' ) :
+        ET.SubElement( e, 'B' ).text = base64.b64encode( data.data )
+
+def compact_encode_reference ( parent, data ) :
+    ET.SubElement( parent, 'r' ).set( 'v', str( data.oid ) )
+
+def compact_encode_list ( parent, data ) :
+    e = ET.SubElement( parent, 'L' )
+    for item in data :
+        compact_encode( e, item )
+
+def compact_encode_map ( parent, data ) :
+    compact_encode_entries( ET.SubElement( parent, 'M' ), data )
+
+def compact_encode_entries ( parent, data ) :
+    for key, value in data.items() :
+        e = ET.SubElement( parent, 'e' )
+        if type( key ) is str and not _unsafe_attribute( key ) :
+            e.set( 'k', key )
+        else :
+            compact_encode( e, key )
+        if type( value ) is GenoshaReference :
+            e.set( 'r', str( value.oid ) )
+        else :
+            compact_encode( e, value )
+
+def _unsafe_attribute ( data ) :
+    r"""Whether ``data`` holds characters that attribute-value normalization would turn
+    into spaces (ElementTree leaves tab and carriage return unescaped in attributes)."""
+    return '\t' in data or '\r' in data
+
+compact_encoders = { GenoshaObject : compact_encode_object, GenoshaReference : compact_encode_reference
+        , list : compact_encode_list, dict : compact_encode_map }
+
+def compact_decode ( element ) :
+    try :
+        return compact_decoders[element.tag]( element )
+    except KeyError:
+        raise ValueError, "unknown tag: %s" % element.tag
+
+def compact_decode_object ( element ) :
+    obj = GenoshaObject()
+    for name, attrib in ( ( 'id', 'oid' ), ( 't', 'type' ), ( 'a', 'attribute' ) ) :
+        if name in element.attrib :
+            setattr( obj, attrib, element.get( name ) )
+    if 'id' in element.attrib :
+        obj.oid = int( obj.oid )
+    if 'in' in element.attrib :
+        obj.instance = GenoshaReference( element.get( 'in' ) )
+    for child in element :
+        if child.tag == 'I' :
+            obj.items = compact_decode( child[0] )
+        elif child.tag == 'F' :
+            obj.fields = compact_decode_entries( child )
+        elif child.tag == 'N' :
+            obj.instance = compact_decode( child[0] )
+        elif child.tag == 'P' :
+            obj.persistent = compact_decode( child[0] )
+        elif child.tag == 'S' :
+            obj.state = compact_decode( child[0] )
+        elif child.tag == 'B' :
+            obj.data = base64.b64decode( child.text or '' )
+        else :
+            raise ValueError, "unknown <o> data: " + child.tag
+    return obj
+
+def compact_decode_entries ( element ) :
+    d = {}
+    for entry in element :
+        children = list( entry )
+        key = entry.get( 'k' )
+        if key is None :
+            key = compact_decode( children.pop( 0 ) )
+        if 'r' in entry.attrib :
+            d[key] = GenoshaReference( entry.get( 'r' ) )
+        else :
+            d[key] = compact_decode( children[-1] )
+    return d
+
+compact_decoders = { 'o' : compact_decode_object
+        , 'r' : lambda e : GenoshaReference( e.get( 'v' ) )
+        , 'L' : lambda e : [ compact_decode( i ) for i in e ]
+        , 'M' : compact_decode_entries
+        , 'i' : lambda e : int( e.get( 'v' ) )
+        , 'l' : lambda e : long( e.get( 'v' ) )
+        , 'f' : lambda e : float( e.get( 'v' ) )
+        , 'b' : lambda e : e.get( 'v' ) == '1'
+        , 's' : lambda e : str( e.get( 'v' ) ) if 'e' not in e.attrib else str( e.get( 'e' ) ).decode( 'string_escape' )
+        , 'u' : lambda e : unicode( e.get( 'v' ) ) if 'e' not in e.attrib else str( e.get( 'e' ) ).decode( 'unicode_escape' )
+        , 'n' : lambda e : None
+    }
+
+dialects = { SENTINEL : ( decode_child, decode_element ), COMPACT : ( compact_decode, compact_decode ) }
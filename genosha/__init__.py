@@ -42,8 +42,11 @@ the original objects (including references and cycles of references as necessary
 The creation of the serialization structures is performed in memory; the output is not
 streamable.
 
-There are two serialization modules provided.  genosha.JSON provides JSON
+There are three serialization modules provided.  genosha.JSON provides JSON
 serialization/deserialization.  genosha.XML provides and XML implementation using ElementTree.
+genosha.Binary provides a compact binary encoding for when readability does not matter.
+genosha.Archive stores that encoding one object per record with an index, so that parts of a
+large graph can be loaded from an mmap-ed file without reading the rest.
 Each of the modules provides an interface that users of :mod:`pickle` should find familiar
 (dump, dumps, load, loads).
 
@@ -52,6 +55,13 @@ Usage of the genosha module is relatively straightforward.
     >>> out = genosha.marshal( obj )
     >>> obj_again = genosha.unmarshal( out )
 
+To write a snapshot of a graph that is still being changed, ``snapshot_in_background``
+dumps it from a forked child process (see :mod:`genosha.snapshot`).  To find out which
+types a dump or load spends its time and bytes on, see :mod:`genosha.stats`; to find out
+what an existing document is made of, run ``python -m genosha document`` (see
+:mod:`genosha.survey`).  ``transcode`` converts a document to another format without
+loading it (see :mod:`genosha.transcoding`).
+
 It is probably a good idea to catch TypeErrors, as these are thrown when genosha
 encounters a situation it can't handle (e.g. one of the above-listed problematic situations).
 
@@ -67,8 +77,8 @@ serializations.  The syntax for those is much the same as for pickle:
     >>> obj_again = genosha.XML.loads( xml_string )
 
 """
-from collections import defaultdict, deque
-import sys, types, inspect
+from collections import defaultdict, deque, OrderedDict
+import sys, types, inspect, re
 try :
     import gc
 except : # some python implementations (jython?, pypy?, etc) may not have gc module.  This is okay.
@@ -80,21 +90,266 @@ __author__ = "Shawn Sulma <genosha@470th.org>"
 # special value to indicate the version of genosha object structure used.
 SENTINEL = "@genosha:1@"
 
+HEAPTYPE = 1 << 9 # Py_TPFLAGS_HEAPTYPE: set for classes defined in python code.
+
+# registered type aliases: alias -> class or function, and class or function -> alias.
+aliases = {}
+registered = {}
+
+def register ( obj, alias = None ) :
+    r"""Register the class or function ``obj`` under the short name ``alias`` (by default
+    its ``__name__``).  It is then written as ``@alias`` instead of its full scoped name,
+    which also spares the encoder the search for that name, and the decoder finds it again
+    with a single lookup.  Readers must register the same aliases.  Returns ``obj``, so
+    this can be used as a class decorator."""
+    alias = alias or obj.__name__
+    name = intern( "@" + alias )
+    if aliases.get( alias, obj ) is not obj or registered.get( obj, name ) != name :
+        raise ValueError, "'%s' is already registered with another alias or object." % alias
+    aliases[alias] = obj
+    registered[obj] = name
+    return obj
+
+def register_module ( module, prefix = "" ) :
+    r"""Register every class and function defined at the top level of ``module`` (see
+    ``register``) under its name with ``prefix`` prepended."""
+    for name, obj in sorted( module.__dict__.items() ) :
+        if isinstance( obj, ( type, types.FunctionType ) ) and obj.__module__ == module.__name__ and obj.__name__ == name :
+            register( obj, prefix + name )
+
+def unregister ( obj ) :
+    r"""Remove the alias of ``obj`` registered with ``register``."""
+    del aliases[registered.pop( obj )[1:]]
+
+# reducers for value types: scoped type name -> ( reduce, construct, raw ).
+reducers = {}
+
+def register_reducer ( kind, reduce, construct, raw = False ) :
+    r"""Write instances of the class ``kind`` (or of the class with the scoped name
+    ``kind``, e.g. 'decimal/Decimal', which need not be imported yet) as the value
+    returned by ``reduce( obj )`` instead of as an object with fields.
+    ``construct( kind, value )`` turns that value back into an instance.  Lists, tuples and
+    dicts in the value are written in place (tuples become lists), so that ``construct``
+    receives them complete; any other objects in it are passed by reference and, like the
+    items of a tuple, may not have been filled in yet when ``construct`` is called.
+    Subclasses of ``kind`` use the same reducer, and documents that stored instances with
+    their fields can still be read.  Encoders created before the call do not see it.
+    Returns ``kind``.
+
+    If ``raw`` is true, ``reduce`` returns a pair: the value (or None) and an object
+    supporting the buffer interface (or a memoryview), whose bytes are written as the
+    ``data`` of the GenoshaObject without being copied first (see ``raw_bytes``).  ``construct( kind, value, data )`` then
+    receives them back, ``data`` as a str."""
+    name = kind if isinstance( kind, basestring ) else "%s/%s" % ( kind.__module__, kind.__name__ )
+    reducers[name] = ( reduce, construct, raw )
+    return kind
+
+def unregister_reducer ( kind ) :
+    r"""Remove the reducer registered for ``kind`` with ``register_reducer``."""
+    del reducers[kind if isinstance( kind, basestring ) else "%s/%s" % ( kind.__module__, kind.__name__ )]
+
+def raw_bytes ( data ) :
+    r"""Return the ``data`` of a GenoshaObject as a str, for writers that cannot take the
+    buffer itself.  A memoryview (which ``buffer`` does not accept) is copied with
+    ``tobytes``, so that items wider than a byte are counted in bytes."""
+    if type( data ) is memoryview :
+        return data.tobytes()
+    return str( data )
+
+def _trimmed ( value, keep ) :
+    while len( value ) > keep and not value[-1] :
+        value.pop()
+    return value
+
+def _reduce_datetime ( d ) :
+    if d.tzinfo is not None :
+        return [ d.year, d.month, d.day, d.hour, d.minute, d.second, d.microsecond, d.tzinfo ]
+    return _trimmed( [ d.year, d.month, d.day, d.hour, d.minute, d.second, d.microsecond ], 3 )
+
+def _reduce_time ( t ) :
+    if t.tzinfo is not None :
+        return [ t.hour, t.minute, t.second, t.microsecond, t.tzinfo ]
+    return _trimmed( [ t.hour, t.minute, t.second, t.microsecond ], 1 )
+
+def _shared_string ( kind, value ) :
+    return intern( value ) if type( value ) is str else value
+
+def _construct_args ( kind, value ) :
+    return kind( *value )
+
+def _construct_arg ( kind, value ) :
+    return kind( value )
+
+register_reducer( 'datetime/datetime', _reduce_datetime, _construct_args )
+register_reducer( 'datetime/date', lambda d : [ d.year, d.month, d.day ], _construct_args )
+register_reducer( 'datetime/time', _reduce_time, _construct_args )
+register_reducer( 'datetime/timedelta', lambda d : _trimmed( [ d.days, d.seconds, d.microseconds ], 1 ), _construct_args )
+register_reducer( 'decimal/Decimal', str, _construct_arg )
+register_reducer( 'uuid/UUID', lambda u : u.hex, _construct_arg )
+
+# buffers are written little-endian so that documents can move between machines.
+_swapped = sys.byteorder != 'little'
+
+def _reduce_array ( a ) :
+    if _swapped and a.itemsize > 1 :
+        a = a.__copy__()
+        a.byteswap()
+    return a.typecode, buffer( a )
+
+def _construct_array ( kind, typecode, data ) :
+    a = kind( typecode )
+    a.fromstring( data )
+    if _swapped and a.itemsize > 1 :
+        a.byteswap()
+    return a
+
+def _reduce_ndarray ( a ) :
+    if a.dtype.hasobject or a.dtype.fields :
+        raise TypeError, "arrays of dtype '%s' are not supported." % a.dtype
+    if not a.flags.c_contiguous :
+        a = a.copy()
+    return [ a.dtype.str, list( a.shape ) ], buffer( a )
+
+def _construct_ndarray ( kind, value, data ) :
+    import numpy
+    dtype, shape = value
+    a = numpy.empty( shape, dtype )
+    if data :
+        a.reshape( -1 )[:] = numpy.frombuffer( data, dtype )
+    return a if kind is numpy.ndarray else a.view( kind )
+
+register_reducer( '__builtin__/bytearray', lambda b : ( None, buffer( b ) ), lambda kind, value, data : kind( data ), raw = True )
+register_reducer( '__builtin__/memoryview', lambda m : ( None, m ), lambda kind, value, data : kind( bytearray( data ) ), raw = True )
+register_reducer( 'array/array', _reduce_array, _construct_array, raw = True )
+register_reducer( 'numpy/ndarray', _reduce_ndarray, _construct_ndarray, raw = True )
+
 def marshal ( obj ) :
     r"""Generate a representation of ``obj`` as a list of GenoshaObjects, GenoshaReferences
     and primitives.  The resulting list object will have no cycles in object references and
     can be serialized in whatever manner is appropriate."""
     return GenoshaEncoder().marshal( obj )
 
-def unmarshal ( input ) :
+def unmarshal ( input, lazy = False ) :
     r"""Convert a representation generated by ``marshal`` back into proper Python objects
     with their references restored.  It assumes that there are no forward-pointing
     GenoshaReferences (i.e. any references will be to objects that have been already
-    specified previously in the ``input``."""
-    return GenoshaDecoder().unmarshal( input )
+    specified previously in the ``input``.  If ``lazy`` is true, objects are only built
+    when they are reached from the root, and the fields of class instances are only
+    filled in when the instance is first used (see ``GenoshaDecoder``)."""
+    return GenoshaDecoder( lazy = lazy ).unmarshal( input )
+
+def marshal_many ( roots, shared = False ) :
+    r"""Marshal each object in ``roots`` in one session (see
+    ``GenoshaEncoder.marshal_many``).  This is considerably cheaper than calling
+    ``marshal`` for each of many small objects."""
+    return GenoshaEncoder().marshal_many( roots, shared )
+
+def unmarshal_many ( docs ) :
+    r"""Convert each structure generated by ``marshal`` or ``marshal_many`` in ``docs``
+    back into Python objects, returning the list of roots."""
+    return GenoshaDecoder().unmarshal_many( docs )
+
+def extract ( doc, path, decoder = None, reference_hook = None ) :
+    r"""Convert only part of the marshalled document ``doc``: the value found by following
+    ``path`` from its root, along with whatever that value refers to.  Nothing else in the
+    document is built.
+
+    ``path`` starts with ``root`` and continues with ``.name``, ``[n]`` or ``['key']``
+    steps.  On a GenoshaObject a step selects ``fields``, ``items`` or ``instance``; on
+    a list or map it selects an index or key.
+    References are followed wherever they are met, e.g.
+
+        >>> genosha.extract( doc, "root.fields.orders.items[42]" )
+
+    ``decoder`` is the GenoshaDecoder used to build the result.  ``reference_hook``, if
+    given, is called with each value on the path and should return an oid for values
+    that are references in the document's own representation (or None)."""
+    try :
+        if doc[0] != SENTINEL :
+            raise ValueError, "Malfomed input."
+    except IndexError :
+        raise ValueError, "Malformed input."
+    records = dict( ( data.oid, data ) for data in doc[1] )
+    return extract_value( doc[-1], records, path, decoder, reference_hook )
+
+def extract_value ( value, records, path, decoder = None, reference_hook = None ) :
+    r"""As ``extract``, starting from the marshalled ``value`` with the objects it may
+    refer to in ``records`` (a mapping of oid to GenoshaObject)."""
+    steps = _parse_path( path )
+    for step in steps :
+        oid = reference_hook( value ) if reference_hook else None
+        if oid is None and type( value ) is GenoshaReference :
+            oid = value.oid
+        if oid is not None :
+            value = records[oid]
+        try :
+            if isinstance( value, GenoshaObject ) :
+                value = getattr( value, step )
+            else :
+                value = value[step]
+        except ( AttributeError, KeyError, IndexError, TypeError ) :
+            raise ValueError, "path step %r not found in %s" % ( step, path )
+    return ( decoder or GenoshaDecoder() ).resolve( value, records )
+
+_path_step = re.compile( r"""\.([A-Za-z_]\w*)|\[(-?\d+)\]|\[(['"])(.*?)\3\]""" )
+
+def paused_gc ( f, *args, **kwargs ) :
+    r"""Call ``f`` with the passed arguments while the cyclic garbage collector is switched
+    off, and return its result.  Building a large graph allocates containers far faster
+    than the collector expects, and each of its passes has to walk all of them."""
+    enabled = gc and gc.isenabled()
+    gc and gc.disable()
+    try :
+        return f( *args, **kwargs )
+    finally :
+        enabled and gc.enable()
+
+def _parse_path ( path ) :
+    if not path.startswith( 'root' ) :
+        raise ValueError, "malformed path: %s" % path
+    steps = []
+    pos = len( 'root' )
+    while pos < len( path ) :
+        m = _path_step.match( path, pos )
+        if not m :
+            raise ValueError, "malformed path: %s" % path
+        name, index, quote, key = m.groups()
+        steps.append( name or ( int( index ) if index else key ) )
+        pos = m.end()
+    return steps
+
+def finish_steps ( target, payload ) :
+    r"""Return the steps (see ``GenoshaTask``) that complete the incremental decode of
+    ``target`` with ``payload``: its ``finish_steps`` if it has them, otherwise a single
+    step calling ``target.finish``."""
+    if hasattr( target, 'finish_steps' ) :
+        return target.finish_steps( payload )
+    return iter( [ target.finish( payload ) ] )
+
+def references ( data ) :
+    r"""Return the oids of all GenoshaReferences contained in the marshalled value ``data``
+    (a GenoshaObject, list, dict or primitive).  Nested GenoshaObjects are searched but
+    references are not followed."""
+    oids = []
+    stack = [ data ]
+    while stack :
+        data = stack.pop()
+        kind = type( data )
+        if kind is GenoshaReference :
+            oids.append( data.oid )
+        elif kind is list :
+            stack.extend( data )
+        elif kind is dict :
+            stack.extend( data.keys() )
+            stack.extend( data.values() )
+        elif isinstance( data, GenoshaObject ) :
+            for slot in ( 'instance', 'items', 'fields', 'state' ) :
+                if hasattr( data, slot ) :
+                    stack.append( getattr( data, slot ) )
+    return oids
 
 class GenoshaObject ( object ) :
-    __slots__ = ( 'type', 'oid', 'fields', 'items', 'attribute', 'instance' )
+    __slots__ = ( 'type', 'oid', 'fields', 'items', 'attribute', 'instance', 'persistent', 'state', 'data' )
     def __init__ ( self, **kwargs ) :
         for k, v in kwargs.items() :
             setattr( self, k, v )
@@ -108,6 +363,64 @@ class GenoshaReference ( object ) :
     def __repr__ ( self ) :
         return "<GenoshaReference: oid=%d>" % self.oid
 
+class GenoshaCollector ( object ) :
+    r"""A target for the incremental ``parse`` functions of the serialization modules
+    which collects the GenoshaObjects it is fed into a marshalled structure (as returned
+    by ``marshal``) instead of decoding them."""
+    def begin ( self, sentinel ) :
+        self.sentinel = sentinel
+        self.objects = []
+
+    def feed ( self, data ) :
+        self.objects.append( data )
+
+    def finish ( self, payload ) :
+        return [ self.sentinel, self.objects, payload ]
+
+class GenoshaTask ( object ) :
+    r"""A dump or load run cooperatively.  ``steps`` is a generator that does the work for
+    one object at a time, yielding in between; the last value it yields is the result.
+    Each call to ``step`` advances it by up to ``budget`` objects, so a large graph can be
+    processed a slice at a time from an event loop or scheduler, e.g.::
+
+        task = genosha.JSON.dump_task( obj, f )
+        while task.step() :
+            wait_for_next_turn()
+
+    Iterating over the task does the same, yielding between slices (which suits
+    generator-based coroutines).  ``run`` finishes all remaining work at once.  Once
+    ``done`` is true the outcome is in ``result``."""
+    def __init__ ( self, steps, budget = 1000 ) :
+        if budget < 1 :
+            raise ValueError, "budget must be at least 1"
+        self.steps = steps
+        self.budget = budget
+        self.done = False
+        self.result = None
+
+    def step ( self ) :
+        r"""Do the work for up to ``budget`` objects.  Returns True while work remains."""
+        if self.done :
+            return False
+        n = self.budget
+        for self.result in self.steps :
+            n -= 1
+            if not n :
+                return True
+        self.done = True
+        return False
+
+    def run ( self ) :
+        if not self.done :
+            for self.result in self.steps :
+                pass
+            self.done = True
+        return self.result
+
+    def __iter__ ( self ) :
+        while self.step() :
+            yield self
+
 class GenoshaEncoder ( object ) :
     r"""The workhorse for converting an object (and its references) into a serially-marshallable
     structure.  In most cases you will wish to use ``marshal`` above, or one of the
@@ -116,7 +429,7 @@ class GenoshaEncoder ( object ) :
 
     ``object_hook`` refers to the callable used when a GenoshaObject would be created.
     This function should support any of the keyword arguments ( 'type', 'oid', 'fields',
-    'items', 'attribute', 'instance' ).  Similarly, the object return by the method should
+    'items', 'attribute', 'instance', 'persistent', 'state', 'data' ).  Similarly, the object return by the method should
     accept those same names as attributes.
 
     ``reference_hook`` refers to the callable used when a GenoshaReference would be
@@ -126,18 +439,63 @@ class GenoshaEncoder ( object ) :
     ``string_hook`` allows you to specify a string-like-object processor.  If specified
     it should accept the string types (str, unicode) and SHOULD return the same type.
     This is useful for escaping (see the JSON implementation for an example).
+
+    ``memo`` turns on a cache, kept for the life of the encoder, of the marshalled items
+    of up to ``memo`` tuples and frozensets whose items are all primitives (smaller ones
+    than ``memo_min`` items are cheaper to marshal than to look up).  When the
+    same tuple or frozenset is met again in a later ``marshal`` call its cached items are
+    reused rather than marshalled again, which pays off for large constant tables that
+    appear in every snapshot.  The least recently used entries are dropped first.  The
+    cache keeps the tables it holds alive (tuples and frozensets cannot be weakly
+    referenced), so their ids cannot be reused by other objects while they are cached;
+    being flat they are small.  Tables that cannot be cached are remembered by id alone,
+    so that they are not scanned again, without keeping them (or what they refer to)
+    alive.  Should such an id be reused by a flat table it is only left uncached.
+
+    ``persistent_id``, like :mod:`pickle`'s, is called with each object that is not a
+    primitive.  If it returns None the object is marshalled as usual; otherwise it must
+    return a string or number, which is written (as the ``persistent`` of a GenoshaObject)
+    in place of the object.  Use it to leave out large shared data that the reader
+    already has; ``GenoshaDecoder``'s ``persistent_load`` turns the key back into the object.
+
+    Instances are written with the attributes in their ``__dict__`` (or ``__slots__``)
+    that are neither callable nor named with a leading ``__``, leaving out any named in
+    the class's ``__genosha_transient__`` (a sequence of names) -- caches and other
+    derived data that are cheaper to rebuild than to store.  A class that defines
+    ``__getstate__`` decides instead: what it returns is written in place of the
+    attributes (as the fields if it is a dict with string keys, otherwise as the
+    ``state`` of the GenoshaObject) and handed to ``__setstate__`` when it is read.
+    Attributes of a builtin base that the state does not carry (a defaultdict's
+    ``default_factory``) are then written as the fields next to the state.
+
+    ``strings`` turns on sharing of repeated strings of at least ``strings`` characters.
+    The first occurrence of such a string is written as usual; the second becomes a
+    GenoshaObject (of type str or unicode, with the string as its items) and it and all
+    later occurrences are written as references to that object.  Strings that occur once
+    cost nothing extra, and the decoder gives back a single (interned, for str) instance
+    for all the references.
+
+    Value types with a reducer (see ``register_reducer``) are written as a GenoshaObject
+    whose items are the reduced value.  Reducers are provided for ``datetime``, ``date``,
+    ``time`` and ``timedelta`` (lists of integers), ``Decimal`` (its string) and ``UUID``
+    (its hex string).  ``bytearray``, ``memoryview``, ``array.array`` and (when it is
+    used) ``numpy.ndarray`` are written with their contents as raw bytes in the ``data``
+    of the GenoshaObject, and the typecode or dtype and shape as its items.
     """
-    def __init__ ( self, object_hook = GenoshaObject, reference_hook = GenoshaReference, string_hook = None ) :
+    def __init__ ( self, object_hook = GenoshaObject, reference_hook = GenoshaReference, string_hook = None, memo = 0, persistent_id = None, strings = 0 ) :
         self.object_hook = object_hook
         self.reference_hook = reference_hook
-        if string_hook :
-            self.marshal_str = self.marshal_unicode = self.marshal_basestring = string_hook
-            self.primitives -= set( [ str, unicode, basestring ] )
-            self.builtin_types |= set( [ str, unicode, basestring ] )
+        self.string_hook = string_hook or self.idem
+        self.strings = strings
+        if string_hook or strings :
+            self.marshal_str = self.marshal_unicode = self.marshal_basestring = strings and self.marshal_shared or string_hook
+            self.primitives = self.primitives - set( [ str, unicode, basestring ] )
+            self.builtin_types = self.builtin_types | set( [ str, unicode, basestring ] )
         self.dispatch = dict( ( typ, self.idem ) for typ in self.primitives )
         self.dispatch.update( ( typ, self.unknown ) for typ in self.unsupported )
         self.dispatch.update( ( typ, getattr( self, "marshal_" + typ.__name__ ) ) for typ in self.builtin_types )
         self.scoped_names = {}
+        self.policies = {}
         self.builders = { list : lambda obj : self._sequence( obj, list.__iter__ )
                 , tuple : lambda obj : self._sequence( obj, tuple.__iter__ )
                 , dict : lambda obj : self._map( obj, dict.items )
@@ -146,6 +504,11 @@ class GenoshaEncoder ( object ) :
                 , defaultdict : lambda obj : self._map( obj, defaultdict.items )
                 , deque : lambda obj : self._sequence( obj, deque.__iter__ )
                 }
+        self.memo_size = memo
+        self.memo = OrderedDict() if memo else None
+        self.persistent_id = persistent_id
+        if persistent_id :
+            self._marshal = self._marshal_persistent
 
     unsupported = set( [ types.GeneratorType, types.InstanceType ] )
     primitives = set( [ int, long, float, bool, types.NoneType, unicode, str, basestring ] )
@@ -153,19 +516,70 @@ class GenoshaEncoder ( object ) :
         , types.FunctionType, types.MethodType, types.ModuleType, complex ] )
 
     def marshal ( self, obj ) :
-        self.objects = []
-        self.python_ids = {}
-        self.deferred = deque()
         self.gc = gc and gc.isenabled()
         gc and gc.disable()
         try :
+            self._start()
             payload = self._marshal( obj )
-            while len( self.deferred ) > 0 :
-                self._object( *self.deferred.popleft() )
-            return [ SENTINEL, self.objects, payload ]
+            return self._document( payload )
+        finally :
+            self.gc and gc.enable()
+
+    def marshal_many ( self, roots, shared = False ) :
+        r"""Marshal each object in ``roots`` in a single session, sharing this encoder's
+        type and dispatch caches between them.  Returns a list with one marshalled
+        structure per root or, if ``shared`` is true, a single structure whose object
+        list holds the objects of all the roots (objects reachable from several roots
+        appear once) and whose payload is the list of the roots' payloads."""
+        self.gc = gc and gc.isenabled()
+        gc and gc.disable()
+        try :
+            if shared :
+                self._start()
+                _marshal = self._marshal
+                return self._document( [ _marshal( root ) for root in roots ] )
+            out = []
+            for root in roots :
+                self._start()
+                out.append( self._document( self._marshal( root ) ) )
+            return out
         finally :
             self.gc and gc.enable()
 
+    def marshal_steps ( self, obj, target ) :
+        r"""A generator form of ``marshal`` for use with ``GenoshaTask``.  Rather than
+        returning the structure, GenoshaObjects are handed to ``target`` (through
+        ``begin``, ``feed`` and ``finish`` as for the incremental ``parse`` functions) as
+        soon as they are complete, in document order.  It yields after each object is
+        filled in; the last value yielded is the result of ``target.finish``."""
+        self._start()
+        target.begin( SENTINEL )
+        payload = self._marshal( obj )
+        objects, deferred = self.objects, self.deferred
+        fed = 0
+        while deferred :
+            self._object( *deferred.popleft() )
+            pending = deferred[0][1] if deferred else None
+            while fed < len( objects ) and objects[fed] is not pending :
+                target.feed( objects[fed] )
+                fed += 1
+            yield None
+        for data in objects[fed:] :
+            target.feed( data )
+        yield target.finish( payload )
+
+    def _start ( self ) :
+        self.objects = []
+        self.python_ids = {}
+        self.deferred = deque()
+        self.shared = { str : {}, unicode : {} }
+
+    def _document ( self, payload ) :
+        deferred = self.deferred
+        while len( deferred ) > 0 :
+            self._object( *deferred.popleft() )
+        return [ SENTINEL, self.objects, payload ]
+
     def _id ( self, obj ) :
         return self.python_ids.setdefault( id( obj ), len( self.python_ids ) )
 
@@ -186,20 +600,41 @@ class GenoshaEncoder ( object ) :
         if is_instance :
             fields = {}
             _marshal = self._marshal
-            if hasattr( obj, '__dict__' ) :
+            getstate, transient = self._policy( obj.__class__ )
+            if getstate :
+                state = obj.__getstate__()
+                if not attributes and type( state ) is dict and not [ key for key in state if type( key ) is not str ] :
+                    for key, value in state.items() :
+                        fields[key] = _marshal( value )
+                else :
+                    out.state = _marshal( state )
+                    fields = None
+            elif hasattr( obj, '__dict__' ) :
                 for key, value in obj.__dict__.items() :
-                    if ( not key.startswith( '__' ) ) and ( not hasattr( value, '__call__' ) ) :
+                    if ( not key.startswith( '__' ) ) and ( not hasattr( value, '__call__' ) ) and key not in transient :
                         fields[key] = _marshal( value )
             elif hasattr( obj, '__slots__' ) :
                 for slot in obj.__slots__ :
-                    if ( not slot.startswith('__') ) and hasattr( obj, slot ) and not hasattr( getattr( obj, slot ), '__call__' ) :
+                    if ( not slot.startswith('__') ) and slot not in transient and hasattr( obj, slot ) and not hasattr( getattr( obj, slot ), '__call__' ) :
                         fields[slot] = _marshal( getattr( obj, slot ) )
             if attributes :
+                if fields is None :
+                    fields = {}
                 for key, value in attributes.items() :
                     fields[key] = _marshal( value )
-            out.fields = fields
+            if fields is not None :
+                out.fields = fields
         return out
 
+    def _policy ( self, kind ) :
+        r"""Return whether instances of ``kind`` provide their own state (``__getstate__``)
+        and the names of its transient fields."""
+        policy = self.policies.get( kind )
+        if policy is None :
+            policy = self.policies[kind] = ( getattr( kind, '__getstate__', None ) is not None
+                , frozenset( getattr( kind, '__genosha_transient__', () ) ) )
+        return policy
+
     def marshal_object ( self, obj, items = None, immutable = False, kind = None, attributes = None ) :
         is_instance = not kind
         if is_instance :
@@ -217,6 +652,8 @@ class GenoshaEncoder ( object ) :
         return self.marshal_object( obj, items = self.builders[list] )
 
     def marshal_tuple ( self, obj ) :
+        if self.memo is not None and len( obj ) >= self.memo_min :
+            return self._memoized( obj, tuple )
         return self.marshal_object( obj, items = self.builders[tuple], immutable = True )
 
     def marshal_dict ( self, obj ) :
@@ -226,8 +663,33 @@ class GenoshaEncoder ( object ) :
         return self.marshal_object( obj, items = self.builders[set] )
 
     def marshal_frozenset ( self, obj ) :
+        if self.memo is not None and len( obj ) >= self.memo_min :
+            return self._memoized( obj, frozenset )
         return self.marshal_object( obj, items = self.builders[frozenset], immutable = True )
 
+    memo_min = 8
+    leaf_types = frozenset( [ int, long, float, bool, types.NoneType, str, unicode ] )
+    def _memoized ( self, obj, kind ) :
+        memo = self.memo
+        key = id( obj )
+        if key in memo :
+            entry = memo.pop( key )
+        else :
+            entry = None # remembered by id so that it is not checked again (shared strings are per document)
+            leaf_types = self.leaf_types
+            strings = self.strings
+            for item in obj :
+                if type( item ) not in leaf_types or ( strings and type( item ) in ( str, unicode ) and len( item ) >= strings ) :
+                    break
+            else :
+                entry = ( obj, self.builders[kind]( obj ) )
+            if len( memo ) >= self.memo_size :
+                memo.popitem( last = False )
+        memo[key] = entry
+        if entry is None :
+            return self.marshal_object( obj, items = self.builders[kind], immutable = True )
+        return self.marshal_object( obj, items = lambda obj : entry[1], immutable = True )
+
     def marshal_defaultdict ( self, obj ) :
         return self.marshal_object( obj, items = self.builders[defaultdict], attributes = { 'default_factory' : obj.default_factory } )
 
@@ -267,6 +729,20 @@ class GenoshaEncoder ( object ) :
     def idem ( self, obj ) :
         return obj
 
+    def marshal_shared ( self, obj ) :
+        shared = self.shared.get( type( obj ) ) # not subclasses, which are written as plain strings
+        if shared is None or len( obj ) < self.strings :
+            return self.string_hook( obj )
+        oid = shared.get( obj, -1 )
+        if oid == -1 : # first seen
+            shared[obj] = None
+            return self.string_hook( obj )
+        if oid is None :
+            oid = self.python_ids[( type( obj ), obj )] = len( self.python_ids ) # not an id(), so it cannot be mistaken for one
+            self.objects.append( self.object_hook( type = self.find_scoped_name( type( obj ) ), oid = oid, items = self.string_hook( obj ) ) )
+            shared[obj] = oid
+        return self.reference_hook( oid )
+
     def unknown ( self, obj ) :
         raise TypeError, "'%s' is an unsupported type." % type( obj ).__name__
 
@@ -282,11 +758,51 @@ class GenoshaEncoder ( object ) :
                 f = dispatch[kind]
                 dispatch[typ] = f
                 return f( obj )
+            reducer = reducers.get( "%s/%s" % ( kind.__module__, kind.__name__ ) )
+            if reducer is not None :
+                f = dispatch[typ] = dispatch[kind] = self.reduced( *reducer )
+                return f( obj )
         dispatch[typ] = self.marshal_object
         return self.marshal_object( obj )
 
+    def reduced ( self, reduce, construct = None, raw = False ) :
+        r"""Return the dispatch function for a type written through the reducer ``reduce``."""
+        def value ( data ) :
+            kind = type( data )
+            if kind is list or kind is tuple :
+                return [ value( item ) for item in data ]
+            if kind is dict :
+                _marshal = self._marshal
+                return dict( ( _marshal( key ), value( item ) ) for key, item in data.items() )
+            return self._marshal( data )
+        if raw :
+            return lambda obj : self.marshal_raw( obj, reduce, value )
+        return lambda obj : self.marshal_object( obj, items = lambda obj : value( reduce( obj ) ), immutable = True, kind = self.find_scoped_name( obj.__class__ ) )
+
+    def marshal_raw ( self, obj, reduce, value ) :
+        items, data = reduce( obj )
+        oid = self._id( obj )
+        out = self.object_hook( type = self.find_scoped_name( obj.__class__ ), oid = oid, data = data )
+        if items is not None :
+            out.items = value( items )
+        self.objects.append( out )
+        return self.reference_hook( oid )
+
+    def _marshal_persistent ( self, obj ) :
+        if id( obj ) not in self.python_ids and type( obj ) not in self.leaf_types :
+            key = self.persistent_id( obj )
+            if key is not None :
+                if type( key ) not in self.leaf_types :
+                    raise TypeError, "persistent ids must be strings or numbers, not '%s'." % type( key ).__name__
+                oid = self._id( obj )
+                self.objects.append( self.object_hook( oid = oid, persistent = GenoshaEncoder._marshal( self, key ) ) )
+                return self.reference_hook( oid )
+        return GenoshaEncoder._marshal( self, obj )
+
     scoping_types = set( [ types.TypeType, types.FunctionType ] )
     def find_scoped_name ( self, obj ) :
+        if obj in registered :
+            return registered[obj]
         if obj in self.scoped_names :
             return self.scoped_names[obj]
         scopes = deque()
@@ -298,7 +814,7 @@ class GenoshaEncoder ( object ) :
             if getattr( scope, name, None ) is obj :
                 path.append( scope.__name__ )
                 path.append( name )
-                sn = "%s/%s" % ( path[0], ".".join( path[1:] ) )
+                sn = intern( "%s/%s" % ( path[0], ".".join( path[1:] ) ) )
                 self.scoped_names[ obj ] = sn
                 return sn
             seen.add( id( scope ) )
@@ -316,71 +832,229 @@ class GenoshaDecoder ( object ) :
     ``string_hook`` if specified should identify a callable used to "unescape" any special
     string handling performed during the encode (using ``GenoshaDecode``'s ``string_hook``
     parameter).  See the JSON deserializer for an example of this.
+
+    ``lazy`` turns on lazy decoding.  Objects are then only built when they are reached
+    from the root, and instances of (non-builtin) classes that carry only fields are
+    created empty and filled in the first time one of their attributes is read or set.
+    Until then ``type()`` reports a private subclass of the real class; identity and
+    ``isinstance`` behave as usual.  Builtin containers are always filled in when built.
+
+    ``persistent_load`` is called with each key written by ``GenoshaEncoder``'s
+    ``persistent_id`` and returns the object to use in its place.
+
+    Instances of classes that define ``__setstate__`` are restored by calling it with
+    their state: the dict of their fields or the value written by ``__getstate__``.
+    Otherwise the fields are set as attributes.
     """
-    def __init__ ( self, string_hook = None ) :
+    def __init__ ( self, string_hook = None, lazy = False, persistent_load = None ) :
         if string_hook :
+            self.dispatch = dict( self.dispatch )
             self.dispatch[str] = string_hook
             self.dispatch[unicode] = string_hook
-        self.mutability = {}
-        self.kinds = {}
+        self.plans = {}
+        self.lazy = lazy
+        self.lazy_kinds = {}
+        self.pending = {}
+        self.records = None
+        self.persistent_load = persistent_load
 
     def unmarshal ( self, obj ) :
-        self.objects = {}
-        self.to_populate = []
         try :
-            if obj[0] != SENTINEL :
-                raise ValueError, "Malfomed input."
+            if self.lazy :
+                if obj[0] != SENTINEL :
+                    raise ValueError, "Malfomed input."
+                return self.resolve( obj[-1], dict( ( data.oid, data ) for data in obj[1] ) )
+            self.begin( obj[0] )
         except IndexError :
             raise ValueError, "Malformed input."
+        return paused_gc( self._unmarshal_all, obj )
+
+    def _unmarshal_all ( self, obj ) :
         self._unmarshal( obj[1:-1] ) # load the referenced objects
-        payload = self._unmarshal( obj[-1] )
+        return self.finish( obj[-1] )
+
+    def unmarshal_many ( self, docs ) :
+        r"""Convert each marshalled structure in ``docs``, sharing this decoder's type
+        caches between them.  Returns a list of the root objects."""
+        self.gc = gc and gc.isenabled()
+        gc and gc.disable()
+        try :
+            unmarshal = self.unmarshal
+            return [ unmarshal( doc ) for doc in docs ]
+        finally :
+            self.gc and gc.enable()
+
+    def resolve ( self, value, records ) :
+        r"""Convert the marshalled ``value``, building the objects it refers to on demand
+        from ``records``, a mapping of oid to GenoshaObject (such as a
+        ``genosha.Archive.Archive``).  Objects that are not reachable from ``value`` are
+        never built."""
+        self.objects = {}
+        self.records = records
+        self.to_populate = []
+        return self.finish( value )
+
+    def begin ( self, sentinel ) :
+        r"""Start an incremental decode of a document identified by ``sentinel``.  Together
+        with ``feed`` and ``finish`` this allows a deserializer to hand over GenoshaObjects
+        one at a time as it reads them (rather than building the whole object list first)."""
+        if sentinel != SENTINEL :
+            raise ValueError, "Malfomed input."
+        self.objects = {}
+        self.to_populate = []
+
+    def feed ( self, data ) :
+        r"""Convert a single top-level GenoshaObject ``data``.  Objects must be fed in
+        document order."""
+        return self._unmarshal( data )
+
+    def finish ( self, payload ) :
+        r"""Complete an incremental decode: convert the ``payload`` and restore the
+        references of all the objects fed so far.  Returns the root object."""
+        payload = self._unmarshal( payload )
         for obj in self.to_populate :
             self.populate_object( *obj )
         del self.to_populate
         return payload
 
+    def finish_steps ( self, payload ) :
+        r"""A generator form of ``finish`` for use with ``GenoshaTask``: it yields after
+        restoring the references of each object, then yields the root object."""
+        payload = self._unmarshal( payload )
+        for obj in self.to_populate :
+            self.populate_object( *obj )
+            yield None
+        del self.to_populate
+        yield payload
+
     builders = { list : list.extend, set : set.update, dict : dict.update, defaultdict : dict.update, deque : deque.extend }
     immutables = set( [ tuple, frozenset, complex ] )
 
     def _object ( self, data ) :
         immediate = not hasattr( data, 'oid' )
-        if hasattr( data, 'attribute' ) :
+        if hasattr( data, 'persistent' ) :
+            if self.persistent_load is None :
+                raise ValueError, "no persistent_load to resolve persistent id %r" % data.persistent
+            obj = self.persistent_load( self._unmarshal( data.persistent ) )
+        elif hasattr( data, 'attribute' ) :
             obj = getattr( self._unmarshal( data.instance ), data.attribute )
         else :
-            if data.type in self.kinds :
-                kind = self.kinds[data.type]
-            else :
-                kind = self.resolve_type( data.type )
-                self.kinds[data.type] = kind
-            if not hasattr( data, 'items' ) and not hasattr( data, 'fields' ) :
+            plan = self.plans.get( data.type ) or self.plan( data.type )
+            kind, construct = plan[0], plan[1]
+            if not hasattr( data, 'fields' ) and not hasattr( data, 'items' ) and not hasattr( data, 'state' ) and not hasattr( data, 'data' ) :
                 obj = kind # raw type
-            else :
-                if kind not in self.mutability :
-                    self.mutability[kind] = self.immutables & set ( kind.__mro__ ) and True or False
-                if self.mutability[kind] :
-                    obj = kind.__new__( kind, self._unmarshal( data.items ) )
+            elif construct is True :
+                obj = kind.__new__( kind, self._unmarshal( data.items ) )
+            elif construct and hasattr( data, 'data' ) :
+                obj = construct( kind, self._unmarshal( getattr( data, 'items', None ) ), data.data )
+            elif construct and hasattr( data, 'items' ) :
+                obj = construct( kind, self._unmarshal( data.items ) )
+            else : # also instances written with their fields before a reducer was registered
+                obj = kind.__new__( kind )
+                if immediate :
+                    self.populate_object( obj, data )
+                elif self.lazy and self.defer( obj, data, kind ) :
+                    pass
                 else :
-                    obj = kind.__new__( kind )
-                    if immediate :
-                        self.populate_object( obj, data )
-                    else :
-                        self.to_populate.append( ( obj, data ) )
+                    self.to_populate.append( ( obj, data ) )
         if not immediate :
             self.objects[int(data.oid)] = obj
         return obj
 
+    def plan ( self, name ) :
+        r"""Work out (once for each type name) how objects of the type ``name`` are built:
+        the class, how it is constructed (see ``construction``), the builder that adds its
+        items, its ``__setstate__`` and whether its fields go straight into ``__dict__``."""
+        kind = self.resolve_type( name )
+        if isinstance( kind, type ) :
+            builder = None
+            for base in kind.__mro__ :
+                if base in self.builders :
+                    builder = self.builders[base]
+                    break
+            plan = ( kind, self.construction( kind ), builder, getattr( kind, '__setstate__', None ), kind.__dictoffset__ != 0 )
+        else :
+            plan = ( kind, False, None, None, False ) # functions and modules are only referred to
+        self.plans[name] = plan
+        return plan
+
+    def construction ( self, kind ) :
+        r"""Return how instances of ``kind`` are built: the ``construct`` function of its
+        reducer, True if it is immutable (built from its items), or False."""
+        if kind is str or kind is unicode : # a shared string
+            return _shared_string
+        for base in kind.__mro__ :
+            reducer = reducers.get( "%s/%s" % ( base.__module__, base.__name__ ) )
+            if reducer is not None :
+                return reducer[1]
+        return self.immutables & set( kind.__mro__ ) and True or False
+
+    def defer ( self, obj, data, kind ) :
+        if kind not in self.lazy_kinds :
+            self.lazy_kinds[kind] = self.lazy_class( kind )
+        lazy_kind = self.lazy_kinds[kind]
+        if lazy_kind is None or hasattr( data, 'items' ) :
+            return False
+        obj.__class__ = lazy_kind
+        self.pending[id( obj )] = ( obj, data, kind )
+        return True
+
+    def lazy_class ( self, kind ) :
+        r"""Create the stand-in subclass used for not-yet-populated instances of ``kind``,
+        or return None if instances of ``kind`` cannot be populated lazily."""
+        if not kind.__flags__ & HEAPTYPE :
+            return None
+        materialize = self.materialize
+        def __getattribute__ ( obj, name ) :
+            materialize( obj )
+            return getattr( obj, name )
+        def __setattr__ ( obj, name, value ) :
+            materialize( obj )
+            setattr( obj, name, value )
+        def __delattr__ ( obj, name ) :
+            materialize( obj )
+            delattr( obj, name )
+        try :
+            return type( kind )( kind.__name__, ( kind, ), { '__slots__' : (), '__module__' : kind.__module__
+                , '__getattribute__' : __getattribute__, '__setattr__' : __setattr__, '__delattr__' : __delattr__ } )
+        except TypeError :
+            return None
+
+    def materialize ( self, obj ) :
+        r"""Fill in a lazily-decoded instance ``obj`` (and any containers it refers to).
+        This happens automatically the first time one of its attributes is used."""
+        pending = self.pending.pop( id( obj ), None )
+        if pending is None :
+            return obj
+        obj, data, kind = pending
+        object.__setattr__( obj, '__class__', kind )
+        to_populate, self.to_populate = getattr( self, 'to_populate', None ), [ ( obj, data ) ]
+        try :
+            for item in self.to_populate :
+                self.populate_object( *item )
+        finally :
+            self.to_populate = to_populate
+        return obj
+
     def populate_object ( self, obj, data ) :
         _unmarshal = self._unmarshal
-        if hasattr( data, 'items' ) :
-            builders = self.builders
-            for base in obj.__class__.__mro__ :
-                if base in builders :
-                    builders[ base ]( obj, _unmarshal( data.items ) )
-                    break
-        if hasattr( data, 'fields' ) :
-            if hasattr( obj, '__dict__' ) :
+        kind, construct, builder, setstate, use_dict = self.plans.get( data.type ) or self.plan( data.type )
+        if builder is not None and hasattr( data, 'items' ) :
+            builder( obj, _unmarshal( data.items ) )
+        if hasattr( data, 'state' ) :
+            if setstate is None :
+                raise ValueError, "%s.%s has no __setstate__ to restore its state with" % ( kind.__module__, kind.__name__ )
+            if hasattr( data, 'fields' ) :   # attributes of a builtin base, set apart from the state
                 for key, value in data.fields.items() :
-                    obj.__dict__[key] = _unmarshal( value )
+                    setattr( obj, key, _unmarshal( value ) )
+            setstate( obj, _unmarshal( data.state ) )
+        elif hasattr( data, 'fields' ) :
+            if setstate is not None :
+                setstate( obj, dict( ( key, _unmarshal( value ) ) for key, value in data.fields.items() ) )
+            elif use_dict :
+                d = obj.__dict__
+                for key, value in data.fields.items() :
+                    d[key] = _unmarshal( value )
             else :  # __slots__ or descriptor based
                 for key, value in data.fields.items() :
                     setattr( obj, key, _unmarshal( value ) )
@@ -401,6 +1075,8 @@ class GenoshaDecoder ( object ) :
         try :
             return self.objects[ data.oid ]
         except KeyError :
+            if self.records is not None and data.oid in self.records :
+                return self._unmarshal( self.records[data.oid] )
             raise ValueError, "Forward-references to objects not allowed: " + str( data.oid ) + " (" + str( type( data.oid ) ) + ")"
 
     def _primitive ( self, data ) :
@@ -414,6 +1090,11 @@ class GenoshaDecoder ( object ) :
         return self.dispatch[type(data)]( self, data )
 
     def resolve_type ( self, kind ) :
+        if kind[:1] == "@" :
+            try :
+                return aliases[kind[1:]]
+            except KeyError :
+                raise ValueError, "unknown type alias: " + kind
         modname, kind = kind.split( '/' ) if '/' in kind else ( kind, '' )
         if modname not in sys.modules :
             __import__( modname )
@@ -421,3 +1102,6 @@ class GenoshaDecoder ( object ) :
         for name in kind.split('.') :
             scope = getattr( scope, name ) if name else scope
         return scope
+
+from genosha.snapshot import snapshot_in_background
+from genosha.transcoding import transcode
@@ -0,0 +1,22 @@
+#    genosha/__main__.py - the genosha command line.
+#    Copyright (C) 2009 Shawn Sulma <genosha@470th.org>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+r"""Runs ``python -m genosha``, which surveys a genosha document (see :mod:`genosha.survey`)."""
+import sys
+
+from genosha.survey import main
+
+if __name__ == "__main__":
+    sys.exit( main() )
@@ -0,0 +1,178 @@
+#    genosha/compression.py - streaming compression for Genosha files.
+#    Copyright (C) 2009 Shawn Sulma <genosha@470th.org>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+r"""genosha/compression.py provides the file wrappers used by the ``compression``
+option of the file-based ``dump`` functions and the format detection done by ``load``.
+
+Data is compressed and decompressed as it is written and read, so neither the
+uncompressed nor the compressed document needs to be held in memory.  The supported
+formats are 'zlib', 'gzip', 'bz2' and, where an lzma module is available, 'lzma' (xz).
+``reader`` recognizes them by their leading magic bytes; anything else is passed through
+unchanged.
+
+Unless a level is given each format compresses at its level in ``levels``: the best for
+zlib, gzip and bz2, whose compressors need at most a few MB, and lzma's own default
+preset of 6 for lzma, whose compressor needs about 100 MB at that preset and close to
+700 MB at 9.
+"""
+import zlib, bz2
+try :
+    import lzma
+except ImportError :
+    try :
+        from backports import lzma
+    except ImportError :
+        lzma = None
+
+__version__ = "0.1"
+__author__ = "Shawn Sulma <genosha@470th.org>"
+__all__ = [ 'writer', 'reader', 'formats' ]
+
+CHUNK = 64 * 1024
+
+compressors = { 'zlib' : lambda level : zlib.compressobj( level )
+        , 'gzip' : lambda level : zlib.compressobj( level, zlib.DEFLATED, 16 + zlib.MAX_WBITS )
+        , 'bz2' : lambda level : bz2.BZ2Compressor( level ) }
+
+decompressors = [ ( '\x1f\x8b', lambda : zlib.decompressobj( 16 + zlib.MAX_WBITS ) )
+        , ( 'BZh', bz2.BZ2Decompressor ) ]
+
+if lzma :
+    compressors['lzma'] = lambda level : lzma.LZMACompressor( preset = level )
+    decompressors.append( ( '\xfd7zXZ\x00', lzma.LZMADecompressor ) )
+
+formats = frozenset( compressors )
+
+# format -> level used when none is given
+levels = { 'zlib' : 9, 'gzip' : 9, 'bz2' : 9, 'lzma' : 6 }
+
+def writer ( f, compression, compresslevel = None ) :
+    r"""Wrap the file-like object ``f`` so that everything written to the result is
+    compressed with ``compression`` (one of ``formats``) at ``compresslevel`` (if None,
+    the format's level in ``levels``) before reaching ``f``.  The result must be closed to flush the compressor; closing it does
+    not close ``f``.  If ``compression`` is None, ``f`` is returned as is.  If ``f`` is
+    a file name the file is opened, and closed with the result."""
+    if compression is not None and compression not in compressors :
+        raise ValueError, "unsupported compression: %s" % compression
+    if compresslevel is None :
+        compresslevel = levels.get( compression )
+    if isinstance( f, basestring ) :
+        f = open( f, 'wb' )
+        if compression is None :
+            return f
+        out = CompressedWriter( f, compressors[compression]( compresslevel ) )
+        out.owned = True
+        return out
+    if compression is None :
+        return f
+    return CompressedWriter( f, compressors[compression]( compresslevel ) )
+
+def reader ( f ) :
+    r"""Return a file-like object that reads the decompressed content of ``f`` when
+    it starts with the magic bytes of a supported format, and the content of ``f``
+    unchanged otherwise.  If ``f`` is a file name the file is opened, and closed when
+    the result is closed."""
+    if not isinstance( f, basestring ) :
+        return _detect( f )
+    f = open( f, 'rb' )
+    try :
+        result = _detect( f )
+    except :
+        f.close()
+        raise
+    result.owned = True
+    return result
+
+def _detect ( f ) :
+    head = f.read( 6 )
+    for magic, decompressor in decompressors :
+        if head.startswith( magic ) :
+            return DecompressedReader( f, decompressor(), head )
+    if len( head ) >= 2 and ord( head[0] ) & 0x0f == zlib.DEFLATED and ( ord( head[0] ) * 256 + ord( head[1] ) ) % 31 == 0 :
+        return DecompressedReader( f, zlib.decompressobj(), head )
+    return DecompressedReader( f, None, head )
+
+class CompressedWriter ( object ) :
+    owned = False
+
+    def __init__ ( self, f, compressor ) :
+        self.f = f
+        self.compressor = compressor
+
+    def write ( self, data ) :
+        data = self.compressor.compress( data )
+        if data :
+            self.f.write( data )
+
+    def flush ( self ) :
+        pass
+
+    def close ( self ) :
+        try :
+            if self.compressor :
+                self.f.write( self.compressor.flush() )
+                self.compressor = None
+        finally :
+            if self.owned :
+                self.f.close()
+
+class DecompressedReader ( object ) :
+    owned = False
+
+    def __init__ ( self, f, decompressor, head = "" ) :
+        self.f = f
+        self.decompressor = decompressor
+        self.buffer = self._decompress( head )
+        self.pos = 0
+        self.eof = False
+
+    def _decompress ( self, data ) :
+        if self.decompressor is None or not data :
+            return data
+        return self.decompressor.decompress( data )
+
+    def _fill ( self ) :
+        while not self.eof :
+            data = self.f.read( CHUNK )
+            if not data :
+                self.eof = True
+                if self.decompressor is not None and hasattr( self.decompressor, 'flush' ) :
+                    self.buffer = self.buffer[self.pos:] + self.decompressor.flush()
+                    self.pos = 0
+                return
+            data = self._decompress( data )
+            if data :
+                self.buffer = self.buffer[self.pos:] + data
+                self.pos = 0
+                return
+
+    def read ( self, n = -1 ) :
+        if n is None or n < 0 :
+            parts = [ self.buffer[self.pos:] ]
+            self.buffer, self.pos = "", 0
+            while not self.eof :
+                self._fill()
+                parts.append( self.buffer )
+                self.buffer = ""
+            return "".join( parts )
+        while len( self.buffer ) - self.pos < n and not self.eof :
+            self._fill()
+        data = self.buffer[self.pos:self.pos + n]
+        self.pos += len( data )
+        return data
+
+    def close ( self ) :
+        if self.owned :
+            self.f.close()
@@ -0,0 +1,98 @@
+#    genosha/parallel.py - marshalling many roots across a process pool.
+#    Copyright (C) 2009 Shawn Sulma <genosha@470th.org>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+r"""genosha/parallel.py spreads the marshalling of many independent roots across a
+:mod:`multiprocessing` worker pool.  Each root is serialized on its own (as by the
+backend's ``dumps``) and the results come back in input order.
+
+    >>> import genosha.parallel
+    >>> strings = genosha.parallel.dumps_many( records, processes = 8 )
+    >>> for s in genosha.parallel.imap_dumps( records, backend = 'genosha.XML' ) :
+    ...     out.write( s )
+
+The backend is named by module ('genosha.JSON', 'genosha.XML' or 'genosha.Binary') and
+must provide ``dumps_many( objs, encoder = ..., **kwargs )``.  Every worker builds one
+encoder when it starts and reuses it (and its name and type caches) for all the roots it
+is given.  Roots are handed out ``chunksize`` at a time; where the platform forks its
+workers, a list of roots is not pickled at all: the workers inherit it and are only sent
+the index ranges to work on.
+"""
+import sys, multiprocessing
+
+from genosha import GenoshaEncoder
+
+__version__ = "0.1"
+__author__ = "Shawn Sulma <genosha@470th.org>"
+__all__ = [ 'dumps_many', 'imap_dumps' ]
+
+CHUNKSIZE = 256
+
+_roots = None       # the roots inherited by forked workers
+_worker = None      # ( backend module, encoder, dumps keyword arguments ) in each worker
+
+def dumps_many ( roots, backend = 'genosha.JSON', processes = None, chunksize = CHUNKSIZE, **kwargs ) :
+    r"""Serialize each of ``roots`` separately with ``backend`` using a pool of
+    ``processes`` workers (the number of CPUs by default), returning the list of
+    results in the order of ``roots``.  Extra keyword arguments are passed on to the
+    backend's ``dumps_many``."""
+    return list( imap_dumps( roots, backend, processes, chunksize, **kwargs ) )
+
+def imap_dumps ( roots, backend = 'genosha.JSON', processes = None, chunksize = CHUNKSIZE, **kwargs ) :
+    r"""Like ``dumps_many``, but return an iterator that yields each serialized root
+    (in order) as soon as it and those before it are done.  ``roots`` may be any
+    iterable; it is consumed as the workers need more work."""
+    global _roots
+    if chunksize < 1 :
+        raise ValueError, "chunksize must be at least 1"
+    inherit = isinstance( roots, ( list, tuple ) ) and sys.platform != 'win32'
+    if inherit :
+        _roots = roots
+        work = ( ( i, i + chunksize ) for i in xrange( 0, len( roots ), chunksize ) )
+    else :
+        work = _chunks( roots, chunksize )
+    try :
+        pool = multiprocessing.Pool( processes, _start, ( backend, kwargs ) )
+    finally :
+        _roots = None   # the workers have been forked holding it
+    try :
+        for chunk in pool.imap( _dumps, work ) :
+            for s in chunk :
+                yield s
+        pool.close()
+    finally :
+        pool.terminate()
+        pool.join()
+
+def _chunks ( roots, chunksize ) :
+    chunk = []
+    for root in roots :
+        chunk.append( root )
+        if len( chunk ) == chunksize :
+            yield chunk
+            chunk = []
+    if chunk :
+        yield chunk
+
+def _start ( backend, kwargs ) :
+    global _worker
+    module = __import__( backend, fromlist = [ 'dumps_many' ] )
+    encoder = getattr( module, 'new_encoder', GenoshaEncoder )()
+    _worker = ( module, encoder, kwargs )
+
+def _dumps ( chunk ) :
+    module, encoder, kwargs = _worker
+    if type( chunk ) is tuple :
+        chunk = _roots[chunk[0]:chunk[1]]
+    return module.dumps_many( chunk, encoder = encoder, **kwargs )
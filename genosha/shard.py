@@ -0,0 +1,176 @@
+#    genosha/shard.py - splitting a genosha document across several files.
+#    Copyright (C) 2009 Shawn Sulma <genosha@470th.org>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+r"""genosha/shard.py writes the marshalled object table of a large graph as a series of
+shard files, each holding a bounded number of objects (or bytes), plus a small manifest
+naming them.  Shards are ordinary documents of the chosen serialization module, so
+references between objects simply carry across shard boundaries; the payload is stored
+in the last shard.
+
+    >>> import genosha.shard
+    >>> genosha.shard.dump( obj, 'snapshot.json', max_objects = 100000 )
+    >>> obj_again = genosha.shard.load( 'snapshot.json', processes = 4 )
+
+The manifest (``fn``) is a JSON object::
+
+    { "genosha" : sentinel, "backend" : module name, "objects" : total object count,
+      "shards" : [ { "file" : name, "first" : index, "count" : objects, "bytes" : size }, ... ] }
+
+where ``first`` is the index, in document order, of the shard's first object (not its
+oid: immutable objects are written after the objects they contain, so oids do not follow
+document order).  The shards are written beside it as ``fn.0``, ``fn.1``, and so on.
+``load`` parses the shards in a :mod:`multiprocessing` pool; only the linking of the parsed
+objects into Python objects happens in the calling process, which starts as soon as the
+first shard has been parsed.
+"""
+import os, multiprocessing
+try :
+    import simplejson as json
+except :
+    import json
+
+from genosha import GenoshaEncoder, GenoshaDecoder, GenoshaCollector, SENTINEL
+
+__version__ = "0.1"
+__author__ = "Shawn Sulma <genosha@470th.org>"
+__all__ = [ 'dump', 'load', 'manifest' ]
+
+def dump ( o, fn, backend = 'genosha.JSON', max_objects = None, max_bytes = None, **kwargs ) :
+    r"""Dump the passed object ``o`` (and its refererred object graph) to shards written
+    with ``backend`` ('genosha.JSON', 'genosha.XML' or 'genosha.Binary') and the manifest
+    file ``fn``.  A shard is closed once it holds ``max_objects`` objects or at least
+    ``max_bytes`` bytes.  Extra keyword arguments are passed to the backend's Writer
+    (e.g. ``compact`` for XML).  Returns the manifest."""
+    module = _backend( backend )
+    _m = getattr( module, 'new_encoder', GenoshaEncoder )().marshal( o )
+    writer = ShardWriter( fn, module, max_objects, max_bytes, kwargs )
+    writer.begin( _m[0] )
+    for obj in _m[1] :
+        writer.feed( obj )
+    return writer.finish( _m[2] )
+
+def load ( fn, processes = None ) :
+    r"""Load the sharded object graph described by the manifest file ``fn``.  The shards
+    are parsed by a pool of ``processes`` workers (the number of CPUs by default; 1
+    parses them in this process) and linked here in shard order."""
+    info = manifest( fn )
+    module = _backend( str( info['backend'] ) )
+    decoder = getattr( module, 'new_decoder', GenoshaDecoder )()
+    decoder.begin( info['genosha'] )
+    work = [ ( module.__name__, shard ) for shard in _paths( fn, info ) ]
+    if processes == 1 :
+        docs = map( _parse, work )
+        pool = None
+    else :
+        pool = multiprocessing.Pool( min( processes or multiprocessing.cpu_count(), len( work ) ) )
+        docs = pool.imap( _parse, work )
+    try :
+        payload = None
+        for doc in docs :
+            if doc[0] != info['genosha'] :
+                raise ValueError, "shard does not match its manifest"
+            for obj in doc[1] :
+                decoder.feed( obj )
+            payload = doc[2]
+        if pool :
+            pool.close()
+    finally :
+        if pool :
+            pool.terminate()
+            pool.join()
+    return decoder.finish( payload )
+
+def manifest ( fn ) :
+    r"""Read and return the manifest in the file named by ``fn``."""
+    f = open( fn, 'rb' )
+    try :
+        info = json.load( f )
+    finally :
+        f.close()
+    if not isinstance( info, dict ) or info.get( 'genosha' ) != SENTINEL :
+        raise ValueError, "not a genosha shard manifest"
+    return info
+
+class ShardWriter ( object ) :
+    r"""Writes the genosha structure handed over through ``begin``, ``feed`` (once for each
+    GenoshaObject, in order) and ``finish`` as shards of the serialization ``module``,
+    starting a new shard whenever the current one is full.  ``finish`` writes the manifest
+    file ``fn`` and returns it."""
+    def __init__ ( self, fn, module, max_objects = None, max_bytes = None, kwargs = {} ) :
+        self.fn = fn
+        self.module = module
+        self.max_objects = max_objects
+        self.max_bytes = max_bytes
+        self.kwargs = kwargs
+        self.shards = []
+        self.objects = 0
+        self.writer = None
+
+    def begin ( self, sentinel ) :
+        self.sentinel = sentinel
+
+    def feed ( self, obj ) :
+        if self.writer is None or self._full() :
+            self._next()
+        self.writer.feed( obj )
+        self.shard['count'] += 1
+        self.objects += 1
+
+    def finish ( self, payload ) :
+        if self.writer is None :
+            self._next()
+        self._close( payload )
+        info = { 'genosha' : self.sentinel, 'backend' : self.module.__name__, 'objects' : self.objects, 'shards' : self.shards }
+        f = open( self.fn, 'wb' )
+        try :
+            json.dump( info, f, indent = 1 )
+        finally :
+            f.close()
+        return info
+
+    def _full ( self ) :
+        shard = self.shard
+        return ( self.max_objects and shard['count'] >= self.max_objects ) or ( self.max_bytes and shard['bytes'] >= self.max_bytes )
+
+    def _next ( self ) :
+        if self.writer is not None :
+            self._close( None )
+        self.shard = { 'file' : "%s.%d" % ( os.path.basename( self.fn ), len( self.shards ) ), 'first' : self.objects, 'count' : 0, 'bytes' : 0 }
+        self.shards.append( self.shard )
+        self.file = open( os.path.join( os.path.dirname( self.fn ), self.shard['file'] ), 'wb' )
+        self.writer = self.module.Writer( self._write, **self.kwargs )
+        self.writer.begin( self.sentinel )
+
+    def _write ( self, data ) :
+        self.shard['bytes'] += len( data )
+        self.file.write( data )
+
+    def _close ( self, payload ) :
+        self.writer.finish( payload )
+        self.file.close()
+
+def _backend ( name ) :
+    return __import__( name, fromlist = [ 'Writer' ] )
+
+def _paths ( fn, info ) :
+    return [ os.path.join( os.path.dirname( fn ), shard['file'] ) for shard in info['shards'] ]
+
+def _parse ( work ) :
+    backend, path = work
+    f = open( path, 'rb' )
+    try :
+        return _backend( backend ).parse( f, GenoshaCollector() )
+    finally :
+        f.close()
@@ -0,0 +1,119 @@
+#    genosha/snapshot.py - background snapshots of live object graphs.
+#    Copyright (C) 2009 Shawn Sulma <genosha@470th.org>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+r"""genosha/snapshot.py dumps an object graph from a forked child process, so that the
+caller only pauses for the ``fork`` and can keep changing the graph while it is written.
+The child sees the graph as it was at the moment of the fork (the operating system shares
+the memory copy-on-write), so the snapshot is consistent without any locking.
+
+    >>> snapshot = genosha.snapshot_in_background( obj, 'state.json' )
+    >>> ... # keep working with obj
+    >>> snapshot.wait()
+
+The file is written under a temporary name and renamed to ``path`` once it is complete, so
+``path`` never holds a partial snapshot.  Requires ``os.fork`` (i.e. a Unix platform).
+Threads other than the calling one do not exist in the child; if one of them holds a lock
+the dump needs (e.g. the import lock) the child will wait forever.
+"""
+import os, traceback
+try :
+    import gc
+except :
+    gc = None
+
+__version__ = "0.1"
+__author__ = "Shawn Sulma <genosha@470th.org>"
+__all__ = [ 'snapshot_in_background', 'Snapshot', 'SnapshotError' ]
+
+class SnapshotError ( Exception ) :
+    r"""Raised by ``Snapshot.wait`` when the child failed to write the snapshot.  The
+    message holds the child's traceback or exit status."""
+
+def snapshot_in_background ( obj, path, backend = 'genosha.JSON', **kwargs ) :
+    r"""Fork a child process that dumps ``obj`` to the file ``path`` with the ``dump``
+    function of ``backend`` (the name of a serialization module, e.g. 'genosha.Binary'),
+    passing any keyword arguments on.  Returns a ``Snapshot`` for the child."""
+    if not hasattr( os, 'fork' ) :
+        raise NotImplementedError, "background snapshots require os.fork"
+    module = __import__( backend, fromlist = [ 'dump' ] )
+    r, w = os.pipe()
+    pid = os.fork()
+    if pid == 0 :
+        code = 1
+        tmp = "%s.%d.tmp" % ( path, os.getpid() ) # the child's pid, so snapshots to one path do not share it
+        try :
+            try :
+                os.close( r )
+                gc and gc.disable() # the collector would touch (and so copy) every page of the graph
+                if hasattr( module, 'dumpc' ) : # a database, named rather than opened
+                    module.dump( obj, tmp, **kwargs )
+                else :
+                    f = open( tmp, 'wb' )
+                    try :
+                        module.dump( obj, f, **kwargs )
+                    finally :
+                        f.close()
+                os.rename( tmp, path )
+                code = 0
+            except BaseException :
+                os.write( w, traceback.format_exc()[-4096:] )
+                if os.path.exists( tmp ) :
+                    os.remove( tmp )
+        finally :
+            os._exit( code )
+    os.close( w )
+    return Snapshot( pid, r, path )
+
+class Snapshot ( object ) :
+    r"""The handle of a snapshot being written by the child process ``pid``.  ``poll``
+    checks whether it has finished; ``wait`` blocks until it has.  Once ``done`` is true,
+    ``error`` is None if the snapshot was written, or describes the failure."""
+    def __init__ ( self, pid, pipe, path ) :
+        self.pid = pid
+        self.pipe = pipe
+        self.path = path
+        self.done = False
+        self.error = None
+
+    def poll ( self ) :
+        r"""Return True if the child has finished (successfully or not)."""
+        if not self.done :
+            pid, status = os.waitpid( self.pid, os.WNOHANG )
+            if pid :
+                self._finished( status )
+        return self.done
+
+    def wait ( self ) :
+        r"""Wait for the child to finish, raising ``SnapshotError`` if it failed."""
+        if not self.done :
+            self._finished( os.waitpid( self.pid, 0 )[1] )
+        if self.error is not None :
+            raise SnapshotError, self.error
+
+    def _finished ( self, status ) :
+        message = []
+        while True :
+            data = os.read( self.pipe, 4096 )
+            if not data :
+                break
+            message.append( data )
+        os.close( self.pipe )
+        if message :
+            self.error = "".join( message )
+        elif os.WIFSIGNALED( status ) :
+            self.error = "snapshot process killed by signal %d" % os.WTERMSIG( status )
+        elif os.WEXITSTATUS( status ) :
+            self.error = "snapshot process exited with status %d" % os.WEXITSTATUS( status )
+        self.done = True
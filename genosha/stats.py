@@ -0,0 +1,245 @@
+#    genosha/stats.py - per-type statistics for genosha encoding and decoding.
+#    Copyright (C) 2009 Shawn Sulma <genosha@470th.org>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+r"""genosha/stats.py collects per-type statistics while a graph is marshalled, written,
+read or unmarshalled, to find out which types are responsible when a snapshot grows or
+slows down.
+
+    >>> import genosha.stats
+    >>> stats = genosha.stats.Stats()
+    >>> genosha.stats.dump( obj, f, stats, backend = 'genosha.Binary' )
+    >>> print stats.format()
+
+``Stats.encoder`` and ``Stats.decoder`` instrument a GenoshaEncoder or GenoshaDecoder
+(by replacing its methods on the instance), and ``Stats.target`` wraps a Writer (or any
+other target of ``begin``, ``feed`` and ``finish``) to measure the bytes written for each
+object.  Encoders, decoders and writers that are not instrumented are untouched, so the
+statistics cost nothing unless they are asked for.
+
+Types are named as in the marshalled structure (e.g. ``__builtin__/list``); primitives,
+which are not GenoshaObjects, by their Python type.  For each type ``report`` gives:
+
+    - ``count`` - the objects of the type marshalled or unmarshalled (values, for
+      primitives)
+    - ``references`` - the references to objects of the type (including the first)
+    - ``seconds`` - the time spent marshalling or unmarshalling them, not counting the
+      objects they contain (primitives are counted with the object holding them)
+    - ``write_seconds`` and ``bytes`` - the time spent writing them and the bytes written
+      (only for dumps through an instrumented target)
+
+along with the hits and misses of the encoder's scoped name cache (``scoped_names``) and
+of the decoder's type cache (``kinds``).
+"""
+import timeit
+
+from genosha import GenoshaEncoder, GenoshaDecoder, GenoshaObject, GenoshaReference, registered
+
+__version__ = "0.1"
+__author__ = "Shawn Sulma <genosha@470th.org>"
+__all__ = [ 'Stats', 'dump', 'load' ]
+
+clock = timeit.default_timer
+
+def dump ( o, f, stats, backend = 'genosha.JSON', **kwargs ) :
+    r"""Dump the passed object ``o`` to the file-like object ``f`` with ``backend``
+    ('genosha.JSON', 'genosha.XML' or 'genosha.Binary'), collecting statistics into
+    ``stats``.  Extra keyword arguments are passed to the backend's Writer (e.g.
+    ``compact`` for XML)."""
+    module = _backend( backend )
+    _m = stats.encoder( getattr( module, 'new_encoder', GenoshaEncoder )() ).marshal( o )
+    writer = stats.target( module.Writer( stats.write( f.write ), **kwargs ) )
+    writer.begin( _m[0] )
+    for obj in _m[1] :
+        writer.feed( obj )
+    writer.finish( _m[2] )
+
+def load ( f, stats, backend = 'genosha.JSON' ) :
+    r"""Load the document written by ``backend`` from the file-like object ``f``,
+    collecting statistics into ``stats``, and return the loaded object."""
+    module = _backend( backend )
+    return module.parse( f, stats.decoder( getattr( module, 'new_decoder', GenoshaDecoder )() ) )
+
+def _backend ( name ) :
+    return __import__( name, fromlist = [ 'Writer' ] )
+
+def _name ( data ) :
+    r"""The name a GenoshaObject is counted under."""
+    if hasattr( data, 'type' ) :
+        return data.type
+    if hasattr( data, 'persistent' ) :
+        return 'persistent'
+    return 'instancemethod'
+
+class Stats ( object ) :
+    r"""Statistics collected from any number of instrumented encoders, decoders and
+    targets.  Counts accumulate until ``clear`` is called."""
+    fields = ( 'count', 'references', 'seconds', 'write_seconds', 'bytes' )
+
+    def __init__ ( self ) :
+        self.clear()
+
+    def clear ( self ) :
+        self.types = {}
+        self.caches = { 'scoped_names' : [ 0, 0 ], 'kinds' : [ 0, 0 ] }
+        self.names = {}     # Python type -> the name its objects are counted under
+        self.stack = []     # time spent in nested calls, for each call being timed
+        self.written = 0
+
+    def _type ( self, name ) :
+        entry = self.types.get( name )
+        if entry is None :
+            entry = self.types[name] = [ 0, 0, 0.0, 0.0, 0 ]
+        return entry
+
+    def _timed ( self, f, args ) :
+        r"""Call ``f( *args )``, returning its result and the time it took less the time
+        taken by nested timed calls."""
+        stack = self.stack
+        stack.append( 0.0 )
+        start = clock()
+        try :
+            result = f( *args )
+        finally :
+            elapsed = clock() - start
+            inner = stack.pop()
+            if stack :
+                stack[-1] += elapsed
+        return result, elapsed - inner
+
+    def encoder ( self, encoder ) :
+        r"""Instrument the GenoshaEncoder ``encoder`` and return it."""
+        marshal, fill, find_scoped_name = encoder._marshal, encoder._object, encoder.find_scoped_name
+        leaf_types, names, caches = encoder.leaf_types, self.names, self.caches
+        def _marshal ( obj ) :
+            typ = type( obj )
+            if typ in leaf_types :
+                self._type( typ.__name__ )[0] += 1
+                return marshal( obj )
+            if id( obj ) in encoder.python_ids :
+                self._type( names.get( typ, typ.__name__ ) )[1] += 1
+                return marshal( obj )
+            objects = encoder.objects
+            count = len( objects )
+            result, seconds = self._timed( marshal, ( obj, ) )
+            if len( objects ) > count :
+                name = names[typ] = _name( objects[-1] )
+                entry = self._type( name )
+                entry[0] += 1
+                entry[1] += 1
+            else :
+                entry = self._type( typ.__name__ )
+            entry[2] += seconds
+            return result
+        def _object ( obj, out, *args ) :
+            result, seconds = self._timed( fill, ( obj, out ) + args )
+            self._type( _name( out ) )[2] += seconds
+            return result
+        def _find_scoped_name ( obj ) :
+            caches['scoped_names'][ obj not in registered and obj not in encoder.scoped_names ] += 1
+            return find_scoped_name( obj )
+        encoder._marshal, encoder._object, encoder.find_scoped_name = _marshal, _object, _find_scoped_name
+        return encoder
+
+    def decoder ( self, decoder ) :
+        r"""Instrument the GenoshaDecoder ``decoder`` and return it."""
+        unmarshal, populate_object, resolve_type = decoder._unmarshal, decoder.populate_object, decoder.resolve_type
+        names, kinds = self.names, self.caches['kinds']
+        def _unmarshal ( data ) :
+            typ = type( data )
+            if typ is GenoshaReference :
+                result = unmarshal( data )
+                self._type( names.get( type( result ), type( result ).__name__ ) )[1] += 1
+                return result
+            if not isinstance( data, GenoshaObject ) :
+                result = unmarshal( data )
+                if type( result ) is typ and typ is not list and typ is not dict : # not an escaped reference
+                    self._type( typ.__name__ )[0] += 1
+                return result
+            if hasattr( data, 'type' ) :
+                kinds[0] += 1 # a lookup; resolve_type counts the misses
+            result, seconds = self._timed( unmarshal, ( data, ) )
+            name = names[type( result )] = _name( data )
+            entry = self._type( name )
+            entry[0] += 1
+            entry[2] += seconds
+            return result
+        def _populate_object ( obj, data ) :
+            result, seconds = self._timed( populate_object, ( obj, data ) )
+            self._type( _name( data ) )[2] += seconds
+            return result
+        def _resolve_type ( kind ) :
+            kinds[0] -= 1
+            kinds[1] += 1
+            return resolve_type( kind )
+        decoder._unmarshal, decoder.populate_object, decoder.resolve_type = _unmarshal, _populate_object, _resolve_type
+        return decoder
+
+    def write ( self, write ) :
+        r"""Return a version of the ``write`` callable that counts the bytes written
+        (for the writer given to ``target``)."""
+        def counted ( data ) :
+            self.written += len( data )
+            return write( data )
+        return counted
+
+    def target ( self, target ) :
+        r"""Wrap ``target`` (a Writer whose ``write`` callable came from ``write``) so that
+        the time and bytes taken to write each object are counted."""
+        return _Target( self, target )
+
+    def report ( self ) :
+        r"""Return the statistics as a dict: ``types`` maps each type name to a dict of
+        its figures (see above), ``totals`` sums them over all types and ``caches`` gives
+        the ``hits``, ``misses`` and ``hit_rate`` of each cache."""
+        fields = self.fields
+        types = dict( ( name, dict( zip( fields, entry ) ) ) for name, entry in self.types.items() )
+        totals = dict( ( field, sum( entry[field] for entry in types.values() ) ) for field in fields )
+        caches = {}
+        for name, ( hits, misses ) in self.caches.items() :
+            caches[name] = { 'hits' : hits, 'misses' : misses, 'hit_rate' : float( hits ) / ( hits + misses ) if hits + misses else None }
+        return { 'types' : types, 'totals' : totals, 'caches' : caches }
+
+    def format ( self, limit = None ) :
+        r"""Return the statistics as a text table, the most time-consuming types first
+        (only the first ``limit`` of them if it is given)."""
+        report = self.report()
+        rows = sorted( report['types'].items(), key = lambda item : -( item[1]['seconds'] + item[1]['write_seconds'] ) )[:limit]
+        lines = [ "%-40s %10s %10s %10s %10s %12s" % ( 'type', 'count', 'references', 'seconds', 'write', 'bytes' ) ]
+        for name, entry in rows + [ ( 'total', report['totals'] ) ] :
+            lines.append( "%-40s %10d %10d %10.4f %10.4f %12d" % ( ( name, ) + tuple( entry[field] for field in self.fields ) ) )
+        for name, cache in sorted( report['caches'].items() ) :
+            lines.append( "%s: %d hits, %d misses" % ( name, cache['hits'], cache['misses'] ) )
+        return "\n".join( lines )
+
+class _Target ( object ) :
+    def __init__ ( self, stats, target ) :
+        self.stats = stats
+        self.target = target
+
+    def begin ( self, sentinel ) :
+        return self.target.begin( sentinel )
+
+    def feed ( self, obj ) :
+        stats = self.stats
+        written = stats.written
+        start = clock()
+        result = self.target.feed( obj )
+        entry = stats._type( _name( obj ) )
+        entry[3] += clock() - start
+        entry[4] += stats.written - written
+        return result
+
+    def finish ( self, payload ) :
+        return self.target.finish( payload )
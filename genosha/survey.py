@@ -0,0 +1,301 @@
+#    genosha/survey.py - summarizing genosha documents without loading them.
+#    Copyright (C) 2009 Shawn Sulma <genosha@470th.org>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+r"""genosha/survey.py reports what a genosha document is made of without loading it: no
+type named in the document is resolved (so its classes need not be importable) and the
+objects are read one at a time, so documents much larger than memory can be surveyed.
+It is also the command line of the genosha package::
+
+    $ python -m genosha snapshot.json
+    $ python -m genosha --json --top 20 snapshot.xml.gz
+
+The document may be JSON, XML (either dialect), binary, an archive or an sqlite database
+written by :mod:`genosha.SQL`; compressed documents are recognized.  The report gives:
+
+    - the number of objects and a histogram of them by ``type``, with their sizes
+    - how often each field name occurs
+    - the references made by each object (fan-out) and to each object (fan-in)
+    - the largest objects by serialized size
+    - the greatest depth of references from the first object, and of values nested
+      within an object
+
+Sizes are those of each object written on its own by the document's serialization
+module (the binary encoding for archives and databases), so they add up to roughly the
+size of the document.  Fan-in and reference depth need a few bytes per object; leave
+them out (``graph = False``, or ``--shallow``) to survey in constant memory.  Depths
+assume objects are written in the order they are reached, as ``GenoshaEncoder`` does.
+"""
+import sys, heapq, array, optparse, sqlite3
+try :
+    import simplejson as json
+except :
+    import json
+
+from genosha import GenoshaObject, GenoshaReference
+from genosha import compression as _compression
+
+__version__ = "0.1"
+__author__ = "Shawn Sulma <genosha@470th.org>"
+__all__ = [ 'survey', 'sniff', 'format', 'Survey', 'main' ]
+
+TOP = 10
+
+def survey ( fn, top = TOP, graph = True, item = None ) :
+    r"""Survey the genosha document in the file named by ``fn`` and return the report
+    (see ``Survey.report``), listing the ``top`` largest and most referenced objects.
+    ``item`` selects the document in an sqlite database (the first one by default)."""
+    backend, options = sniff( fn )
+    module = __import__( backend, fromlist = [ 'parse' ] )
+    if backend == 'genosha.Archive' :
+        import genosha.Binary
+        target = Survey( genosha.Binary.Writer, top = top, graph = graph )
+        archive = module.Archive( fn )
+        try :
+            target.begin( archive.sentinel )
+            for oid in xrange( len( archive ) ) :
+                if oid in archive :
+                    target.feed( archive.record( oid ) )
+            report = target.finish( archive.payload )
+        finally :
+            archive.close()
+    elif backend == 'genosha.SQL' :
+        import genosha.Binary
+        target = Survey( genosha.Binary.Writer, top = top, graph = graph )
+        conn = sqlite3.connect( fn )
+        try :
+            if item is None :
+                item = conn.execute( "SELECT min( item_id ) FROM item" ).fetchone()[0]
+            report = module.parse( item, conn, target )
+        finally :
+            conn.close()
+    else :
+        hook = getattr( module, '_json_oid', None )
+        target = Survey( lambda write : module.Writer( write, **options ), hook, top, graph )
+        f = open( fn, 'rb' )
+        try :
+            report = module.parse( f if hook else _compression.reader( f ), target )
+        finally :
+            f.close()
+    report['format'] = backend
+    return report
+
+def sniff ( fn ) :
+    r"""Return the name of the serialization module that wrote the document in the file
+    named by ``fn``, and the keyword arguments its Writer needs to write the same way."""
+    f = open( fn, 'rb' )
+    try :
+        head = f.read( 16 )
+        if head.startswith( "SQLite format 3\x00" ) :
+            return 'genosha.SQL', {}
+        if head.startswith( "GNSA" ) :
+            return 'genosha.Archive', {}
+        f.seek( 0 )
+        head = _compression.reader( f ).read( 256 ).lstrip()
+    finally :
+        f.close()
+    if head.startswith( "GNSB" ) :
+        return 'genosha.Binary', {}
+    if head.startswith( "[" ) :
+        return 'genosha.JSON', {}
+    if head.startswith( "<" ) :
+        return 'genosha.XML', { 'compact' : 'compact:1' in head }
+    raise ValueError, "not a genosha document: %s" % fn
+
+def _name ( data ) :
+    if getattr( data, 'type', None ) is not None :
+        return data.type
+    if hasattr( data, 'persistent' ) :
+        return 'persistent'
+    return 'instancemethod'
+
+def _grow ( counts, n ) :
+    if n >= len( counts ) :
+        counts.extend( [ 0 ] * ( max( n + 1, 2 * len( counts ) ) - len( counts ) ) )
+
+class Survey ( object ) :
+    r"""A target for the incremental ``parse`` functions that tallies the GenoshaObjects
+    it is fed instead of decoding them.  ``writer`` is called with a ``write`` callable
+    to create the Writer used to measure the objects.  ``reference_hook``, if given,
+    returns the oid of values that are references in the document's own representation
+    (or None).  ``finish`` returns the report."""
+    def __init__ ( self, writer, reference_hook = None, top = TOP, graph = True ) :
+        self.writer = writer( self._write )
+        self.reference_hook = reference_hook
+        self.top = top
+        self.graph = graph
+        self.written = 0
+        self.objects = 0
+        self.types = {}         # type -> [ count, bytes ]
+        self.fields = {}
+        self.fan_out = {}       # references made -> objects making that many
+        self.largest = []       # a heap of ( bytes, oid, type )
+        self.max_nesting = 0
+        self.fan_in = array.array( 'l' )
+        self.depth = array.array( 'l' )
+        self.kinds = array.array( 'l' )     # oid -> index in self.names
+        self.names = []
+        self.name_index = {}
+
+    def _write ( self, data ) :
+        self.written += len( data )
+
+    def begin ( self, sentinel ) :
+        self.sentinel = sentinel
+        self.writer.begin( sentinel )
+
+    def feed ( self, data ) :
+        self.objects += 1
+        name = _name( data )
+        written = self.written
+        self.writer.feed( data )
+        size = self.written - written
+        entry = self.types.get( name )
+        if entry is None :
+            entry = self.types[name] = [ 0, 0 ]
+        entry[0] += 1
+        entry[1] += size
+        if type( getattr( data, 'fields', None ) ) is dict :
+            fields = self.fields
+            for key in data.fields :
+                fields[key] = fields.get( key, 0 ) + 1
+        oids = self._references( data )
+        self.fan_out[len( oids )] = self.fan_out.get( len( oids ), 0 ) + 1
+        oid = int( getattr( data, 'oid', -1 ) )
+        item = ( size, oid, name )
+        if len( self.largest ) < self.top :
+            heapq.heappush( self.largest, item )
+        elif self.top :
+            heapq.heappushpop( self.largest, item )
+        if self.graph and oid >= 0 :
+            self._link( oid, name, oids )
+
+    def _references ( self, data ) :
+        r"""Return the oids referred to by ``data``, noting how deeply values nest in it."""
+        oids = []
+        hook = self.reference_hook
+        stack = [ ( data, 0 ) ]
+        deepest = 0
+        while stack :
+            value, depth = stack.pop()
+            if depth > deepest :
+                deepest = depth
+            kind = type( value )
+            if kind is GenoshaReference :
+                oids.append( int( value.oid ) )
+            elif kind is list :
+                stack.extend( ( item, depth + 1 ) for item in value )
+            elif kind is dict :
+                for key, item in value.items() :
+                    stack.append( ( key, depth + 1 ) )
+                    stack.append( ( item, depth + 1 ) )
+            elif isinstance( value, GenoshaObject ) :
+                for slot in ( 'instance', 'items', 'fields', 'persistent', 'state' ) :
+                    if hasattr( value, slot ) :
+                        stack.append( ( getattr( value, slot ), depth ) )
+            elif hook is not None :
+                oid = hook( value )
+                if oid is not None :
+                    oids.append( oid )
+        if deepest > self.max_nesting :
+            self.max_nesting = deepest
+        return oids
+
+    def _link ( self, oid, name, oids ) :
+        depth, fan_in, kinds = self.depth, self.fan_in, self.kinds
+        _grow( depth, oid )
+        _grow( kinds, oid )
+        if name not in self.name_index :
+            self.name_index[name] = len( self.names )
+            self.names.append( name )
+        kinds[oid] = self.name_index[name]
+        level = depth[oid] = depth[oid] or 1
+        for ref in oids :
+            _grow( fan_in, ref )
+            fan_in[ref] += 1
+            _grow( depth, ref )
+            if not depth[ref] :
+                depth[ref] = level + 1
+
+    def finish ( self, payload ) :
+        oids = self._references( payload )
+        if self.graph :
+            for ref in oids :
+                _grow( self.fan_in, ref )
+                self.fan_in[ref] += 1
+        return self.report()
+
+    def report ( self ) :
+        r"""Return the report as a dict of ``objects``, ``bytes``, ``types`` (each type's
+        ``count`` and ``bytes``), ``fields`` (field name counts), ``fan_out`` and
+        ``fan_in`` (their ``max`` and ``mean``, with a ``histogram`` of fan-out and the
+        ``top`` most referenced objects), ``largest`` (the largest objects' ``oid``,
+        ``type`` and ``bytes``), ``max_nesting`` and ``max_depth``.  Without ``graph``
+        there is no ``fan_in`` and ``max_depth`` is None."""
+        objects = self.objects
+        references = sum( count * n for n, count in self.fan_out.items() )
+        report = { 'objects' : objects, 'bytes' : sum( entry[1] for entry in self.types.values() )
+            , 'types' : dict( ( name, { 'count' : count, 'bytes' : size } ) for name, ( count, size ) in self.types.items() )
+            , 'fields' : dict( self.fields )
+            , 'fan_out' : { 'max' : max( self.fan_out ) if self.fan_out else 0, 'mean' : float( references ) / objects if objects else 0.0
+                , 'histogram' : dict( self.fan_out ) }
+            , 'largest' : [ { 'oid' : oid, 'type' : name, 'bytes' : size } for size, oid, name in sorted( self.largest, reverse = True ) ]
+            , 'max_nesting' : self.max_nesting, 'max_depth' : None }
+        if self.graph :
+            fan_in, kinds, names = self.fan_in, self.kinds, self.names
+            top = heapq.nlargest( self.top, ( oid for oid in xrange( len( fan_in ) ) if fan_in[oid] ), key = fan_in.__getitem__ )
+            report['fan_in'] = { 'max' : max( fan_in ) if fan_in else 0, 'mean' : float( sum( fan_in ) ) / objects if objects else 0.0
+                , 'top' : [ { 'oid' : oid, 'type' : names[kinds[oid]] if oid < len( kinds ) else None, 'references' : fan_in[oid] } for oid in top ] }
+            report['max_depth'] = max( self.depth ) if self.depth else 0
+        return report
+
+def format ( report ) :
+    r"""Return the ``report`` of ``survey`` as text."""
+    lines = [ "%s: %d objects, %d bytes" % ( report['format'], report['objects'], report['bytes'] ), "", "%-50s %10s %12s" % ( 'type', 'objects', 'bytes' ) ]
+    for name, entry in sorted( report['types'].items(), key = lambda item : -item[1]['bytes'] ) :
+        lines.append( "%-50s %10d %12d" % ( name, entry['count'], entry['bytes'] ) )
+    lines += [ "", "%-50s %10s" % ( 'field', 'objects' ) ]
+    for name, count in sorted( report['fields'].items(), key = lambda item : ( -item[1], item[0] ) ) :
+        lines.append( "%-50s %10d" % ( name, count ) )
+    lines += [ "", "largest objects:" ]
+    for entry in report['largest'] :
+        lines.append( "  %(bytes)10d bytes  oid %(oid)d  %(type)s" % entry )
+    lines += [ "", "fan-out: max %(max)d, mean %(mean).2f" % report['fan_out'] ]
+    if 'fan_in' in report :
+        lines.append( "fan-in: max %(max)d, mean %(mean).2f" % report['fan_in'] )
+        for entry in report['fan_in']['top'] :
+            lines.append( "  %(references)10d references  oid %(oid)d  %(type)s" % entry )
+        lines.append( "maximum reference depth: %d" % report['max_depth'] )
+    lines.append( "maximum nesting within an object: %d" % report['max_nesting'] )
+    return "\n".join( lines )
+
+def main ( args = None ) :
+    parser = optparse.OptionParser( usage = "python -m genosha [options] document", description = "Summarize a genosha document without loading it." )
+    parser.add_option( '--top', type = 'int', default = TOP, help = "objects to list as largest and most referenced (default %default)" )
+    parser.add_option( '--json', action = 'store_true', default = False, help = "write the report as JSON" )
+    parser.add_option( '--shallow', action = 'store_true', default = False, help = "skip fan-in and reference depth, to use constant memory" )
+    parser.add_option( '--item', type = 'int', help = "item id of the document in an sqlite database (default the first)" )
+    options, rest = parser.parse_args( args )
+    if len( rest ) != 1 :
+        parser.error( "one document is required" )
+    try :
+        report = survey( rest[0], options.top, not options.shallow, options.item )
+    except ( IOError, ValueError ), e :
+        sys.stderr.write( "%s\n" % e )
+        return 1
+    if options.json :
+        sys.stdout.write( json.dumps( report, sort_keys = True ) + "\n" )
+    else :
+        sys.stdout.write( format( report ) + "\n" )
+    return 0
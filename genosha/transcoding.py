@@ -0,0 +1,214 @@
+#    genosha/transcoding.py - converting genosha documents between formats.
+#    Copyright (C) 2009 Shawn Sulma <genosha@470th.org>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+r"""genosha/transcoding.py converts a genosha document from one serialization module to
+another at the level of GenoshaObjects and GenoshaReferences.  No Python object of the
+document is rebuilt and no type it names is resolved, so its classes need not be
+importable, and objects are read and written one at a time so the document is never held
+in memory.
+
+    >>> import genosha
+    >>> genosha.transcode( 'snapshot.xml', 'genosha.XML', 'snapshot.json', 'genosha.JSON' )
+
+or, from the command line::
+
+    $ python -m genosha.transcoding --to json snapshot.xml snapshot.json.gz --compression gzip
+
+Formats are named by module: 'genosha.JSON', 'genosha.XML', 'genosha.Binary',
+'genosha.Archive' and 'genosha.SQL'.  JSON, XML and binary documents are read from and
+written to files (or file names); archives are read from a file name (they are mapped,
+not streamed) and sqlite databases are named or passed as connections.  Reading an
+archive needs its index of offsets, a few bytes per object, to put the objects back in
+document order.
+"""
+import sys, optparse, sqlite3
+
+from genosha import GenoshaObject, GenoshaReference
+from genosha import compression as _compression
+
+__version__ = "0.1"
+__author__ = "Shawn Sulma <genosha@470th.org>"
+__all__ = [ 'transcode', 'formats', 'main' ]
+
+# short names used on the command line
+formats = { 'json' : 'genosha.JSON', 'xml' : 'genosha.XML', 'binary' : 'genosha.Binary', 'archive' : 'genosha.Archive', 'sql' : 'genosha.SQL' }
+
+def transcode ( src, src_format, dst, dst_format, compact = False, compression = None, compresslevel = None, item = None ) :
+    r"""Convert the document in ``src`` written by the serialization module named by
+    ``src_format`` (if None it is recognized, which needs a file name) into one written
+    by ``dst_format`` to ``dst``.  ``compact`` selects the compact XML dialect and
+    ``compression`` and ``compresslevel`` compress the output, as for the ``dump``
+    functions; archives and databases cannot be compressed.  ``item`` selects the document
+    in an sqlite database (the first one by default).  Returns the item id of the document
+    when writing to a database."""
+    if compression is not None and dst_format in ( 'genosha.Archive', 'genosha.SQL' ) :
+        raise ValueError, "%s cannot be compressed" % dst_format
+    if src_format is None :
+        from genosha.survey import sniff
+        src_format = sniff( src )[0]
+    source, destination = _backend( src_format ), _backend( dst_format )
+    out = None
+    if dst_format == 'genosha.SQL' :
+        conn = _connect( dst )
+        cursor = conn.cursor()
+        if not cursor.execute( "SELECT name FROM sqlite_master WHERE name = 'item'" ).fetchone() :
+            destination.create_tables( cursor )
+        writer = destination.Writer( cursor )
+    else :
+        f = open( dst, 'wb' ) if isinstance( dst, basestring ) else dst
+        out = _compression.writer( f, compression, compresslevel )
+        if dst_format == 'genosha.Archive' :
+            writer = destination.ArchiveWriter( out.write )
+        elif dst_format == 'genosha.XML' :
+            writer = destination.Writer( out.write, compact )
+        else :
+            writer = destination.Writer( out.write )
+    try :
+        result = _read( src, source, _Target( writer, src_format == 'genosha.JSON', dst_format == 'genosha.JSON' ), item )
+        if dst_format == 'genosha.SQL' :
+            conn.commit()
+            return result
+    finally :
+        if dst_format == 'genosha.SQL' :
+            if conn is not dst :
+                conn.close()
+        else :
+            if out is not f :
+                out.close()
+            if f is not dst :
+                f.close()
+
+def _backend ( name ) :
+    return __import__( name, fromlist = [ 'parse' ] )
+
+def _connect ( db ) :
+    return sqlite3.connect( db ) if isinstance( db, basestring ) else db
+
+def _read ( src, module, target, item ) :
+    if module.__name__ == 'genosha.Archive' :
+        archive = module.Archive( src )
+        try :
+            target.begin( archive.sentinel )
+            for oid in sorted( ( oid for oid in xrange( len( archive ) ) if oid in archive ), key = archive.offset ) :
+                target.feed( archive.record( oid ) )
+            return target.finish( archive.payload )
+        finally :
+            archive.close()
+    if module.__name__ == 'genosha.SQL' :
+        conn = _connect( src )
+        try :
+            if item is None :
+                item = conn.execute( "SELECT min( item_id ) FROM item" ).fetchone()[0]
+            return module.parse( item, conn, target )
+        finally :
+            if conn is not src :
+                conn.close()
+    f = open( src, 'rb' ) if isinstance( src, basestring ) else src
+    try :
+        return module.parse( _compression.reader( f ), target )
+    finally :
+        if f is not src :
+            f.close()
+
+class _Target ( object ) :
+    r"""Hands the structure read from one document to the Writer of another, converting
+    JSON's own representation of references and strings from and to GenoshaReferences
+    and plain strings."""
+    def __init__ ( self, writer, from_json, to_json ) :
+        self.writer = writer
+        if from_json or to_json :
+            from genosha.JSON import _json_oid, _json_escape_string, _json_reference
+            self.oid, self.escape, self.reference = _json_oid, _json_escape_string, _json_reference
+        self.convert = from_json and ( to_json and self._same or self._from_json ) or ( to_json and self._to_json or self._names )
+
+    def begin ( self, sentinel ) :
+        self.writer.begin( sentinel )
+
+    def feed ( self, obj ) :
+        self.writer.feed( self.convert( obj ) )
+
+    def finish ( self, payload ) :
+        return self.writer.finish( self.convert( payload ) )
+
+    def _same ( self, value ) :
+        return value
+
+    def _names ( self, value ) :
+        r"""Make the names of objects read from a database plain strings."""
+        if isinstance( value, GenoshaObject ) :
+            for slot in ( 'type', 'attribute' ) :
+                if type( getattr( value, slot, None ) ) is unicode :
+                    setattr( value, slot, str( getattr( value, slot ) ) )
+        return value
+
+    def _object ( self, value, convert ) :
+        self._names( value )
+        for slot in ( 'instance', 'items', 'fields', 'persistent', 'state' ) :
+            if hasattr( value, slot ) :
+                setattr( value, slot, convert( getattr( value, slot ) ) )
+        return value
+
+    def _from_json ( self, value ) :
+        kind = type( value )
+        if kind is str or kind is unicode :
+            if value[:1] == "<" :
+                oid = self.oid( value )
+                return value[1:] if oid is None else GenoshaReference( oid )
+            return value
+        if kind is list :
+            return [ self._from_json( item ) for item in value ]
+        if kind is dict :
+            return dict( ( self._from_json( key ), self._from_json( item ) ) for key, item in value.items() )
+        if isinstance( value, GenoshaObject ) :
+            return self._object( value, self._from_json )
+        return value
+
+    def _to_json ( self, value ) :
+        kind = type( value )
+        if kind is str or kind is unicode :
+            return self.escape( value )
+        if kind is GenoshaReference :
+            return self.reference( value.oid )
+        if kind is list :
+            return [ self._to_json( item ) for item in value ]
+        if kind is dict :
+            return dict( ( self._to_json( key ), self._to_json( item ) ) for key, item in value.items() )
+        if isinstance( value, GenoshaObject ) :
+            return self._object( value, self._to_json )
+        return value
+
+def main ( args = None ) :
+    parser = optparse.OptionParser( usage = "python -m genosha.transcoding [options] source destination"
+        , description = "Convert a genosha document to another format without loading it." )
+    parser.add_option( '--from', dest = 'src_format', choices = sorted( formats ), help = "format of the source (default: recognized)" )
+    parser.add_option( '--to', dest = 'dst_format', choices = sorted( formats ), help = "format of the destination (required)" )
+    parser.add_option( '--compact', action = 'store_true', default = False, help = "write the compact XML dialect" )
+    parser.add_option( '--compression', choices = sorted( _compression.formats ), help = "compress the destination" )
+    parser.add_option( '--item', type = 'int', help = "item id of the document in a source database (default the first)" )
+    options, rest = parser.parse_args( args )
+    if len( rest ) != 2 or not options.dst_format :
+        parser.error( "a source, a destination and --to are required" )
+    try :
+        result = transcode( rest[0], formats.get( options.src_format ), rest[1], formats[options.dst_format]
+            , options.compact, options.compression, item = options.item )
+    except ( IOError, ValueError ), e :
+        sys.stderr.write( "%s\n" % e )
+        return 1
+    if result is not None :
+        sys.stdout.write( "item %d\n" % result )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit( main() )
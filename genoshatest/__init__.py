@@ -13,7 +13,7 @@
 #
 #    You should have received a copy of the GNU General Public License
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
-import unittest
+import sys, types, struct, unittest, datetime, decimal, uuid, array
 from collections import defaultdict, deque
 
 import genosha
@@ -235,8 +235,151 @@ class GenoshaTests( DefaultTestCase ) :
         data = Test_Outer.Test_Inner()
         self._perform( data )
 
+    def testValueTypes ( self ) :
+        """Test the types written through the built-in reducers"""
+        stamp = datetime.datetime( 2009, 6, 1, 12, 30, 15, 250 )
+        data = [ stamp, stamp, datetime.datetime( 2009, 6, 1 ), datetime.date( 1999, 12, 31 )
+            , datetime.time( 23, 59 ), datetime.timedelta( 3, 5, 7 ), datetime.timedelta( -1 )
+            , decimal.Decimal( "3.14159" ), decimal.Decimal( "-1E+10" ), uuid.UUID( int = 0x12345678123456781234567812345678 ) ]
+        result = self._perform( data )
+        assert ( result[0] is result[1] )
+
+    def testValueTypeTimezone ( self ) :
+        """Test reduced values that refer to other objects"""
+        data = [ datetime.datetime( 2009, 6, 1, 12, tzinfo = Test_Zone() ), datetime.time( 8, tzinfo = Test_Zone() ) ]
+        result = self._perform( data )
+        assert ( result[0].utcoffset() == datetime.timedelta( hours = 2 ) )
+
+    def testBuffers ( self ) :
+        """Test bytearrays and arrays, whose contents are written as raw bytes"""
+        raw = bytearray( "\x00\xff<@1@>\x80" )
+        data = [ raw, raw, bytearray(), array.array( 'd', [ 1.5, -2.25 ] ), array.array( 'i', range( -3, 300 ) ), array.array( 'c', "abc" ) ]
+        result = self._perform( data )
+        assert ( result[0] is result[1] )
+
+    def testMemoryview ( self ) :
+        data = memoryview( "\x01\x02\xfe" )
+        result = self.unmarshal( self.marshal( data ) )
+        assert ( type( result ) is memoryview and result.tobytes() == data.tobytes() )
+
+    def testNumpy ( self ) :
+        """Test NumPy arrays (when NumPy is available)"""
+        try :
+            import numpy
+        except ImportError :
+            raise unittest.SkipTest( "NumPy is not installed; see testNumpyStub" )
+        data = [ numpy.arange( 12, dtype = '>i4' ).reshape( 3, 4 ), numpy.arange( 6.0 )[::2], numpy.zeros( ( 0, 2 ) ) ]
+        result = self.unmarshal( self.marshal( data ) )
+        for a, b in zip( data, result ) :
+            assert ( a.dtype == b.dtype and a.shape == b.shape and ( a == b ).all() )
+
+    def testNumpyStub ( self ) :
+        """Test the NumPy array reducer's metadata and bytes through a stand-in for NumPy"""
+        try :
+            import numpy
+            raise unittest.SkipTest( "NumPy is installed; see testNumpy" )
+        except ImportError :
+            pass
+        sys.modules['numpy'] = numpy = numpy_stub()
+        try :
+            a = numpy.empty( ( 2, 3 ), '>i4' )
+            a[:] = struct.pack( '>6i', 0, 1, -2, 3, 2 ** 31 - 1, -2 ** 31 )
+            strided = numpy.empty( ( 2, ), '<f8' )
+            strided[:] = struct.pack( '<2d', 1.5, -0.25 )
+            strided.flags = numpy.Flags( False )
+            data = [ a, strided, numpy.empty( ( 0, 2 ), '<f8' ) ]
+            doc = genosha.marshal( data )
+            arrays = [ obj for obj in doc[1] if obj.type == 'numpy/ndarray' ]
+            assert ( [ obj.items for obj in arrays ] == [ [ '>i4', [ 2, 3 ] ], [ '<f8', [ 2 ] ], [ '<f8', [ 0, 2 ] ] ] )
+            assert ( [ str( obj.data ) for obj in arrays ] == [ str( array ) for array in data ] )
+            assert ( strided.copies == 1 and a.copies == 0 )
+            result = self.unmarshal( self.marshal( data ) )
+            for x, y in zip( data, result ) :
+                assert ( type( y ) is numpy.ndarray and y.dtype.str == x.dtype.str and y.shape == x.shape and str( y ) == str( x ) )
+        finally :
+            del sys.modules['numpy']
+
+    def testTransient ( self ) :
+        """Test that fields declared in __genosha_transient__ are not marshalled"""
+        data = Test_Transient()
+        expected = Test_Transient()
+        del expected.cache
+        result = self._perform( data, expected )
+        assert ( not hasattr( result, 'cache' ) )
+
+    def testGetState ( self ) :
+        """Test a class that rebuilds derived fields from __getstate__'s dict in __setstate__"""
+        data = Test_State( "abc" )
+        result = self._perform( data )
+        assert ( result.upper == "ABC" )
+
+    def testGetStateTuple ( self ) :
+        """Test a class whose __getstate__ returns something other than a dict"""
+        data = Test_TupleState( 3, "x" )
+        self._perform( [ data, data ] )
+
+    def testGetStateDefaultDict ( self ) :
+        """Test a defaultdict subclass whose __getstate__ returns something other than a dict"""
+        data = Test_StateDefaultDict( "x" )
+        data['a'].append( 1 )
+        result = self._perform( data )
+        assert ( result.default_factory is list and result.label == "x" )
+
+    def testExtract ( self ) :
+        """Test converting only the part of a document found at a path"""
+        if not hasattr( self, 'extract' ) :
+            return
+        data = { 'orders' : [ Test_B(), Test_A() ], 'other' : Test_C1() }
+        _marshal = self.marshal( data )
+        result = self.extract( _marshal, "root.items['orders'].items[0].fields.a" )
+        assert( repr( result ) == repr( data['orders'][0].a ) )
+        result = self.extract( _marshal, "root.items.orders" )
+        assert( repr( result ) == repr( data['orders'] ) )
+
+    def testPersistent ( self ) :
+        """Test replacing objects with persistent ids and loading them back"""
+        if not hasattr( self, 'persistent' ) :
+            return
+        marshal, unmarshal = self.persistent
+        catalog = { 'USD' : 1, 'CAD' : 2 }
+        rates = Test_A()
+        known = { '<catalog' : catalog, 7 : rates }
+        ids = { id( catalog ) : '<catalog', id( rates ) : 7 }
+        data = [ catalog, Test_B(), { 'c' : catalog, 'r' : rates } ]
+        result = unmarshal( marshal( data, lambda obj : ids.get( id( obj ) ) ), known.__getitem__ )
+        assert( result[0] is catalog and result[2]['c'] is catalog and result[2]['r'] is rates )
+        assert( repr( result[1] ) == repr( data[1] ) )
+
 i=1
 
+def numpy_stub () :
+    r"""Return a module standing in for NumPy with just what the ndarray reducer uses:
+    arrays of fixed-size numbers kept as their raw bytes."""
+    numpy = types.ModuleType( 'numpy' )
+    class dtype ( object ) :
+        hasobject = False
+        fields = None
+        def __init__ ( self, spec ) :
+            self.str = spec
+            self.itemsize = int( spec[2:] )
+    class Flags ( object ) :
+        def __init__ ( self, c_contiguous = True ) :
+            self.c_contiguous = c_contiguous
+    class ndarray ( bytearray ) :
+        __module__ = 'numpy'
+        copies = 0
+        def copy ( self ) :
+            self.copies += 1
+            return empty( self.shape, self.dtype.str, self )
+        def reshape ( self, *shape ) : # only used to fill the whole array
+            return self
+    def empty ( shape, spec, data = None ) :
+        a = ndarray( data or reduce( lambda n, m : n * m, shape, 1 ) * dtype( spec ).itemsize )
+        a.dtype, a.shape, a.flags = dtype( spec ), tuple( shape ), Flags()
+        return a
+    numpy.ndarray, numpy.empty, numpy.frombuffer, numpy.Flags = ndarray, empty, lambda data, spec : str( data ), Flags
+    return numpy
+
 def module_function( input ) :
     return input + 1
 
@@ -335,3 +478,64 @@ class Test_Outer ( object ) :
     class Test_Inner ( object ) :
         def __repr__ ( self ) :
             return "<Test_Inner>"
+
+class Test_Transient ( object ) :
+    __genosha_transient__ = ( 'cache', )
+    def __init__ ( self ) :
+        self.data = [ 1, 2, 3 ]
+        self.cache = { 'sum' : 6 }
+    def __repr__ ( self ) :
+        return "<TestTransient: %s, cached=%s>" % ( self.data, hasattr( self, 'cache' ) )
+
+class Test_State ( object ) :
+    def __init__ ( self, name ) :
+        self.name = name
+        self.upper = name.upper()
+    def __getstate__ ( self ) :
+        return { 'name' : self.name }
+    def __setstate__ ( self, state ) :
+        self.name = state['name']
+        self.upper = self.name.upper()
+    def __repr__ ( self ) :
+        return "<TestState: %s %s>" % ( self.name, self.upper )
+
+class Test_TupleState ( object ) :
+    __slots__ = ( 'count', 'label' )
+    def __init__ ( self, count, label ) :
+        self.count = count
+        self.label = label
+    def __getstate__ ( self ) :
+        return ( self.count, self.label )
+    def __setstate__ ( self, state ) :
+        self.count, self.label = state
+    def __repr__ ( self ) :
+        return "<TestTupleState: %d %s>" % ( self.count, self.label )
+
+class Test_StateDefaultDict ( defaultdict ) :
+    def __init__ ( self, label ) :
+        defaultdict.__init__( self, list )
+        self.label = label
+    def __getstate__ ( self ) :
+        return ( self.label, )
+    def __setstate__ ( self, state ) :
+        self.label, = state
+    def __repr__ ( self ) :
+        return "<TestStateDefaultDict: %s %s %s>" % ( self.label, self.default_factory, sorted( self.items() ) )
+
+class Test_Zone ( datetime.tzinfo ) :
+    def utcoffset ( self, dt ) :
+        return datetime.timedelta( hours = 2 )
+    def dst ( self, dt ) :
+        return datetime.timedelta( 0 )
+    def __repr__ ( self ) :
+        return "<TestZone>"
+
+class Test_Vec ( object ) :
+    def __init__ ( self, xs, name ) :
+        self.xs = list( xs )
+        self.name = name
+    def __repr__ ( self ) :
+        return "<%s: %s %s>" % ( type( self ).__name__, self.xs, self.name )
+
+class Test_SubVec ( Test_Vec ) :
+    pass
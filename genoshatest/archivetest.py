@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+#    genoshatest/archivetest.py - test cases for Genosha random-access archives
+#    Copyright (C) 2009 Shawn Sulma <genosha@470th.org>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import time, sys, os, unittest, tempfile
+
+from genosha.Archive import dump, load, Archive, MAGIC
+import genoshatest
+
+__version__ = "0.1"
+__author__ = "Shawn Sulma <genosha@470th.org>"
+
+class GenoshaArchiveTests ( genoshatest.GenoshaTests ) :
+    def setUp ( self ) :
+        fd, self.fn = tempfile.mkstemp( suffix = '.gna' )
+        os.close( fd )
+        self.marshal = self._dump
+        self.unmarshal = load
+        self.extract = self._extract
+        self.long = long
+        self.unicode = unicode
+
+    def tearDown ( self ) :
+        os.remove( self.fn )
+
+    def _dump ( self, o ) :
+        f = open( self.fn, 'wb' )
+        try :
+            dump( o, f )
+        finally :
+            f.close()
+        return self.fn
+
+    def _extract ( self, fn, path ) :
+        archive = Archive( fn )
+        try :
+            return archive.extract( path )
+        finally :
+            archive.close()
+
+    def testPartialLoad ( self ) :
+        """Loading one object decodes only the records it refers to."""
+        shared = genoshatest.Test_A()
+        data = [ genoshatest.Test_B(), [ shared, 'x' ], shared ]
+        archive = Archive( self._dump( data ) )
+        try :
+            root = archive.record( archive.payload.oid )
+            branch = root.items[1]
+            assert( len( archive.closure( branch ) ) < len( archive ) )
+            result = archive.load( branch )
+            assert( repr( result ) == repr( data[1] ) )
+        finally :
+            archive.close()
+
+    def testNotArchive ( self ) :
+        """Opening a file that is not an archive fails and leaves it unmapped."""
+        for content in ( "not an archive", MAGIC + "\0" * 64 ) :
+            f = open( self.fn, 'wb' )
+            try :
+                f.write( content )
+            finally :
+                f.close()
+            try :
+                Archive( self.fn )
+                assert False, "opened " + repr( content )
+            except ValueError : # the traceback still holds the half-made Archive here
+                if os.path.exists( '/proc/self/maps' ) :
+                    assert( self.fn not in open( '/proc/self/maps' ).read() )
+
+class GenoshaArchiveLazyTests ( GenoshaArchiveTests ) :
+    def setUp ( self ) :
+        GenoshaArchiveTests.setUp( self )
+        self.unmarshal = lambda fn : load( fn, lazy = True )
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+#    genoshatest/batchtest.py - test cases for batch Genosha marshalling
+#    Copyright (C) 2009 Shawn Sulma <genosha@470th.org>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import time, sys, unittest
+
+import genosha
+from genosha.JSON import dumps_many, loads_many
+import genosha.parallel, genosha.Binary
+import genoshatest
+
+__version__ = "0.1"
+__author__ = "Shawn Sulma <genosha@470th.org>"
+
+class GenoshaBatchTests ( genoshatest.GenoshaTests ) :
+    def setUp ( self ) :
+        self.encoder = genosha.GenoshaEncoder()
+        self.decoder = genosha.GenoshaDecoder()
+        self.marshal = lambda o : self.encoder.marshal_many( [ o, 1 ] )
+        self.unmarshal = lambda docs : self.decoder.unmarshal_many( docs )[0]
+        self.long = long
+        self.unicode = unicode
+
+    def testShared ( self ) :
+        """Objects common to several roots are marshalled once when shared."""
+        common = genoshatest.Test_A()
+        roots = [ [ common ], genoshatest.Test_B(), { 'x' : common } ]
+        doc = genosha.marshal_many( roots, shared = True )
+        separate = genosha.marshal_many( roots )
+        assert( len( doc[1] ) < sum( len( d[1] ) for d in separate ) )
+        result = genosha.unmarshal( doc )
+        assert( repr( result ) == repr( roots ) )
+        assert( result[0][0] is result[2]['x'] )
+
+    def testPlans ( self ) :
+        """Types are resolved once per decoder, and the collector is paused only while decoding."""
+        resolved = []
+        resolve_type = self.decoder.resolve_type
+        self.decoder.resolve_type = lambda kind : ( resolved.append( kind ), resolve_type( kind ) )[1]
+        docs = [ genosha.marshal( [ genoshatest.Test_A(), genoshatest.Test_A() ] ) for i in xrange( 3 ) ]
+        self.decoder.unmarshal_many( docs )
+        assert( sorted( resolved ) == [ '__builtin__/dict', '__builtin__/list', 'genoshatest/Test_A' ] )
+        assert( self.decoder.plans['genoshatest/Test_A'][4] and self.decoder.plans['__builtin__/list'][2] is list.extend )
+        import gc
+        assert( gc.isenabled() )
+        self.assertRaises( ValueError, genosha.GenoshaDecoder().unmarshal, [ genosha.SENTINEL, [ genosha.GenoshaObject( oid = 0, type = 'genoshatest/Test_A', fields = { 'x' : genosha.GenoshaReference( 5 ) } ) ], 0 ] )
+        assert( gc.isenabled() )
+
+class GenoshaJSONBatchTests ( genoshatest.GenoshaTests ) :
+    def setUp ( self ) :
+        self.marshal = lambda o : dumps_many( [ 1, o ] )
+        self.unmarshal = lambda strings : loads_many( strings )[1]
+        self.long = int
+        self.unicode = str
+
+    def testShared ( self ) :
+        """A shared JSON batch loads back as the list of roots."""
+        common = genoshatest.Test_A()
+        roots = [ common, [ common ] ]
+        result = loads_many( [ dumps_many( roots, shared = True ) ] )[0]
+        assert( result[0] is result[1][0] )
+
+class GenoshaMemoTests ( genoshatest.GenoshaTests ) :
+    def setUp ( self ) :
+        self.encoder = genosha.GenoshaEncoder( memo = 4 )
+        self.encoder.memo_min = 1
+        self.marshal = lambda o : ( self.encoder.marshal( o ), self.encoder.marshal( o ) )[1]
+        self.unmarshal = genosha.unmarshal
+        self.long = long
+        self.unicode = unicode
+
+    def testMemo ( self ) :
+        """Immutable tables of primitives are marshalled once and then reused."""
+        table = tuple( xrange( 100 ) )
+        tables = [ frozenset( [ i ] ) for i in xrange( 3 ) ]
+        mixed = ( 1, [ 2 ] )
+        references = sys.getrefcount( mixed )
+        first = self.encoder.marshal( [ table, mixed ] )
+        second = self.encoder.marshal( [ table, mixed ] )
+        tuples = lambda doc : [ obj.items for obj in doc[1] if obj.type.endswith( '/tuple' ) ]
+        assert( tuples( first )[0] is tuples( second )[0] )
+        assert( tuples( first )[1] is not tuples( second )[1] )
+        assert( id( mixed ) in self.encoder.memo and self.encoder.memo[id( mixed )] is None )
+        del first, second
+        assert( sys.getrefcount( mixed ) == references )
+        second = self.encoder.marshal( [ table, mixed ] )
+        assert( genosha.unmarshal( second ) == [ table, mixed ] )
+        self.encoder.marshal( tables )
+        assert( len( self.encoder.memo ) == 4 and id( table ) not in self.encoder.memo )
+
+class GenoshaParallelTests ( genoshatest.GenoshaTests ) :
+    def setUp ( self ) :
+        self.marshal = lambda o : genosha.parallel.dumps_many( [ o ], processes = 2 )[0]
+        self.unmarshal = genosha.JSON.loads
+        self.long = int
+        self.unicode = str
+
+    def testOrder ( self ) :
+        """Results come back in input order across chunks and workers."""
+        roots = [ [ i, genoshatest.Test_A() ] for i in xrange( 50 ) ]
+        strings = genosha.parallel.dumps_many( roots, processes = 3, chunksize = 4 )
+        assert( [ genosha.JSON.loads( s )[0] for s in strings ] == range( 50 ) )
+        stream = genosha.parallel.imap_dumps( iter( roots ), backend = 'genosha.Binary', processes = 2, chunksize = 7 )
+        assert( [ genosha.Binary.loads( s )[0] for s in stream ] == range( 50 ) )
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+#    genoshatest/benchmark.py - throughput benchmarks for Genosha
+#    Copyright (C) 2009 Shawn Sulma <genosha@470th.org>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+r"""genoshatest/benchmark.py times the genosha encoder and decoder and every serialization
+module on the synthetic graphs of :mod:`genoshatest.graphs`, with :mod:`pickle` and
+:mod:`cPickle` as a baseline.  Run it as a script::
+
+    python -m genoshatest.benchmark --size 10000 --repeat 5 --output results.jsonl
+
+Each result is written as one JSON object per line, so runs can be kept and compared:
+
+    ``graph``, ``size``, ``codec`` and ``operation`` identify the measurement;
+    ``seconds`` is the best time of ``repeat`` runs; ``objects`` is the number of
+    GenoshaObjects the graph marshals to (the same count is used for every codec, so
+    rates are comparable); ``objects_per_second``; ``bytes`` and ``bytes_per_object``
+    give the size of the dumped form (None where it is not a string or file); ``error``
+    is set instead when the codec cannot handle the graph (e.g. pickle's recursion limit
+    on deep chains).
+"""
+import sys, os, gc, tempfile, timeit, optparse, sqlite3
+import pickle, cPickle
+try :
+    import simplejson as json
+except :
+    import json
+
+import genosha, genosha.JSON, genosha.XML, genosha.Binary, genosha.Archive, genosha.SQL
+from genoshatest import graphs
+
+__version__ = "0.1"
+__author__ = "Shawn Sulma <genosha@470th.org>"
+__all__ = [ 'codecs', 'default_codecs', 'run', 'main' ]
+
+def _archive_dump ( o ) :
+    fd, fn = tempfile.mkstemp( suffix = '.gna' )
+    f = os.fdopen( fd, 'wb' )
+    try :
+        genosha.Archive.dump( o, f )
+    finally :
+        f.close()
+    return fn
+
+def _archive_load ( fn ) :
+    try :
+        return genosha.Archive.load( fn )
+    finally :
+        os.remove( fn )
+
+def _sql_dump ( o ) :
+    conn = sqlite3.connect( ':memory:' )
+    genosha.SQL.create_tables( conn.cursor() )
+    return conn, genosha.SQL.dumpc( o, conn )
+
+def _sql_load ( stored ) :
+    conn, i = stored
+    return genosha.SQL.loadc( i, conn )
+
+# codec name -> ( dump operation, load operation, dump, load, size of the dumped form )
+codecs = { 'genosha' : ( 'marshal', 'unmarshal', genosha.marshal, genosha.unmarshal, None )
+    , 'JSON' : ( 'dumps', 'loads', genosha.JSON.dumps, genosha.JSON.loads, len )
+    , 'XML' : ( 'dumps', 'loads', genosha.XML.dumps, genosha.XML.loads, len )
+    , 'XML-compact' : ( 'dumps', 'loads', lambda o : genosha.XML.dumps( o, compact = True ), genosha.XML.loads, len )
+    , 'Binary' : ( 'dumps', 'loads', genosha.Binary.dumps, genosha.Binary.loads, len )
+    , 'Archive' : ( 'dump', 'load', _archive_dump, _archive_load, os.path.getsize )
+    , 'SQL' : ( 'dump', 'load', _sql_dump, _sql_load, None )
+    , 'pickle' : ( 'dumps', 'loads', lambda o : pickle.dumps( o, pickle.HIGHEST_PROTOCOL ), pickle.loads, len )
+    , 'cPickle' : ( 'dumps', 'loads', lambda o : cPickle.dumps( o, cPickle.HIGHEST_PROTOCOL ), cPickle.loads, len )
+    }
+
+# the SQL module is a toy (its tables have no indexes) and is only run when asked for.
+default_codecs = sorted( name for name in codecs if name != 'SQL' )
+
+def _time ( f, args ) :
+    best = None
+    results = []
+    for arg in args :
+        gc.collect()
+        start = timeit.default_timer()
+        results.append( f( arg ) )
+        elapsed = timeit.default_timer() - start
+        if best is None or elapsed < best :
+            best = elapsed
+    return best, results
+
+def run ( size = 10000, repeat = 3, graph_names = None, codec_names = None, seed = 0 ) :
+    r"""Run the benchmarks and return the list of results (as dicts, see above) for the
+    named graphs (by default all of them) and codecs (by default ``default_codecs``)."""
+    results = []
+    for graph_name in sorted( graph_names or graphs.generators ) :
+        graph = graphs.generators[graph_name]( size, seed )
+        objects = len( genosha.marshal( graph )[1] )
+        for codec_name in sorted( codec_names or default_codecs ) :
+            dump_op, load_op, dump, load, measure = codecs[codec_name]
+            common = { 'graph' : graph_name, 'size' : size, 'codec' : codec_name, 'objects' : objects }
+            try :
+                seconds, dumped = _time( dump, [ graph ] * repeat )
+                size_of = measure and measure( dumped[0] )
+                load_seconds = _time( load, dumped )[0] # each load gets its own input
+            except Exception, e :
+                results.append( dict( common, operation = dump_op, error = "%s: %s" % ( type( e ).__name__, e ) ) )
+                continue
+            for operation, elapsed in ( ( dump_op, seconds ), ( load_op, load_seconds ) ) :
+                results.append( dict( common, operation = operation, seconds = elapsed
+                    , objects_per_second = objects / elapsed if elapsed else None
+                    , bytes = size_of, bytes_per_object = float( size_of ) / objects if size_of and objects else None ) )
+    return results
+
+def main ( args = None ) :
+    parser = optparse.OptionParser( usage = "%prog [options]" )
+    parser.add_option( '--size', type = 'int', default = 10000, help = "nodes per graph (default %default)" )
+    parser.add_option( '--repeat', type = 'int', default = 3, help = "runs per measurement, best is kept (default %default)" )
+    parser.add_option( '--seed', type = 'int', default = 0, help = "seed for the graph generators (default %default)" )
+    parser.add_option( '--graph', action = 'append', dest = 'graphs', choices = sorted( graphs.generators ), help = "graph to run (repeatable; default all)" )
+    parser.add_option( '--codec', action = 'append', dest = 'codecs', choices = sorted( codecs ), help = "codec to run (repeatable; default all but SQL)" )
+    parser.add_option( '--output', help = "file to write the results to (default standard output)" )
+    options, rest = parser.parse_args( args )
+    results = run( options.size, options.repeat, options.graphs, options.codecs, options.seed )
+    out = open( options.output, 'w' ) if options.output else sys.stdout
+    try :
+        for result in results :
+            out.write( json.dumps( result, sort_keys = True ) + "\n" )
+    finally :
+        if out is not sys.stdout :
+            out.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+#    genoshatest/benchmarktest.py - test cases for the Genosha benchmark graphs and runner
+#    Copyright (C) 2009 Shawn Sulma <genosha@470th.org>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import time, sys, unittest
+
+import genosha, genosha.JSON, genosha.Binary
+from genoshatest import graphs, benchmark
+
+__version__ = "0.1"
+__author__ = "Shawn Sulma <genosha@470th.org>"
+
+class GenoshaGraphTests ( unittest.TestCase ) :
+    def testReproducible ( self ) :
+        """The same size and seed always generate the same graph."""
+        for name, generate in graphs.generators.items() :
+            assert( genosha.JSON.dumps( generate( 50, 3 ) ) == genosha.JSON.dumps( generate( 50, 3 ) ) )
+
+    def testRoundTrip ( self ) :
+        """Every generated graph survives marshalling."""
+        for name, generate in graphs.generators.items() :
+            graph = generate( 50 )
+            result = genosha.Binary.loads( genosha.Binary.dumps( graph ) )
+            if type( graph ) is dict : # its repr depends on the order keys were inserted
+                assert( result == graph )
+            else :
+                assert( repr( result ) == repr( graph ) )
+
+    def testRun ( self ) :
+        """The runner reports a dump and a load result for each graph and codec."""
+        results = benchmark.run( 20, 1, [ 'wide', 'cyclic' ], [ 'JSON', 'pickle' ] )
+        assert( len( results ) == 8 )
+        for result in results :
+            assert( result['objects'] > 0 and result['seconds'] >= 0 and result['bytes_per_object'] > 0 )
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+#    genoshatest/binarytest.py - test cases for Genosha over the binary format
+#    Copyright (C) 2009 Shawn Sulma <genosha@470th.org>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import time, sys, os, shutil, tempfile, unittest
+from StringIO import StringIO
+
+from genosha.Binary import dumps, loads, load, dump, extracts
+import genoshatest
+
+__version__ = "0.1"
+__author__ = "Shawn Sulma <genosha@470th.org>"
+
+class GenoshaBinaryTests ( genoshatest.GenoshaTests ) :
+    def setUp ( self ) :
+        self.marshal = dumps
+        self.unmarshal = loads
+        self.extract = extracts
+        self.persistent = ( dumps, loads )
+        self.long = long
+        self.unicode = unicode
+
+class GenoshaBinaryStreamTests ( genoshatest.GenoshaTests ) :
+    def setUp ( self ) :
+        self.marshal = dumps
+        self.unmarshal = lambda s : load( StringIO( s ) )
+        self.long = long
+        self.unicode = unicode
+
+class GenoshaBinaryCompressedTests ( genoshatest.GenoshaTests ) :
+    def setUp ( self ) :
+        self.marshal = self._dump
+        self.unmarshal = lambda s : load( StringIO( s ) )
+        self.long = long
+        self.unicode = unicode
+
+    def _dump ( self, o ) :
+        f = StringIO()
+        dump( o, f, compression = 'zlib', compresslevel = 1 )
+        return f.getvalue()
+
+class GenoshaBinaryFileTests ( genoshatest.GenoshaTests ) :
+    def setUp ( self ) :
+        self.directory = tempfile.mkdtemp()
+        self.marshal = self._dump
+        self.unmarshal = load
+        self.long = long
+        self.unicode = unicode
+
+    def tearDown ( self ) :
+        shutil.rmtree( self.directory )
+
+    def _dump ( self, o ) :
+        name = os.path.join( self.directory, '%d.bin' % len( os.listdir( self.directory ) ) )
+        dump( o, name, compression = 'zlib' )
+        return name
+
+class GenoshaBinarySharedStringTests ( genoshatest.GenoshaTests ) :
+    def setUp ( self ) :
+        self.marshal = lambda o : dumps( o, strings = 1 )
+        self.unmarshal = loads
+        self.long = long
+        self.unicode = unicode
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+#    genoshatest/graphs.py - synthetic object graphs for Genosha benchmarks
+#    Copyright (C) 2009 Shawn Sulma <genosha@470th.org>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+r"""genoshatest/graphs.py generates synthetic object graphs of a requested size for
+benchmarks and measurements.  Each generator takes the number of nodes ``n`` and a
+``seed``; the same arguments always produce the same graph.
+
+    - ``wide`` - one flat list of primitives and small tuples
+    - ``deep`` - a linked chain of ``__dict__`` instances
+    - ``cyclic`` - instances with random edges between them, full of cycles
+    - ``slotted`` - a list of small ``__slots__`` instances
+    - ``instances`` - a list of small ``__dict__`` instances with nested containers
+    - ``mapping`` - a big dict of string keys to small lists and dicts
+
+``generators`` maps those names to the generator functions.
+"""
+import random
+
+__version__ = "0.1"
+__author__ = "Shawn Sulma <genosha@470th.org>"
+__all__ = [ 'generators', 'wide', 'deep', 'cyclic', 'slotted', 'instances', 'mapping' ]
+
+class Node ( object ) :
+    def __init__ ( self, value ) :
+        self.value = value
+        self.next = None
+        self.edges = []
+
+    def __repr__ ( self ) :
+        return "<Node:%r>" % ( self.value, )
+
+class Point ( object ) :
+    __slots__ = ( 'x', 'y', 'label' )
+    def __init__ ( self, x, y, label ) :
+        self.x = x
+        self.y = y
+        self.label = label
+
+    def __repr__ ( self ) :
+        return "<Point:%r,%r,%r>" % ( self.x, self.y, self.label )
+
+class Record ( object ) :
+    def __init__ ( self, key, amount, tags, attributes ) :
+        self.key = key
+        self.amount = amount
+        self.tags = tags
+        self.attributes = attributes
+
+    def __repr__ ( self ) :
+        return "<Record:%r,%r,%r,%r>" % ( self.key, self.amount, self.tags, self.attributes )
+
+def wide ( n, seed = 0 ) :
+    rng = random.Random( seed )
+    out = []
+    for i in xrange( n ) :
+        kind = i % 4
+        if kind == 0 :
+            out.append( rng.randint( -1000000, 1000000 ) )
+        elif kind == 1 :
+            out.append( "item-%d" % rng.randint( 0, n ) )
+        elif kind == 2 :
+            out.append( rng.random() )
+        else :
+            out.append( ( i, "t" ) )
+    return out
+
+def deep ( n, seed = 0 ) :
+    rng = random.Random( seed )
+    head = node = Node( rng.randint( 0, n ) )
+    for i in xrange( n - 1 ) :
+        node.next = Node( rng.randint( 0, n ) )
+        node = node.next
+    return head
+
+def cyclic ( n, seed = 0, degree = 3 ) :
+    rng = random.Random( seed )
+    nodes = [ Node( i ) for i in xrange( n ) ]
+    for node in nodes :
+        node.edges = [ nodes[rng.randrange( n )] for i in xrange( degree ) ]
+        node.next = nodes[rng.randrange( n )]
+    return nodes
+
+def slotted ( n, seed = 0 ) :
+    rng = random.Random( seed )
+    return [ Point( rng.randint( 0, 1000 ), rng.random(), "p%d" % i ) for i in xrange( n ) ]
+
+def instances ( n, seed = 0 ) :
+    rng = random.Random( seed )
+    tags = [ "red", "green", "blue", "cyan" ]
+    return [ Record( "r%d" % i, rng.randint( 0, 100000 ), [ rng.choice( tags ) for j in xrange( 2 ) ], { 'rank' : rng.random() } )
+        for i in xrange( n ) ]
+
+def mapping ( n, seed = 0 ) :
+    rng = random.Random( seed )
+    return dict( ( "key-%d" % i, [ rng.randint( 0, 100 ), { 'v' : rng.random() } ] if i % 2 else rng.randint( 0, 100 ) )
+        for i in xrange( n ) )
+
+generators = { 'wide' : wide, 'deep' : deep, 'cyclic' : cyclic, 'slotted' : slotted, 'instances' : instances, 'mapping' : mapping }
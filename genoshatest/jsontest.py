@@ -14,10 +14,11 @@
 #
 #    You should have received a copy of the GNU General Public License
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
-import time, sys, unittest
+import time, sys, os, shutil, tempfile, unittest
+from StringIO import StringIO
 
 import genosha
-from genosha.JSON import dumps, loads
+from genosha.JSON import dumps, loads, dump, load, extracts
 import genoshatest
 
 __version__ = "0.1"
@@ -27,8 +28,54 @@ class GenoshaJSONTests ( genoshatest.GenoshaTests ) :
     def setUp ( self ) :
         self.marshal = dumps
         self.unmarshal = loads
+        self.extract = extracts
+        self.persistent = ( lambda o, pid : dumps( o, persistent_id = pid ), lambda s, load : loads( s, persistent_load = load ) )
         self.long = int
         self.unicode = str
 
+class GenoshaJSONCompressedTests ( genoshatest.GenoshaTests ) :
+    def setUp ( self ) :
+        self.marshal = self._dump
+        self.unmarshal = lambda s : load( StringIO( s ) )
+        self.long = int
+        self.unicode = str
+
+    def _dump ( self, o ) :
+        f = StringIO()
+        dump( o, f, compression = 'gzip' )
+        assert( f.getvalue()[:2] == '\x1f\x8b' )
+        return f.getvalue()
+
+class GenoshaJSONFileTests ( genoshatest.GenoshaTests ) :
+    def setUp ( self ) :
+        self.directory = tempfile.mkdtemp()
+        self.marshal = self._dump
+        self.unmarshal = load
+        self.long = int
+        self.unicode = str
+
+    def tearDown ( self ) :
+        shutil.rmtree( self.directory )
+
+    def _dump ( self, o ) :
+        name = os.path.join( self.directory, '%d.json' % len( os.listdir( self.directory ) ) )
+        dump( o, name, compression = 'gzip' )
+        return name
+
+class GenoshaJSONSharedStringTests ( genoshatest.GenoshaTests ) :
+    def setUp ( self ) :
+        self.marshal = lambda o : dumps( o, strings = 1 )
+        self.unmarshal = loads
+        self.long = int
+        self.unicode = str
+
+    def testSharedStrings ( self ) :
+        """Repeated strings are written twice at most, and their repeats load as one instance."""
+        data = [ "<status:active>" ] * 1000 + [ "<status:%d>" % i for i in range( 3 ) ]
+        s = dumps( data, strings = 4 )
+        assert( s.count( "status:active" ) == 2 and len( s ) < len( dumps( data ) ) / 2 )
+        result = loads( s )
+        assert( result == data and result[1] is result[999] )
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+#    genoshatest/lazytest.py - test cases for lazy Genosha decoding
+#    Copyright (C) 2009 Shawn Sulma <genosha@470th.org>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import time, sys, unittest
+
+import genosha
+import genoshatest
+
+__version__ = "0.1"
+__author__ = "Shawn Sulma <genosha@470th.org>"
+
+class GenoshaLazyTests ( genoshatest.GenoshaTests ) :
+    def setUp ( self ) :
+        self.marshal = genosha.marshal
+        self.unmarshal = lambda o : genosha.unmarshal( o, lazy = True )
+        self.long = long
+        self.unicode = unicode
+
+    def testUntouched ( self ) :
+        """Instances are only filled in when first used."""
+        data = [ genoshatest.Test_B(), genoshatest.Test_B() ]
+        decoder = genosha.GenoshaDecoder( lazy = True )
+        result = decoder.unmarshal( genosha.marshal( data ) )
+        assert( len( decoder.pending ) == 2 )
+        assert( type( result[0] ) is not genoshatest.Test_B )
+        assert( isinstance( result[0], genoshatest.Test_B ) )
+        assert( result[0].foo == 'bar' )
+        assert( type( result[0] ) is genoshatest.Test_B )
+        assert( len( decoder.pending ) == 2 ) # result[1] and result[0].a
+        assert( repr( result ) == repr( data ) )
+        assert( len( decoder.pending ) == 0 )
+
+    def testIdentity ( self ) :
+        """Shared and cyclic references resolve to the same object."""
+        data = genoshatest.Test_C1()
+        result = self.unmarshal( self.marshal( [ data, data.other ] ) )
+        assert( result[0].other is result[1] )
+        assert( result[1].other is result[0] )
+
+if __name__ == "__main__":
+    unittest.main()
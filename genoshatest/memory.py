@@ -0,0 +1,271 @@
+#    genoshatest/memory.py - peak memory measurements for Genosha
+#    Copyright (C) 2009 Shawn Sulma <genosha@470th.org>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+r"""genoshatest/memory.py measures how much memory each serialization module needs to
+dump and load the synthetic graphs of :mod:`genoshatest.graphs`, and fails when a
+phase needs more than a budget of bytes per object.  Run it as a script::
+
+    python -m genoshatest.memory --size 20000 --budget 2048
+
+which writes one JSON object per measurement and exits with status 1 if any phase went
+over budget.  A measurement records, for one ``graph``, ``codec`` and ``phase``:
+
+    - ``objects`` - the number of GenoshaObjects the graph marshals to
+    - ``live_bytes`` - the memory the graph itself occupies
+    - ``peak_bytes`` - the most memory in use during the phase, above what was in use
+      before it (the graph, or the input being loaded)
+    - ``retained_bytes`` - the memory still in use after the phase (the marshalled
+      structure or the loaded graph; dumps go to a file)
+    - ``peak_per_object`` and ``retained_per_object`` - the same, per object
+    - ``method`` - 'tracemalloc' when the :mod:`tracemalloc` module is available, 'rss'
+      otherwise (the resident set size is then sampled while the phase runs)
+    - ``budget`` - the peak bytes per object allowed: the one given, or else the
+      codec's and phase's in ``BUDGETS`` (``BUDGET`` if it has none)
+    - ``over_budget`` - whether ``peak_per_object`` exceeds the budget
+    - ``error`` - only present if the dump failed (e.g. pickle on a deep graph); the
+      memory figures are then None and there is no load measurement
+
+The phases are 'marshal' and 'unmarshal' for the 'genosha' codec (the in-memory
+structure, which every module builds) and 'dump' and 'load' (to and from a file) for
+the others.  Each phase runs in a freshly forked process, where available, so earlier
+phases do not distort it.  RSS figures are approximate: they move in whole pages and
+miss memory the interpreter had already freed and reuses.
+"""
+import sys, os, gc, time, tempfile, threading, traceback, optparse, mmap
+try :
+    import resource
+except ImportError : # not on Windows
+    resource = None
+import pickle, cPickle
+try :
+    import simplejson as json
+except :
+    import json
+try :
+    import tracemalloc
+except ImportError :
+    tracemalloc = None
+
+import genosha, genosha.JSON, genosha.XML, genosha.Binary, genosha.Archive
+from genoshatest import graphs
+
+__version__ = "0.1"
+__author__ = "Shawn Sulma <genosha@470th.org>"
+__all__ = [ 'codecs', 'run', 'main' ]
+
+BUDGET = 8192 # bytes per object, for the codecs and phases not in BUDGETS
+# ( codec name, phase ) -> bytes per object: what the instances and cyclic graphs of
+# 5000 nodes were measured to need, with a margin of about a quarter or more
+BUDGETS = { ( 'JSON', 'dump' ) : 2048, ( 'JSON', 'load' ) : 2048
+    , ( 'Binary', 'dump' ) : 2048, ( 'Binary', 'load' ) : 2048
+    , ( 'XML-compact', 'dump' ) : 8192, ( 'XML-compact', 'load' ) : 2048
+    , ( 'XML', 'dump' ) : 16384, ( 'XML', 'load' ) : 2048
+    }
+
+def _unpickle ( fn ) :
+    f = open( fn, 'rb' )
+    try :
+        return cPickle.load( f )
+    finally :
+        f.close()
+
+def _open ( fn ) :
+    return open( fn, 'rb' )
+
+def _name ( fn ) :
+    return fn
+
+# codec name -> ( dump phase, load phase, dump( obj, f ), prepare( filename ), load( prepared ) );
+# only the load itself is measured, not the preparation of its input
+codecs = { 'genosha' : ( 'marshal', 'unmarshal', lambda o, f : cPickle.dump( genosha.marshal( o ), f, 2 ), _unpickle, genosha.unmarshal )
+    , 'JSON' : ( 'dump', 'load', genosha.JSON.dump, _open, genosha.JSON.load )
+    , 'XML' : ( 'dump', 'load', genosha.XML.dump, _open, genosha.XML.load )
+    , 'XML-compact' : ( 'dump', 'load', lambda o, f : genosha.XML.dump( o, f, compact = True ), _open, genosha.XML.load )
+    , 'Binary' : ( 'dump', 'load', genosha.Binary.dump, _open, genosha.Binary.load )
+    , 'Archive' : ( 'dump', 'load', genosha.Archive.dump, _name, genosha.Archive.load )
+    , 'pickle' : ( 'dump', 'load', lambda o, f : pickle.dump( o, f, 2 ), _open, pickle.load )
+    , 'cPickle' : ( 'dump', 'load', lambda o, f : cPickle.dump( o, f, 2 ), _open, cPickle.load )
+    }
+
+def rss () :
+    r"""Return the current resident set size of this process in bytes.  Where it cannot be
+    read (outside Linux) return the largest it has been instead, which still bounds the
+    peak of a phase run in a fresh process, or 0 where :mod:`resource` is missing too."""
+    try :
+        f = open( '/proc/self/statm' )
+        try :
+            return int( f.read().split()[1] ) * mmap.PAGESIZE
+        finally :
+            f.close()
+    except IOError :
+        if resource is None :
+            return 0
+        return resource.getrusage( resource.RUSAGE_SELF ).ru_maxrss * ( sys.platform == 'darwin' and 1 or 1024 )
+
+class Meter ( object ) :
+    r"""Measures the memory used between ``start`` and ``stop``: with tracemalloc if it is
+    available, otherwise by sampling the resident set size every ``interval`` seconds."""
+    def __init__ ( self, interval = 0.001 ) :
+        self.method = tracemalloc and 'tracemalloc' or 'rss'
+        self.interval = interval
+
+    def start ( self ) :
+        gc.collect()
+        if tracemalloc :
+            tracemalloc.start()
+            return
+        self.base = self.peak = rss()
+        self.running = True
+        self.sampler = threading.Thread( target = self._sample )
+        self.sampler.daemon = True
+        self.sampler.start()
+
+    def _sample ( self ) :
+        while self.running :
+            current = rss()
+            if current > self.peak :
+                self.peak = current
+            time.sleep( self.interval )
+
+    def stop ( self ) :
+        r"""Return the peak and retained bytes since ``start``."""
+        gc.collect()
+        if tracemalloc :
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            return peak, current
+        self.running = False
+        self.sampler.join()
+        current = rss()
+        self.peak = max( self.peak, current )
+        return self.peak - self.base, current - self.base
+
+def _isolated ( f, *args ) :
+    r"""Call ``f( *args )`` in a forked child (where fork is available) and return its
+    result, which must be JSON-serializable.  A failure in the child raises RuntimeError
+    with the child's traceback."""
+    if not hasattr( os, 'fork' ) :
+        return f( *args )
+    r, w = os.pipe()
+    pid = os.fork()
+    if pid == 0 :
+        code = 1
+        try :
+            try :
+                os.close( r )
+                data = json.dumps( f( *args ) )
+                code = 0
+            except BaseException :
+                data = traceback.format_exc()
+            while data :
+                data = data[os.write( w, data ):]
+        finally :
+            os._exit( code )
+    os.close( w )
+    data = []
+    while True :
+        chunk = os.read( r, 65536 )
+        if not chunk :
+            break
+        data.append( chunk )
+    os.close( r )
+    status = os.waitpid( pid, 0 )[1]
+    if status :
+        raise RuntimeError, "measurement process failed:\n" + ( "".join( data ) or "status %d" % status )
+    return json.loads( "".join( data ) )
+
+def _dump_phase ( generate, size, seed, dump, fn ) :
+    meter = Meter()
+    meter.start()
+    graph = generate( size, seed )
+    live = meter.stop()[1]
+    result = { 'objects' : len( genosha.marshal( graph )[1] ), 'live_bytes' : live, 'method' : meter.method }
+    f = open( fn, 'wb' )
+    try :
+        meter.start()
+        try :
+            dump( graph, f )
+        except Exception, e : # e.g. pickle running out of stack on a deep graph
+            meter.stop()
+            result['error'] = "%s: %s" % ( type( e ).__name__, e )
+            return result
+        result['peak_bytes'], result['retained_bytes'] = meter.stop()
+    finally :
+        f.close()
+    return result
+
+def _load_phase ( prepare, load, fn ) :
+    data = prepare( fn )
+    meter = Meter()
+    meter.start()
+    graph = load( data )
+    peak, retained = meter.stop()
+    return { 'peak_bytes' : peak, 'retained_bytes' : retained, 'method' : meter.method }
+
+def run ( size = 20000, budget = None, graph_names = None, codec_names = None, seed = 0 ) :
+    r"""Measure the named graphs (by default all of them) with the named codecs (by default
+    all of them) and return the list of measurements (as dicts, see above).  ``budget``,
+    if given, replaces the budgets of ``BUDGETS`` for every codec and phase."""
+    results = []
+    for graph_name in sorted( graph_names or graphs.generators ) :
+        generate = graphs.generators[graph_name]
+        for codec_name in sorted( codec_names or codecs ) :
+            dump_phase, load_phase, dump, prepare, load = codecs[codec_name]
+            fd, fn = tempfile.mkstemp()
+            os.close( fd )
+            try :
+                dumped = _isolated( _dump_phase, generate, size, seed, dump, fn )
+                loaded = 'error' not in dumped and _isolated( _load_phase, prepare, load, fn ) or None
+            finally :
+                os.remove( fn )
+            common = dict( graph = graph_name, size = size, codec = codec_name, objects = dumped.pop( 'objects' ), live_bytes = dumped.pop( 'live_bytes' ) )
+            phases = [ ( dump_phase, dumped ) ]
+            if loaded is not None :
+                phases.append( ( load_phase, loaded ) )
+            for phase, result in phases :
+                result.update( common, phase = phase, budget = budget if budget is not None else BUDGETS.get( ( codec_name, phase ), BUDGET ) )
+                if 'error' in result :
+                    result.update( peak_bytes = None, retained_bytes = None, peak_per_object = None, retained_per_object = None, over_budget = False )
+                else :
+                    result['peak_per_object'] = float( result['peak_bytes'] ) / result['objects']
+                    result['retained_per_object'] = float( result['retained_bytes'] ) / result['objects']
+                    result['over_budget'] = result['peak_per_object'] > result['budget']
+                results.append( result )
+    return results
+
+def main ( args = None ) :
+    parser = optparse.OptionParser( usage = "%prog [options]" )
+    parser.add_option( '--size', type = 'int', default = 20000, help = "nodes per graph (default %default)" )
+    parser.add_option( '--budget', type = 'float', help = "peak bytes allowed per object (default the codec's and phase's in BUDGETS)" )
+    parser.add_option( '--seed', type = 'int', default = 0, help = "seed for the graph generators (default %default)" )
+    parser.add_option( '--graph', action = 'append', dest = 'graphs', choices = sorted( graphs.generators ), help = "graph to run (repeatable; default all)" )
+    parser.add_option( '--codec', action = 'append', dest = 'codecs', choices = sorted( codecs ), help = "codec to run (repeatable; default all)" )
+    parser.add_option( '--output', help = "file to write the results to (default standard output)" )
+    options, rest = parser.parse_args( args )
+    results = run( options.size, options.budget, options.graphs, options.codecs, options.seed )
+    out = open( options.output, 'w' ) if options.output else sys.stdout
+    try :
+        for result in results :
+            out.write( json.dumps( result, sort_keys = True ) + "\n" )
+    finally :
+        if out is not sys.stdout :
+            out.close()
+    over = [ result for result in results if result['over_budget'] ]
+    for result in over :
+        sys.stderr.write( "over budget: %(graph)s %(codec)s %(phase)s: %(peak_per_object).0f bytes per object\n" % result )
+    return over and 1 or 0
+
+if __name__ == "__main__":
+    sys.exit( main() )
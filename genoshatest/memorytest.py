@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+#    genoshatest/memorytest.py - memory budget tests for Genosha
+#    Copyright (C) 2009 Shawn Sulma <genosha@470th.org>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import os, unittest
+
+from genoshatest import memory
+
+__version__ = "0.1"
+__author__ = "Shawn Sulma <genosha@470th.org>"
+
+# the peak bytes per object allowed, for every codec and phase; by default those of
+# memory.BUDGETS
+BUDGET = float( os.environ['GENOSHA_MEMORY_BUDGET'] ) if 'GENOSHA_MEMORY_BUDGET' in os.environ else None
+
+class GenoshaMemoryTests ( unittest.TestCase ) :
+    def testMeasurements ( self ) :
+        """Every phase is measured for every codec."""
+        results = memory.run( 2000, BUDGET, [ 'instances' ], [ 'genosha', 'JSON' ] )
+        assert( [ ( result['codec'], result['phase'] ) for result in results ] == [ ( 'JSON', 'dump' ), ( 'JSON', 'load' ), ( 'genosha', 'marshal' ), ( 'genosha', 'unmarshal' ) ] )
+        for result in results :
+            assert( result['objects'] == 6001 and result['peak_bytes'] >= 0 )
+
+    def testBudget ( self ) :
+        """Dumping and loading stay within the memory budget of each codec and phase."""
+        results = memory.run( 5000, BUDGET, [ 'instances', 'cyclic' ], [ 'JSON', 'XML', 'XML-compact', 'Binary' ] )
+        over = [ "%(graph)s %(codec)s %(phase)s: %(peak_per_object).0f" % result for result in results if result['over_budget'] ]
+        assert not over, "over budget (bytes per object): " + ", ".join( over )
+
+    def testOverBudget ( self ) :
+        """A phase that needs more than the budget is reported."""
+        results = memory.run( 2000, 0, [ 'wide' ], [ 'Binary' ] )
+        assert( [ result['over_budget'] for result in results if result['peak_bytes'] > 0 ] )
+        assert( all( result['over_budget'] for result in results if result['peak_bytes'] > 0 ) )
+
+if __name__ == "__main__":
+    unittest.main()
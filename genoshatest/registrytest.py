@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+#    genoshatest/registrytest.py - test cases for registered Genosha type aliases
+#    Copyright (C) 2009 Shawn Sulma <genosha@470th.org>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import time, sys, unittest
+
+import genosha, genosha.Binary, genosha.XML
+from genosha.JSON import dumps, loads
+import genoshatest
+
+__version__ = "0.1"
+__author__ = "Shawn Sulma <genosha@470th.org>"
+
+class GenoshaRegistryTests ( genoshatest.GenoshaTests ) :
+    def setUp ( self ) :
+        self.before = dict( genosha.registered )
+        genosha.register_module( genoshatest, 't.' )
+        self.marshal = dumps
+        self.unmarshal = loads
+        self.long = int
+        self.unicode = str
+
+    def tearDown ( self ) :
+        for obj in genosha.registered.keys() :
+            if obj not in self.before :
+                genosha.unregister( obj )
+
+    def testAliases ( self ) :
+        """Registered classes are written and read by their aliases."""
+        data = [ genoshatest.Test_A(), genoshatest.Test_B ]
+        s = dumps( data )
+        assert( '"@t.Test_A"' in s and '"@t.Test_B"' in s and 'genoshatest/' not in s )
+        assert( repr( loads( s ) ) == repr( data ) )
+        self.assertRaises( ValueError, genosha.register, genoshatest.Test_A, 'other' )
+        self.assertRaises( ValueError, genosha.register, genoshatest.Test_C1, 't.Test_A' )
+        genosha.unregister( genoshatest.Test_A )
+        self.assertRaises( ValueError, loads, s )
+
+    def testReducer ( self ) :
+        """Registered reducers replace the fields of their type and of its subclasses."""
+        genosha.register_reducer( genoshatest.Test_State, lambda obj : obj.name, lambda kind, value : kind( value ) )
+        try :
+            data = [ genoshatest.Test_State( "abc" ), genoshatest.Test_State( "def" ) ]
+            s = dumps( data )
+            assert( '"abc"' in s and 'upper' not in s and 'ABC' not in s )
+            assert( repr( loads( s ) ) == repr( data ) )
+        finally :
+            genosha.unregister_reducer( genoshatest.Test_State )
+        assert( '"name"' in dumps( data ) )
+
+    def testReducerContainers ( self ) :
+        """Containers in a reduced value are complete when it is constructed, for subclasses too."""
+        Vec, SubVec = genoshatest.Test_Vec, genoshatest.Test_SubVec
+        old = dumps( [ Vec( [ 1 ], 'old' ) ] )
+        genosha.register_reducer( Vec, lambda v : [ v.xs, v.name, { 'xs' : v.xs, ( 1, 2 ) : [ v.name ] } ]
+            , lambda kind, value : kind( value[2]['xs'], value[1] + value[2][( 1, 2 )][0] ) )
+        try :
+            shared = [ 4, [ 5 ] ]
+            data = [ Vec( [ 1, 2, 3 ], 'a' ), SubVec( shared, 'b' ), SubVec( shared, 'c' ) ]
+            for marshal, unmarshal in ( ( dumps, loads ), ( genosha.Binary.dumps, genosha.Binary.loads ), ( genosha.XML.dumps, genosha.XML.loads ) ) :
+                result = unmarshal( marshal( data ) )
+                assert( repr( result ) == "[<Test_Vec: [1, 2, 3] aa>, <Test_SubVec: [4, [5]] bb>, <Test_SubVec: [4, [5]] cc>]" )
+            assert( repr( loads( old ) ) == "[<Test_Vec: [1] old>]" )
+        finally :
+            genosha.unregister_reducer( Vec )
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+#    genoshatest/shardtest.py - test cases for sharded Genosha output
+#    Copyright (C) 2009 Shawn Sulma <genosha@470th.org>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import time, sys, os, unittest, tempfile, shutil
+
+import genosha.shard
+import genoshatest
+
+__version__ = "0.1"
+__author__ = "Shawn Sulma <genosha@470th.org>"
+
+class GenoshaShardTests ( genoshatest.GenoshaTests ) :
+    backend = 'genosha.JSON'
+    options = {}
+
+    def setUp ( self ) :
+        self.dir = tempfile.mkdtemp()
+        self.fn = os.path.join( self.dir, 'shards' )
+        self.marshal = self._dump
+        self.unmarshal = lambda fn : genosha.shard.load( fn, processes = 1 )
+        self.long = int
+        self.unicode = str
+
+    def tearDown ( self ) :
+        shutil.rmtree( self.dir )
+
+    def _dump ( self, o ) :
+        genosha.shard.dump( o, self.fn, self.backend, max_objects = 2, **self.options )
+        return self.fn
+
+    def testShards ( self ) :
+        """Objects are split across shards and references between them are restored."""
+        shared = genoshatest.Test_A()
+        data = [ shared, [ genoshatest.Test_B(), shared ], { 'x' : [ shared ] } ]
+        info = genosha.shard.dump( data, self.fn, self.backend, max_objects = 3, **self.options )
+        assert( len( info['shards'] ) > 1 )
+        assert( sum( shard['count'] for shard in info['shards'] ) == info['objects'] )
+        assert( [ shard['first'] for shard in info['shards'] ] == [ sum( shard['count'] for shard in info['shards'][:i] ) for i in xrange( len( info['shards'] ) ) ] )
+        assert( max( shard['count'] for shard in info['shards'] ) <= 3 )
+        result = genosha.shard.load( self.fn, processes = 2 )
+        assert( repr( result ) == repr( data ) )
+        assert( result[0] is result[1][1] and result[0] is result[2]['x'][0] )
+
+    def testBytes ( self ) :
+        """A shard is closed once it reaches the byte limit."""
+        data = [ [ i ] for i in xrange( 20 ) ]
+        info = genosha.shard.dump( data, self.fn, self.backend, max_bytes = 64, **self.options )
+        assert( len( info['shards'] ) > 2 )
+        assert( genosha.shard.load( self.fn, processes = 1 ) == data )
+
+class GenoshaXMLShardTests ( GenoshaShardTests ) :
+    backend = 'genosha.XML'
+
+    def setUp ( self ) :
+        GenoshaShardTests.setUp( self )
+        self.long = long
+        self.unicode = unicode
+
+class GenoshaCompactXMLShardTests ( GenoshaXMLShardTests ) :
+    options = { 'compact' : True }
+
+class GenoshaBinaryShardTests ( GenoshaShardTests ) :
+    backend = 'genosha.Binary'
+
+    def setUp ( self ) :
+        GenoshaShardTests.setUp( self )
+        self.long = long
+        self.unicode = unicode
+
+if __name__ == "__main__":
+    unittest.main()
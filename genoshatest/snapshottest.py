@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+#    genoshatest/snapshottest.py - test cases for background Genosha snapshots
+#    Copyright (C) 2009 Shawn Sulma <genosha@470th.org>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import time, sys, os, unittest, tempfile, shutil
+
+import genosha, genosha.Binary
+from genosha.snapshot import SnapshotError
+import genoshatest
+
+__version__ = "0.1"
+__author__ = "Shawn Sulma <genosha@470th.org>"
+
+class GenoshaSnapshotTests ( unittest.TestCase ) :
+    def setUp ( self ) :
+        self.dir = tempfile.mkdtemp()
+        self.fn = os.path.join( self.dir, 'snapshot' )
+
+    def tearDown ( self ) :
+        shutil.rmtree( self.dir )
+
+    def _load ( self, fn ) :
+        f = open( fn, 'rb' )
+        try :
+            return genosha.Binary.load( f )
+        finally :
+            f.close()
+
+    def testSnapshot ( self ) :
+        """A snapshot loads back as the graph it was taken of."""
+        data = [ genoshatest.Test_B(), genoshatest.Test_C1() ]
+        snapshot = genosha.snapshot_in_background( data, self.fn, 'genosha.Binary' )
+        while not snapshot.poll() :
+            time.sleep( 0.01 )
+        assert( snapshot.error is None )
+        assert( repr( self._load( self.fn ) ) == repr( data ) )
+
+    def testConsistent ( self ) :
+        """Changes made after the fork do not reach the snapshot."""
+        data = [ genoshatest.Test_A(), range( 1000 ) ]
+        expected = repr( data )
+        snapshot = genosha.snapshot_in_background( data, self.fn, 'genosha.Binary' )
+        data[1].append( 'late' )
+        data.append( 'later' )
+        snapshot.wait()
+        assert( snapshot.poll() and snapshot.error is None )
+        assert( repr( self._load( self.fn ) ) == expected )
+
+    def testSamePath ( self ) :
+        """Overlapping snapshots to one path each write a file of their own."""
+        first, second = range( 50000 ), [ genoshatest.Test_B() ] * 50000
+        snapshots = [ genosha.snapshot_in_background( data, self.fn, 'genosha.Binary' ) for data in ( first, second ) ]
+        for snapshot in snapshots :
+            snapshot.wait()
+            assert( snapshot.error is None )
+        assert( repr( self._load( self.fn ) ) in ( repr( first ), repr( second ) ) )
+        assert( os.listdir( self.dir ) == [ 'snapshot' ] )
+
+    def testError ( self ) :
+        """A failed snapshot is reported and leaves no file behind."""
+        snapshot = genosha.snapshot_in_background( [ lambda x : x ], self.fn )
+        self.assertRaises( SnapshotError, snapshot.wait )
+        assert( 'TypeError' in snapshot.error )
+        assert( os.listdir( self.dir ) == [] )
+
+if __name__ == "__main__":
+    unittest.main()
@@ -16,7 +16,8 @@
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import time, sys, unittest
 
-from genosha.SQL import dumpc, loadc, create_tables
+from genosha import GenoshaEncoder, GenoshaDecoder
+from genosha.SQL import dumpc, loadc, extractc, parse, create_tables, Writer
 import genoshatest
 from sqlite3 import connect
 
@@ -30,6 +31,8 @@ class GenoshaSQLTests ( genoshatest.GenoshaTests ) :
         self.conn.commit()
         self.marshal = lambda o : dumpc( o, self.conn )
         self.unmarshal = lambda o : loadc( o, self.conn )
+        self.extract = lambda i, path : extractc( i, path, self.conn )
+        self.persistent = ( lambda o, pid : dumpc( o, self.conn, pid ), lambda i, pl : loadc( i, self.conn, pl ) )
         self.long = long
         self.unicode = unicode
 
@@ -37,5 +40,57 @@ class GenoshaSQLTests ( genoshatest.GenoshaTests ) :
         if self.conn :
             self.conn.close()
 
+class GenoshaSQLParseTests ( GenoshaSQLTests ) :
+    def setUp ( self ) :
+        GenoshaSQLTests.setUp( self )
+        self.unmarshal = lambda i : parse( i, self.conn, GenoshaDecoder() )
+
+class GenoshaSQLWriterTests ( GenoshaSQLTests ) :
+    def setUp ( self ) :
+        GenoshaSQLTests.setUp( self )
+        self.marshal = self.write
+
+    def write ( self, o ) :
+        _m = GenoshaEncoder().marshal( o )
+        writer = Writer( self.conn.cursor() )
+        writer.begin( _m[0] )
+        for obj in _m[1] :
+            writer.feed( obj )
+        return writer.finish( _m[2] )
+
+def create_old_tables ( cursor ) :
+    r"""The tables as created before persistent_id, state_id and data were added."""
+    cursor.execute( '''create table object_item ( item_id integer, obj_id integer, type text, instance_id integer, attribute text, fields_id integer, items_id integer )''' )
+    cursor.execute( '''create table sequence_item( seq_id integer, item_id integer, ordinal integer )''' )
+    cursor.execute( '''create table map_item( map_id integer, key_id integer, value_id integer )''' )
+    cursor.execute( '''create table item ( item_id integer, type text, data text )''' )
+    return cursor
+
+class GenoshaSQLOldSchemaTests ( GenoshaSQLTests ) :
+    def setUp ( self ) :
+        GenoshaSQLTests.setUp( self )
+        self.conn.close()
+        self.conn = connect( ':memory:' )
+        create_old_tables( self.conn.cursor() )
+        self.conn.commit()
+
+    def testOldDocument ( self ) :
+        """Documents in a database with the old schema load, and new ones can be added."""
+        source = connect( ':memory:' )
+        create_tables( source.cursor() )
+        a = genoshatest.Test_A()
+        i = dumpc( [ a, { 'a' : ( 2, 3 ) } ], source )
+        for table, columns in ( ( 'object_item', 'item_id, obj_id, type, instance_id, attribute, fields_id, items_id' )
+                , ( 'sequence_item', 'seq_id, item_id, ordinal' ), ( 'map_item', 'map_id, key_id, value_id' ), ( 'item', 'item_id, type, data' ) ) :
+            rows = source.execute( "SELECT %s FROM %s" % ( columns, table ) ).fetchall()
+            self.conn.executemany( "INSERT INTO %s ( %s ) VALUES ( %s )" % ( table, columns, ", ".join( [ "?" ] * len( rows[0] ) ) ), rows )
+        source.close()
+        result = loadc( i, self.conn )
+        assert( result[0].data == a.data and result[0].id == a.id and result[1] == { 'a' : ( 2, 3 ) } )
+        state = genoshatest.Test_State( 'state' )
+        j = dumpc( state, self.conn )
+        assert( loadc( j, self.conn ).name == 'state' )
+        assert( loadc( i, self.conn )[1] == { 'a' : ( 2, 3 ) } )
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+#    genoshatest/statstest.py - test cases for Genosha statistics
+#    Copyright (C) 2009 Shawn Sulma <genosha@470th.org>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import unittest
+from StringIO import StringIO
+
+import genosha, genosha.stats
+from genosha.stats import Stats
+
+__version__ = "0.1"
+__author__ = "Shawn Sulma <genosha@470th.org>"
+
+class Item ( object ) :
+    def __init__ ( self, name ) :
+        self.name = name
+
+# the scoped name is __main__/Item when this module is run as a script
+ITEM = genosha.GenoshaEncoder().find_scoped_name( Item )
+
+class GenoshaStatsTests ( unittest.TestCase ) :
+    backend = 'genosha.JSON'
+
+    def setUp ( self ) :
+        shared = Item( "shared" )
+        self.graph = [ Item( "a" ), Item( "b" ), shared, shared, ( 1, 2.5 ) ]
+
+    def dump ( self ) :
+        stats = Stats()
+        f = StringIO()
+        genosha.stats.dump( self.graph, f, stats, backend = self.backend )
+        f.seek( 0 )
+        return stats, f
+
+    def testDump ( self ) :
+        """Dumping counts the objects, references, time and bytes of each type."""
+        stats, f = self.dump()
+        report = stats.report()
+        types = report['types']
+        assert( types[ITEM]['count'] == 3 )
+        assert( types[ITEM]['references'] == 4 )
+        assert( types['__builtin__/list']['count'] == 1 )
+        assert( types['__builtin__/tuple']['count'] == 1 )
+        assert( types['str']['count'] == 3 and types['int']['count'] == 1 and types['float']['count'] == 1 )
+        assert( 0 < report['totals']['bytes'] < len( f.getvalue() ) )
+        assert( all( entry['seconds'] >= 0 for entry in types.values() ) )
+        assert( report['caches']['scoped_names'] == { 'hits' : 2, 'misses' : 3, 'hit_rate' : 0.4 } )
+
+    def testLoad ( self ) :
+        """Loading counts the same objects and references, and the type cache."""
+        f = self.dump()[1]
+        stats = Stats()
+        graph = genosha.stats.load( f, stats, backend = self.backend )
+        assert( [ item.name for item in graph[:4] ] == [ "a", "b", "shared", "shared" ] and graph[4] == ( 1, 2.5 ) )
+        types = stats.report()['types']
+        assert( types[ITEM]['count'] == 3 )
+        assert( types[ITEM]['references'] == 4 )
+        assert( types['str']['count'] == 3 )
+        assert( stats.report()['caches']['kinds'] == { 'hits' : 2, 'misses' : 3, 'hit_rate' : 0.4 } )
+
+    def testAccumulate ( self ) :
+        """Counts accumulate over several dumps until cleared."""
+        stats = Stats()
+        for i in range( 2 ) :
+            genosha.stats.dump( self.graph, StringIO(), stats, backend = self.backend )
+        assert( stats.report()['types'][ITEM]['count'] == 6 )
+        stats.clear()
+        assert( stats.report()['types'] == {} and stats.report()['caches']['kinds']['hit_rate'] is None )
+
+    def testFormat ( self ) :
+        """The text report has a row for each type and the totals."""
+        stats = self.dump()[0]
+        lines = stats.format().split( "\n" )
+        assert( lines[0].split()[:2] == [ 'type', 'count' ] )
+        assert( len( lines ) == 1 + len( stats.types ) + 1 + 2 )
+        assert( len( stats.format( limit = 2 ).split( "\n" ) ) == 1 + 2 + 1 + 2 )
+
+    def testUninstrumented ( self ) :
+        """Encoders and decoders are only changed when they are instrumented."""
+        encoder, decoder = genosha.GenoshaEncoder(), genosha.GenoshaDecoder()
+        assert( 'find_scoped_name' not in vars( encoder ) and '_unmarshal' not in vars( decoder ) )
+        Stats().encoder( encoder )
+        assert( 'find_scoped_name' in vars( encoder ) )
+
+class GenoshaXMLStatsTests ( GenoshaStatsTests ) :
+    backend = 'genosha.XML'
+
+class GenoshaBinaryStatsTests ( GenoshaStatsTests ) :
+    backend = 'genosha.Binary'
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+#    genoshatest/surveytest.py - test cases for surveying Genosha documents
+#    Copyright (C) 2009 Shawn Sulma <genosha@470th.org>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import os, sys, unittest, tempfile, shutil
+from StringIO import StringIO
+from sqlite3 import connect
+
+import genosha.JSON, genosha.XML, genosha.Binary, genosha.Archive, genosha.SQL, genosha.survey
+
+__version__ = "0.1"
+__author__ = "Shawn Sulma <genosha@470th.org>"
+
+class Part ( object ) :
+    def __init__ ( self, name, children = () ) :
+        self.name = name
+        self.children = list( children )
+
+# the scoped name is __main__/Part when this module is run as a script
+PART = Part.__module__ + '/' + Part.__name__
+
+class GenoshaSurveyTests ( unittest.TestCase ) :
+    def setUp ( self ) :
+        self.dir = tempfile.mkdtemp()
+        leaf = Part( "leaf" )
+        self.graph = Part( "root", [ Part( "a", [ leaf ] ), Part( "b", [ leaf ] ) ] )
+
+    def tearDown ( self ) :
+        shutil.rmtree( self.dir )
+
+    def write ( self, name, dump, **kwargs ) :
+        fn = os.path.join( self.dir, name )
+        f = open( fn, 'wb' )
+        try :
+            dump( self.graph, f, **kwargs )
+        finally :
+            f.close()
+        return fn
+
+    def documents ( self ) :
+        fn = os.path.join( self.dir, 'graph.db' )
+        conn = connect( fn )
+        genosha.SQL.create_tables( conn.cursor() )
+        genosha.SQL.dumpc( self.graph, conn )
+        conn.commit()
+        conn.close()
+        return [ ( 'genosha.JSON', self.write( 'graph.json', genosha.JSON.dump ) )
+            , ( 'genosha.JSON', self.write( 'graph.json.gz', genosha.JSON.dump, compression = 'gzip' ) )
+            , ( 'genosha.XML', self.write( 'graph.xml', genosha.XML.dump ) )
+            , ( 'genosha.XML', self.write( 'graph-compact.xml', genosha.XML.dump, compact = True ) )
+            , ( 'genosha.Binary', self.write( 'graph.bin', genosha.Binary.dump ) )
+            , ( 'genosha.Archive', self.write( 'graph.gna', genosha.Archive.dump ) )
+            , ( 'genosha.SQL', fn ) ]
+
+    def testSurvey ( self ) :
+        """Every kind of document gives the same counts."""
+        for backend, fn in self.documents() :
+            report = genosha.survey.survey( fn )
+            assert( report['format'] == backend )
+            assert( report['objects'] == 8 )
+            assert( report['types'][PART]['count'] == 4 )
+            assert( report['types']['__builtin__/list']['count'] == 4 )
+            assert( report['fields'] == { 'name' : 4, 'children' : 4 } )
+            assert( report['fan_out']['max'] == 2 and report['fan_out']['histogram'][1] == 6 )
+            assert( report['fan_in']['max'] == 2 and report['fan_in']['top'][0]['type'] == PART )
+            assert( report['max_depth'] == 6 )
+            assert( len( report['largest'] ) == 8 and report['largest'][0]['bytes'] >= report['largest'][-1]['bytes'] > 0 )
+            assert( report['bytes'] == sum( entry['bytes'] for entry in report['types'].values() ) )
+
+    def testSizes ( self ) :
+        """Object sizes add up to about the size of the document."""
+        fn = self.write( 'graph.bin', genosha.Binary.dump )
+        report = genosha.survey.survey( fn )
+        assert( 0.5 * os.path.getsize( fn ) < report['bytes'] <= os.path.getsize( fn ) )
+
+    def testShallow ( self ) :
+        """Without the graph there is no fan-in or reference depth."""
+        report = genosha.survey.survey( self.write( 'graph.json', genosha.JSON.dump ), top = 2, graph = False )
+        assert( 'fan_in' not in report and report['max_depth'] is None and len( report['largest'] ) == 2 )
+
+    def testNotGenosha ( self ) :
+        """Other files are refused."""
+        fn = os.path.join( self.dir, 'other.txt' )
+        open( fn, 'w' ).write( "hello" )
+        self.assertRaises( ValueError, genosha.survey.survey, fn )
+
+    def testMain ( self ) :
+        """The command line prints the report, as text or JSON."""
+        fn = self.write( 'graph.json', genosha.JSON.dump )
+        stdout, stderr = sys.stdout, sys.stderr
+        try :
+            sys.stdout = out = StringIO()
+            assert( genosha.survey.main( [ fn ] ) == 0 )
+            assert( out.getvalue().startswith( "genosha.JSON: 8 objects" ) )
+            sys.stdout = out = StringIO()
+            assert( genosha.survey.main( [ '--json', '--shallow', fn ] ) == 0 )
+            assert( genosha.JSON.json.loads( out.getvalue() )['objects'] == 8 )
+            sys.stderr = StringIO()
+            assert( genosha.survey.main( [ os.path.join( self.dir, 'missing' ) ] ) == 1 )
+        finally :
+            sys.stdout, sys.stderr = stdout, stderr
+
+if __name__ == "__main__":
+    unittest.main()
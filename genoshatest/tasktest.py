@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+#    genoshatest/tasktest.py - test cases for cooperative Genosha dump and load
+#    Copyright (C) 2009 Shawn Sulma <genosha@470th.org>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import time, sys, unittest
+from StringIO import StringIO
+
+import genosha, genosha.JSON, genosha.XML, genosha.Binary
+import genoshatest
+
+__version__ = "0.1"
+__author__ = "Shawn Sulma <genosha@470th.org>"
+
+class GenoshaJSONTaskTests ( genoshatest.GenoshaTests ) :
+    module = genosha.JSON
+
+    def setUp ( self ) :
+        self.marshal = self._dump
+        self.unmarshal = self._load
+        self.long = int
+        self.unicode = str
+
+    def _dump ( self, o ) :
+        f = StringIO()
+        for step in self.module.dump_task( o, f, budget = 1 ) :
+            pass
+        return f.getvalue()
+
+    def _load ( self, s ) :
+        task = self.module.load_task( StringIO( s ), budget = 1 )
+        while task.step() :
+            pass
+        return task.result
+
+    def testSlices ( self ) :
+        """Work is done in slices of at most ``budget`` objects."""
+        data = [ [ i, genoshatest.Test_A() ] for i in xrange( 30 ) ]
+        f = StringIO()
+        task = self.module.dump_task( data, f, budget = 5 )
+        slices = len( list( task ) )
+        assert( task.done and slices > 5 )
+        assert( f.getvalue() == self.module.dumps( data ) )
+        task = self.module.load_task( StringIO( f.getvalue() ), budget = 5 )
+        assert( len( list( task ) ) > 5 )
+        assert( repr( task.result ) == repr( data ) )
+
+class GenoshaXMLTaskTests ( GenoshaJSONTaskTests ) :
+    module = genosha.XML
+
+    def setUp ( self ) :
+        GenoshaJSONTaskTests.setUp( self )
+        self.long = long
+        self.unicode = unicode
+
+class GenoshaBinaryTaskTests ( GenoshaXMLTaskTests ) :
+    module = genosha.Binary
+
+if __name__ == "__main__":
+    unittest.main()
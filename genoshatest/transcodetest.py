@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+#    genoshatest/transcodetest.py - test cases for transcoding Genosha documents
+#    Copyright (C) 2009 Shawn Sulma <genosha@470th.org>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import os, sys, unittest, tempfile, shutil
+from StringIO import StringIO
+from sqlite3 import connect
+
+import genosha, genosha.JSON, genosha.XML, genosha.Binary, genosha.Archive, genosha.SQL, genosha.transcoding
+from genosha import GenoshaObject, GenoshaReference, GenoshaCollector, SENTINEL
+import genoshatest
+
+__version__ = "0.1"
+__author__ = "Shawn Sulma <genosha@470th.org>"
+
+class GenoshaTranscodeTests ( genoshatest.GenoshaTests ) :
+    r"""Documents written by one module and transcoded to another load as if the second
+    module had written them."""
+    src_format, dst_format = 'genosha.XML', 'genosha.JSON'
+
+    def setUp ( self ) :
+        self.marshal = lambda o : self.transcode( self.dumps( o ) )
+        self.unmarshal = lambda s : genosha.JSON.loads( s )
+        self.persistent = ( lambda o, pid : self.transcode( self.dumps( o, persistent_id = pid ) ), self.loads_persistent )
+        self.long = int
+        self.unicode = str
+
+    def dumps ( self, o, persistent_id = None ) :
+        return genosha.XML.dumps( o, persistent_id = persistent_id )
+
+    def loads_persistent ( self, s, load ) :
+        return genosha.JSON.loads( s, persistent_load = load )
+
+    def transcode ( self, s ) :
+        out = StringIO()
+        genosha.transcode( StringIO( s ), self.src_format, out, self.dst_format )
+        return out.getvalue()
+
+class GenoshaJSONToBinaryTests ( GenoshaTranscodeTests ) :
+    src_format, dst_format = 'genosha.JSON', 'genosha.Binary'
+
+    def setUp ( self ) :
+        GenoshaTranscodeTests.setUp( self )
+        self.unmarshal = genosha.Binary.loads
+
+    def dumps ( self, o, persistent_id = None ) :
+        return genosha.JSON.dumps( o, persistent_id = persistent_id )
+
+    def loads_persistent ( self, s, load ) :
+        return genosha.Binary.loads( s, persistent_load = load )
+
+class GenoshaBinaryToCompactXMLTests ( GenoshaTranscodeTests ) :
+    src_format, dst_format = 'genosha.Binary', 'genosha.XML'
+
+    def setUp ( self ) :
+        GenoshaTranscodeTests.setUp( self )
+        self.unmarshal = genosha.XML.loads
+        self.long = long
+        self.unicode = unicode
+
+    def dumps ( self, o, persistent_id = None ) :
+        return genosha.Binary.dumps( o, persistent_id = persistent_id )
+
+    def loads_persistent ( self, s, load ) :
+        return genosha.XML.loads( s, persistent_load = load )
+
+    def transcode ( self, s ) :
+        out = StringIO()
+        genosha.transcode( StringIO( s ), self.src_format, out, self.dst_format, compact = True )
+        assert( genosha.XML.COMPACT in out.getvalue()[:100] )
+        return out.getvalue()
+
+class GenoshaSQLTranscodeTests ( GenoshaTranscodeTests ) :
+    r"""JSON is transcoded into a database, and from there into the binary format."""
+    def setUp ( self ) :
+        GenoshaTranscodeTests.setUp( self )
+        self.conn = connect( ':memory:' )
+        self.unmarshal = genosha.Binary.loads
+
+    def tearDown ( self ) :
+        self.conn.close()
+
+    def dumps ( self, o, persistent_id = None ) :
+        return genosha.JSON.dumps( o, persistent_id = persistent_id )
+
+    def loads_persistent ( self, s, load ) :
+        return genosha.Binary.loads( s, persistent_load = load )
+
+    def transcode ( self, s ) :
+        item = genosha.transcode( StringIO( s ), 'genosha.JSON', self.conn, 'genosha.SQL' )
+        out = StringIO()
+        assert( genosha.transcode( self.conn, 'genosha.SQL', out, 'genosha.Binary', item = item ) is None )
+        return out.getvalue()
+
+class GenoshaArchiveTranscodeTests ( GenoshaTranscodeTests ) :
+    r"""Binary documents are transcoded into archives, and from there into JSON."""
+    def setUp ( self ) :
+        GenoshaTranscodeTests.setUp( self )
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown ( self ) :
+        shutil.rmtree( self.dir )
+
+    def dumps ( self, o, persistent_id = None ) :
+        return genosha.Binary.dumps( o, persistent_id = persistent_id )
+
+    def transcode ( self, s ) :
+        fn = os.path.join( self.dir, 'doc.gna' )
+        genosha.transcode( StringIO( s ), 'genosha.Binary', fn, 'genosha.Archive' )
+        out = StringIO()
+        genosha.transcode( fn, None, out, 'genosha.JSON' )
+        return out.getvalue()
+
+class GenoshaTypeFreeTranscodeTests ( unittest.TestCase ) :
+    def setUp ( self ) :
+        self.dir = tempfile.mkdtemp()
+        out = StringIO()
+        writer = genosha.Binary.Writer( out.write )
+        writer.begin( SENTINEL )
+        writer.feed( GenoshaObject( type = 'nowhere.to.be/Found', oid = 0, fields = { 'name' : "<odd>", 'next' : GenoshaReference( 0 ) } ) )
+        writer.finish( GenoshaReference( 0 ) )
+        self.doc = out.getvalue()
+
+    def tearDown ( self ) :
+        shutil.rmtree( self.dir )
+
+    def check ( self, doc ) :
+        objects, payload = doc[1], doc[2]
+        assert( len( objects ) == 1 and objects[0].type == 'nowhere.to.be/Found' )
+        assert( objects[0].fields['name'] == "<odd>" and objects[0].fields['next'].oid == 0 and payload.oid == 0 )
+
+    def testTypeFree ( self ) :
+        """Types that cannot be imported are carried through unresolved."""
+        json = StringIO()
+        genosha.transcode( StringIO( self.doc ), 'genosha.Binary', json, 'genosha.JSON' )
+        xml = StringIO()
+        genosha.transcode( StringIO( json.getvalue() ), 'genosha.JSON', xml, 'genosha.XML' )
+        self.check( genosha.XML.parse( StringIO( xml.getvalue() ), GenoshaCollector() ) )
+
+    def testUncompressible ( self ) :
+        """Compressing an archive (which must be mapped) or a database is refused."""
+        for dst_format in ( 'genosha.Archive', 'genosha.SQL' ) :
+            dst = os.path.join( self.dir, 'doc.out' )
+            self.assertRaises( ValueError, genosha.transcode, StringIO( self.doc ), 'genosha.Binary', dst, dst_format, compression = 'gzip' )
+            assert( not os.path.exists( dst ) )
+
+    def testMain ( self ) :
+        """The command line recognizes the source and compresses the destination."""
+        src, dst = os.path.join( self.dir, 'doc.bin' ), os.path.join( self.dir, 'doc.xml.bz2' )
+        open( src, 'wb' ).write( self.doc )
+        assert( genosha.transcoding.main( [ '--to', 'xml', '--compression', 'bz2', src, dst ] ) == 0 )
+        assert( open( dst, 'rb' ).read( 3 ) == 'BZh' )
+        f = open( dst, 'rb' )
+        try :
+            self.check( genosha.XML.parse( genosha.compression.reader( f ), GenoshaCollector() ) )
+        finally :
+            f.close()
+        stderr = sys.stderr
+        try :
+            sys.stderr = StringIO()
+            assert( genosha.transcoding.main( [ '--to', 'json', os.path.join( self.dir, 'missing' ), dst ] ) == 1 )
+        finally :
+            sys.stderr = stderr
+
+if __name__ == "__main__":
+    unittest.main()
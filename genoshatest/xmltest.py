@@ -14,9 +14,10 @@
 #
 #    You should have received a copy of the GNU General Public License
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
-import time, sys, unittest
+import time, sys, os, shutil, tempfile, unittest
+from StringIO import StringIO
 
-from genosha.XML import dumps, loads
+from genosha.XML import dumps, loads, load, dump, extract
 import genoshatest
 
 __version__ = "0.1"
@@ -29,5 +30,71 @@ class GenoshaXMLTests ( genoshatest.GenoshaTests ) :
         self.long = long
         self.unicode = unicode
 
+class GenoshaXMLStreamTests ( genoshatest.GenoshaTests ) :
+    def setUp ( self ) :
+        self.marshal = dumps
+        self.unmarshal = lambda s : load( StringIO( s ) )
+        self.extract = lambda s, path : extract( StringIO( s ), path )
+        self.persistent = ( lambda o, pid : dumps( o, persistent_id = pid ), lambda s, pl : load( StringIO( s ), pl ) )
+        self.long = long
+        self.unicode = unicode
+
+class GenoshaXMLCompactTests ( genoshatest.GenoshaTests ) :
+    def setUp ( self ) :
+        self.marshal = lambda o : dumps( o, compact = True )
+        self.unmarshal = loads
+        self.persistent = ( lambda o, pid : dumps( o, True, pid ), loads )
+        self.long = long
+        self.unicode = unicode
+
+    def testWhitespace ( self ) :
+        """Tabs and carriage returns survive in compact values and keys."""
+        data = [ "a\tb", "a\rb", "a\r\nb", u"x\ty\r", { "k\t" : "\r\n", "k\r\n" : 1, u"u\t" : u"\t" } ]
+        s = dumps( data, compact = True )
+        assert( loads( s ) == data )
+        assert( load( StringIO( s ) ) == data )
+
+class GenoshaXMLCompactStreamTests ( genoshatest.GenoshaTests ) :
+    def setUp ( self ) :
+        self.marshal = lambda o : dumps( o, compact = True )
+        self.unmarshal = lambda s : load( StringIO( s ) )
+        self.long = long
+        self.unicode = unicode
+
+class GenoshaXMLCompressedTests ( genoshatest.GenoshaTests ) :
+    def setUp ( self ) :
+        self.marshal = self._dump
+        self.unmarshal = lambda s : load( StringIO( s ) )
+        self.long = long
+        self.unicode = unicode
+
+    def _dump ( self, o ) :
+        f = StringIO()
+        dump( o, f, compact = True, compression = 'bz2' )
+        return f.getvalue()
+
+class GenoshaXMLFileTests ( genoshatest.GenoshaTests ) :
+    def setUp ( self ) :
+        self.directory = tempfile.mkdtemp()
+        self.marshal = self._dump
+        self.unmarshal = load
+        self.long = long
+        self.unicode = unicode
+
+    def tearDown ( self ) :
+        shutil.rmtree( self.directory )
+
+    def _dump ( self, o ) :
+        name = os.path.join( self.directory, '%d.xml' % len( os.listdir( self.directory ) ) )
+        dump( o, name )
+        return name
+
+class GenoshaXMLSharedStringTests ( genoshatest.GenoshaTests ) :
+    def setUp ( self ) :
+        self.marshal = lambda o : dumps( o, compact = True, strings = 1 )
+        self.unmarshal = loads
+        self.long = long
+        self.unicode = unicode
+
 if __name__ == "__main__":
     unittest.main()